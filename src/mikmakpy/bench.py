@@ -0,0 +1,349 @@
+"""
+mikmakpy.bench
+──────────────
+Offline benchmarks for the protocol codec and message dispatch, on synthetic corpora. Run with
+
+    python -m mikmakpy.bench                                  # print the results
+    python -m mikmakpy.bench --json out.json                  # also write them as JSON
+    python -m mikmakpy.bench --save-baseline bench.json       # store a baseline
+    python -m mikmakpy.bench --baseline bench.json            # compare, exits 1 on a regression
+    python -m mikmakpy.bench -k parse --legacy                # only some benchmarks, plus the legacy comparisons
+    python -m mikmakpy.bench -k nothing --memory              # memory held per logged in client
+"""
+
+import argparse
+import ast
+from dataclasses import asdict, dataclass
+import json
+import platform
+import re
+from socket import socketpair
+import sys
+import threading
+from time import time
+from timeit import Timer
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+from .events import EventBus
+from .fixtures import (
+    achievement_list,
+    achievement_msg,
+    inventory_msg,
+    login_res_msg,
+    room_list_msg,
+    room_users_msg,
+    server_list,
+    server_list_msg,
+    xt_msg,
+)
+from .protocol import FrameDecoder, PacketTemplate, SLOT, decode, encode, parse
+
+
+def legacy_jsish_list(s: str):
+    """The regex + ast.literal_eval implementation parse.jsish_list replaced, kept as the comparison baseline."""
+    s = re.sub(r"\btrue\b", "True", s)
+    s = re.sub(r"\bfalse\b", "False", s)
+    s = re.sub(r"\bnull\b", "None", s)
+    return ast.literal_eval(s)
+
+
+class LegacyEventBus:
+    """The dict-of-lists EventBus the current one replaced, kept as the comparison baseline."""
+
+    def __init__(self):
+        self._handlers = {}
+
+    def on(self, event: str):
+        def decorator(fn):
+            self._handlers.setdefault(event, []).append(fn)
+            return fn
+
+        return decorator
+
+    def emit(self, event: str, *args, **kwargs):
+        for fn in self._handlers.get(event, []):
+            fn(*args, **kwargs)
+
+
+# ── Synthetic corpora ────────────────────────────────────────────────────────
+def session_messages() -> List[str]:
+    """A mix resembling the start of a game server session plus chatter, for the dispatch benchmark."""
+    return [
+        "<msg t='sys'><body action='apiOK' r='0'></body></msg>",
+        room_list_msg(200),
+        login_res_msg(),
+        achievement_msg(40),
+        inventory_msg(300),
+        achievement_msg(10, update=True),
+    ] + [
+        "<msg t='sys'><body action='pubMsg' r='3'><user id='1' /><txt><![CDATA[hi]]></txt></body></msg>",
+        xt_msg({"_cmd": "avt_move", "x": 10, "y": 20, "uid": 5}),
+    ] * 50
+
+
+def stream(messages: List[str], chunk_size: int = 8192) -> List[bytes]:
+    """The messages as they come off the socket: null terminated and cut into chunk_size pieces regardless of frame boundaries."""
+    data = b"".join(encode.raw(m) for m in messages)
+    return [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+# ── Runner ───────────────────────────────────────────────────────────────────
+def measure(fn, *args) -> float:
+    """Best-of-5 time of one call, in nanoseconds."""
+    timer = Timer(lambda: fn(*args))
+    number, _ = timer.autorange()
+    return min(timer.repeat(5, number)) / number * 1e9
+
+
+def peak_allocation(fn, *args) -> int:
+    """Peak bytes allocated by one call (after a warm-up call, so caches don't count)."""
+    fn(*args)
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        fn(*args)
+        return tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+
+
+@dataclass(frozen=True, slots=True)
+class Benchmark:
+    name: str
+    fn: Callable
+    args: tuple = ()
+    messages: int = 1  # messages handled per call, for ns/msg
+
+
+@dataclass(frozen=True, slots=True)
+class BenchResult:
+    ns_per_op: float
+    ops_per_sec: float
+    ns_per_msg: float
+    peak_alloc_bytes: int
+
+
+def _feed_all(chunks: List[bytes]) -> int:
+    decoder = FrameDecoder()
+    n = 0
+    for chunk in chunks:
+        n += len(decoder.feed(chunk).value)
+    return n
+
+
+def _receive(data: bytes, into: bool) -> int:
+    """Frames read off a local socket pair: sock.recv(8192) + feed (a new bytes object per read) or recv_into the decoder's buffer."""
+    a, b = socketpair()
+    sender = threading.Thread(target=lambda: (a.sendall(data), a.close()))
+    sender.start()
+    decoder = FrameDecoder()
+    n = 0
+    try:
+        if into:
+            while size := b.recv_into(decoder.writable()):
+                n += len(decoder.commit(size).value)
+        else:
+            while chunk := b.recv(8192):
+                n += len(decoder.feed(chunk).value)
+    finally:
+        sender.join()
+        b.close()
+    return n
+
+
+def _decode_buffer_all(chunks: List[bytes]) -> int:
+    buf = bytearray()
+    n = 0
+    for chunk in chunks:
+        buf += chunk
+        messages, buf = decode.buffer(buf).value
+        n += len(messages)
+    return n
+
+
+def _client(server_to_join: Optional[str] = None):
+    """An ingame client whose sends go nowhere."""
+    from .ingame import MikmakIngameClient
+    from .recorder import NullConnection
+
+    client = MikmakIngameClient("bench", "bench", server_to_join=server_to_join)
+    client._conn = NullConnection()
+    return client
+
+
+def _dispatcher() -> Callable[[str], None]:
+    """_on_message of a client already on the game server."""
+    client = _client()
+    client._is_first_connection = False
+    return client._on_message
+
+
+def client_memory(clients: int = 200) -> int:
+    """Bytes a client holds on to after a login (server_list, rmList, login_res, achievements, inventory), averaged over clients."""
+    messages = [server_list_msg(20)] + session_messages()[1:6]
+    _client("server 1")  # imports and class level caches
+    kept = []
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        for _ in range(clients):
+            client = _client("server 1")
+            for msg in messages:
+                client._on_message(msg)
+            kept.append(client)
+        return (tracemalloc.get_traced_memory()[0] - base) // clients
+    finally:
+        tracemalloc.stop()
+
+
+def _dispatch_all(on_message: Callable[[str], None], messages: List[str]):
+    for msg in messages:
+        on_message(msg)
+
+
+def _bus(cls, handlers: int):
+    bus = cls()
+    for _ in range(handlers):
+        bus.on("login_res")(lambda res: None)
+    return bus
+
+
+def _emit_all(bus, events: List[str]):
+    emit = bus.emit
+    for event in events:
+        emit(event, None)
+
+
+# what a client emits per frame with nobody listening: the raw event and "message"
+_EMITS = ["xt:avt_move", "message"] * 50
+
+
+def benchmarks() -> List[Benchmark]:
+    session = session_messages()
+    rooms, achievements, inventory = room_list_msg(500), achievement_msg(1000), inventory_msg(2000)
+    move = PacketTemplate("avt_move", {"x": SLOT, "y": SLOT})
+    received = b"".join(stream(session)) * 10
+    return [
+        Benchmark("decode.buffer (8 KiB chunks)", _decode_buffer_all, (stream(session),), len(session)),
+        Benchmark("FrameDecoder.feed (8 KiB chunks)", _feed_all, (stream(session),), len(session)),
+        Benchmark("FrameDecoder.feed (64 B chunks)", _feed_all, (stream(session, 64),), len(session)),
+        Benchmark("socket recv + feed (x10)", _receive, (received, False), 10 * len(session)),
+        Benchmark("socket recv_into + commit (x10)", _receive, (received, True), 10 * len(session)),
+        Benchmark("decode.classify", lambda: [decode.classify(m) for m in session], (), len(session)),
+        Benchmark("decode.xt (login_res)", decode.xt, (login_res_msg(),)),
+        Benchmark("decode.xml (rmList 500)", decode.xml, (rooms,)),
+        Benchmark("parse.server_list (20)", parse.server_list, (server_list_msg(20),)),
+        Benchmark("parse.room_list (500)", parse.room_list, (rooms, True)),
+        Benchmark("parse.room_table (500)", parse.room_table, (rooms, True)),
+        Benchmark("parse.room_users (500)", parse.room_users, (room_users_msg(500),)),
+        Benchmark("parse.user_count", parse.user_count, ("<msg t='sys'><body action='uCount' r='3' u='12' s='0'></body></msg>",)),
+        Benchmark("parse.inv_list (2000)", parse.inv_list, (inventory,)),
+        Benchmark("parse.inventory (2000)", parse.inventory, (inventory,)),
+        Benchmark("parse.achievement_res (1000)", parse.achievement_res, (achievements,)),
+        Benchmark("parse.login_res", parse.login_res, (login_res_msg(),)),
+        Benchmark("encode.xt", encode.xt, ("avt_move", {"x": 10, "y": 20})),
+        Benchmark("encode.xt_bytes", encode.xt_bytes, ("avt_move", {"x": 10, "y": 20})),
+        Benchmark("encode.sys", encode.sys, ("login", "<login z='VW'><nick><![CDATA[u]]></nick></login>")),
+        Benchmark("PacketTemplate.render", move.render, (10, 20)),
+        Benchmark("EventBus.emit (no listeners)", _emit_all, (_bus(EventBus, 0), _EMITS), len(_EMITS)),
+        Benchmark("EventBus.emit (2 listeners)", _emit_all, (_bus(EventBus, 2), ["login_res"] * 100), 100),
+        Benchmark("_on_message dispatch (session)", _dispatch_all, (_dispatcher(), session), len(session)),
+    ]
+
+
+def run(pattern: Optional[str] = None, allocations: bool = True) -> Dict[str, BenchResult]:
+    results = {}
+    for bench in benchmarks():
+        if pattern and pattern not in bench.name:
+            continue
+        ns = measure(bench.fn, *bench.args)
+        results[bench.name] = BenchResult(
+            ns_per_op=ns,
+            ops_per_sec=1e9 / ns,
+            ns_per_msg=ns / bench.messages,
+            peak_alloc_bytes=peak_allocation(bench.fn, *bench.args) if allocations else 0,
+        )
+    return results
+
+
+def to_json(results: Dict[str, BenchResult]) -> Dict[str, Any]:
+    return {
+        "meta": {"python": sys.version.split()[0], "implementation": platform.python_implementation(), "machine": platform.machine(), "time": time()},
+        "results": {name: asdict(r) for name, r in results.items()},
+    }
+
+
+def compare_baseline(results: Dict[str, BenchResult], baseline: Dict[str, Any], tolerance: float = 0.15) -> List[str]:
+    """Benchmarks more than tolerance slower than the baseline (ns/op), as readable lines."""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        ratio = r.ns_per_op / base["ns_per_op"]
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: {base['ns_per_op']:,.0f} -> {r.ns_per_op:,.0f} ns/op ({ratio:.2f}x)")
+    return regressions
+
+
+def compare(name: str, new, old, *args):
+    assert new(*args) == old(*args), f"{name}: results differ"
+    new_ns, old_ns = measure(new, *args), measure(old, *args)
+    print(f"{name:<32} {new_ns / 1000:>10.1f} µs  vs {old_ns / 1000:>10.1f} µs  ({old_ns / new_ns:.1f}x)")
+
+
+def legacy():
+    print(f"{'jsish_list':<32} {'new':>13}      {'legacy':>13}")
+    compare("server_list (3 servers)", parse.jsish_list, legacy_jsish_list, server_list(3))
+    compare("achievements (40 entries)", parse.jsish_list, legacy_jsish_list, achievement_list(40))
+    compare("achievements (1000 entries)", parse.jsish_list, legacy_jsish_list, achievement_list(1000))
+    print(f"\n{'EventBus.emit, 100 events':<32} {'new':>13}      {'legacy':>13}")
+    new_idle, old_idle = _bus(EventBus, 0), _bus(LegacyEventBus, 0)
+    new_busy, old_busy = _bus(EventBus, 2), _bus(LegacyEventBus, 2)
+    compare("no listeners", lambda: _emit_all(new_idle, _EMITS), lambda: _emit_all(old_idle, _EMITS))
+    compare("2 listeners", lambda: _emit_all(new_busy, ["login_res"] * 100), lambda: _emit_all(old_busy, ["login_res"] * 100))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m mikmakpy.bench", description=__doc__.split("\n")[3])
+    ap.add_argument("-k", dest="pattern", help="only benchmarks whose name contains this")
+    ap.add_argument("--json", help="write the results to this file")
+    ap.add_argument("--baseline", help="compare against this results file")
+    ap.add_argument("--save-baseline", help="write the results to this file as the new baseline")
+    ap.add_argument("--tolerance", type=float, default=0.15, help="allowed slowdown against the baseline (default 0.15)")
+    ap.add_argument("--no-alloc", action="store_true", help="skip the tracemalloc pass")
+    ap.add_argument("--legacy", action="store_true", help="also compare jsish_list and EventBus with the implementations they replaced")
+    ap.add_argument("--memory", action="store_true", help="also measure the memory a logged in client holds on to")
+    args = ap.parse_args(argv)
+
+    results = run(args.pattern, allocations=not args.no_alloc)
+    print(f"{'benchmark':<36} {'ns/op':>12} {'ops/s':>12} {'ns/msg':>10} {'peak alloc':>12}")
+    for name, r in results.items():
+        print(f"{name:<36} {r.ns_per_op:>12,.0f} {r.ops_per_sec:>12,.0f} {r.ns_per_msg:>10,.0f} {r.peak_alloc_bytes:>11,}B")
+    if args.legacy:
+        print()
+        legacy()
+    if args.memory:
+        print(f"\n{'memory per logged in client':<36} {client_memory():>11,}B")
+
+    data = to_json(results)
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare_baseline(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,92 +1,476 @@
 """
 mikmakpy.connection
 ─────────────────
-Provides the Connection class for managing low-level socket communication with the Mikmak servers.
+Provides the Connection class for managing low-level socket communication with the Mikmak servers,
+and AsyncConnection, its asyncio counterpart for running many sessions on one event loop.
 """
 
-from socket import socket, AF_INET, SOCK_STREAM, IPPROTO_TCP
-import traceback
-from .protocol import encode, decode
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from socket import socket, AF_INET, SOCK_STREAM, IPPROTO_TCP, TCP_NODELAY, SOL_SOCKET, SO_RCVBUF, SO_SNDBUF
+import threading
+from time import monotonic
+from .protocol import encode, decode, FrameDecoder, MAX_FRAME_SIZE
+from .log import ClientLogger
+from .metrics import Metrics
+
+
+@dataclass(frozen=True)
+class SendLimits:
+    """
+    Outgoing pacing of a connection.
+    rate/burst: token bucket over every frame (frames per second, bucket size), None for no limit.
+    commands: extra buckets per command class, keyed by a command (xt cmd / sys action) or a tuple of commands sharing one bucket,
+        e.g. {("pubMsg", "avt_emote"): (2, 5)}
+    max_queue: frames that may wait to be written before send() starts refusing them.
+    """
+
+    rate: float | None = None
+    burst: float | None = None
+    commands: dict[str | tuple[str, ...], tuple[float, float]] = field(default_factory=dict)
+    max_queue: int = 1024
+
+
+@dataclass(frozen=True)
+class SocketOptions:
+    """
+    Socket tuning of a connection.
+    nodelay: TCP_NODELAY, send small frames right away instead of waiting to coalesce them (Nagle).
+    rcvbuf/sndbuf: SO_RCVBUF/SO_SNDBUF in bytes, None keeps the OS default.
+    read_size/max_read_size: bytes asked for per read, doubled while reads come back full up to max_read_size.
+    """
+
+    nodelay: bool = True
+    rcvbuf: int | None = None
+    sndbuf: int | None = None
+    read_size: int = 8192
+    max_read_size: int = 256 * 1024
+
+    def apply(self, sock: socket):
+        sock.setsockopt(IPPROTO_TCP, TCP_NODELAY, int(self.nodelay))
+        if self.rcvbuf:
+            sock.setsockopt(SOL_SOCKET, SO_RCVBUF, self.rcvbuf)
+        if self.sndbuf:
+            sock.setsockopt(SOL_SOCKET, SO_SNDBUF, self.sndbuf)
+
+    def decoder(self, max_frame_size: int, on_frame=None) -> FrameDecoder:
+        return FrameDecoder(max_frame_size, read_size=self.read_size, max_read_size=self.max_read_size, on_frame=on_frame)
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "_tokens", "_stamp")
+
+    def __init__(self, rate: float, burst: float | None = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self.burst
+        self._stamp = monotonic()
+
+    def wait(self, now: float) -> float:
+        """Seconds until a token is available, 0 if there is one now."""
+        self._tokens = min(self.burst, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+        return 0.0 if self._tokens >= 1.0 else (1.0 - self._tokens) / self.rate
+
+    def take(self):
+        self._tokens -= 1.0
+
+
+class SendQueue:
+    """
+    Bounded FIFO of encoded outgoing frames. The writer takes every frame the limiters allow in
+    one go and writes them with a single call, so bursts cost one syscall instead of one per frame.
+    Not thread safe by itself, Connection guards it with its condition.
+    """
+
+    def __init__(self, limits: SendLimits = SendLimits()):
+        self.max_size = limits.max_queue
+        self._frames: deque[tuple[bytes, TokenBucket | None]] = deque()
+        self._bucket = TokenBucket(limits.rate, limits.burst) if limits.rate else None
+        self._command_buckets: dict[str, TokenBucket] = {}
+        for commands, (rate, burst) in limits.commands.items():
+            bucket = TokenBucket(rate, burst)
+            for cmd in (commands,) if isinstance(commands, str) else commands:
+                self._command_buckets[cmd] = bucket
+
+        # metrics
+        self.high_water = 0
+        self.dropped = 0
+        self.frames_sent = 0
+        self.batches_sent = 0
+        self.bytes_sent = 0
+
+    def put(self, frame: bytes, command: str = "") -> bool:
+        """Queue a frame, False when the queue is full (the frame is dropped)."""
+        if len(self._frames) >= self.max_size:
+            self.dropped += 1
+            return False
+        self._frames.append((frame, self._command_buckets.get(command)))
+        if len(self._frames) > self.high_water:
+            self.high_water = len(self._frames)
+        return True
+
+    def take_ready(self, now: float) -> tuple[bytes, float | None]:
+        """
+        Pop the frames that may be sent now, joined into one buffer.
+        Also returns how long until the next frame may go, None when nothing is left.
+        Frames leave in order, a rate limited frame holds back the ones after it.
+        """
+        frames = self._frames
+        out = []
+        wait = None
+        while frames:
+            frame, bucket = frames[0]
+            wait = self._bucket.wait(now) if self._bucket else 0.0
+            if bucket:
+                wait = max(wait, bucket.wait(now))
+            if wait > 0:
+                break
+            if self._bucket:
+                self._bucket.take()
+            if bucket:
+                bucket.take()
+            out.append(frame)
+            frames.popleft()
+        else:
+            wait = None
+        return self._account(out), wait
+
+    def take_all(self) -> bytes:
+        """Pop everything ignoring the limits, used to flush on close."""
+        out = [frame for frame, _ in self._frames]
+        self._frames.clear()
+        return self._account(out)
+
+    def _account(self, frames: list[bytes]) -> bytes:
+        if not frames:
+            return b""
+        data = frames[0] if len(frames) == 1 else b"".join(frames)
+        self.frames_sent += len(frames)
+        self.batches_sent += 1
+        self.bytes_sent += len(data)
+        return data
+
+    @property
+    def depth(self) -> int:
+        return len(self._frames)
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._frames),
+            "high_water": self.high_water,
+            "dropped": self.dropped,
+            "frames_sent": self.frames_sent,
+            "batches_sent": self.batches_sent,
+            "bytes_sent": self.bytes_sent,
+        }
 
 
 class Connection:
-    def __init__(self, on_message, on_disconnect, on_connect=None):
+    def __init__(
+        self,
+        on_message,
+        on_disconnect=None,
+        on_connect=None,
+        max_frame_size: int = MAX_FRAME_SIZE,
+        send_limits: SendLimits = SendLimits(),
+        recorder=None,
+        log: ClientLogger | None = None,
+        metrics: Metrics | None = None,
+        socket_options: SocketOptions = SocketOptions(),
+    ):
         self._on_message = on_message
         self._on_disconnect = on_disconnect
         self._on_connect = on_connect
+        self._max_frame_size = max_frame_size
+        self._recorder = recorder  # a recorder.SessionRecorder, gets every frame in and out
+        self._log = log or ClientLogger()
+        self.metrics = metrics or Metrics()
+        self.socket_options = socket_options
         self._sock: socket | None = None
         self._running = False
 
+        # outgoing frames go through a queue drained by a writer thread
+        self.send_queue = SendQueue(send_limits)
+        self._send_cond = threading.Condition()
+        self._write_lock = threading.Lock()
+
     def connect(self, ip: str, port: int):
         self._running = True
         self._sock = socket(AF_INET, SOCK_STREAM, IPPROTO_TCP)
+        self.socket_options.apply(self._sock)
         self._sock.settimeout(10.0)
         self._sock.connect((ip, port))
+        threading.Thread(target=self._write_loop, args=(self._sock,), name="mikmak-writer", daemon=True).start()
         if self._on_connect:
             self._on_connect()
 
-    def send(self, message: str):
+    def send(self, message: str) -> bool:
+        """Queue a message, safe from any thread. Returns False when it was refused (not connected or the queue is full)."""
         if not self._sock:
-            return
-        try:
-            self._sock.sendall(encode.raw(message))
-        except Exception as e:
-            print(f"[send error] {e}")
+            return False
+        with self._send_cond:
+            queued = self.send_queue.put(encode.raw(message), decode.classify(message)[1])
+            if queued:
+                self._send_cond.notify()
+            else:
+                self.metrics.frames_dropped += 1  # under the lock, senders on several threads would lose counts
+        return queued
+
+    def send_bytes(self, data: bytes, command: str = "") -> bool:
+        """Queue an already encoded frame (null terminated, e.g. PacketTemplate.render()). command picks its rate limit."""
+        if not self._sock:
+            return False
+        with self._send_cond:
+            queued = self.send_queue.put(data, command)
+            if queued:
+                self._send_cond.notify()
+            else:
+                self.metrics.frames_dropped += 1  # under the lock, senders on several threads would lose counts
+        return queued
+
+    def _write_loop(self, sock: socket):
+        queue = self.send_queue
+        while True:
+            with self._send_cond:
+                while True:
+                    if not self._running:
+                        return
+                    data, wait = queue.take_ready(monotonic())
+                    if data:
+                        break
+                    self._send_cond.wait(wait)
+            try:
+                with self._write_lock:
+                    sock.sendall(data)
+                self.metrics.bytes_out += len(data)
+                self.metrics.frames_out += data.count(0)
+                if self._recorder:
+                    self._recorder.outgoing(data)
+            except Exception as e:
+                self._log.error("[send error] %s", e)
+                return
 
     def listen(self):
         """Blocking receive loop. Call after connect()."""
-        buffer = bytearray()
+        # received straight into the decoder's buffer, the only allocation per frame is its str
+        # the recorder gets the frames' raw bytes from the decoder, before they're decoded
+        decoder = self.socket_options.decoder(self._max_frame_size, self._recorder.incoming if self._recorder else None)
+        recv_into = self._sock.recv_into
+        metrics = self.metrics
         while self._running:
             try:
-                chunk = self._sock.recv(8192)
-                if not chunk:
+                n = recv_into(decoder.writable())
+                if not n:
                     break
-                buffer.extend(chunk)
+                metrics.bytes_in += n
 
-                res = decode.buffer(buffer)
+                res = decoder.commit(n)
                 if not res.ok:
-                    print(f"\n{'='*60}")
-                    print(f"[DECODE ERROR] Failed to decode buffer!")
-                    print(f"Exception: {res.error}")
-                    print(
-                        f"Buffer content (truncated 500 chars): '{buffer[:500]}' {'(truncated)' if len(buffer) > 500 else ''}"
-                    )
-                    print(f"{'='*60}\n")
-                    continue
+                    self._log.error("[DECODE ERROR] Failed to decode buffer, dropping connection: %s", res.error)
+                    break
 
-                messages, buffer = res.value
-                for msg in messages:
+                metrics.frames_in += len(res.value)
+                for msg in res.value:
                     try:
                         self._on_message(msg)
-                    except Exception as e:
-                        print(f"\n{'='*60}")
-                        print(f"[ERROR] Message handler crashed!")
-                        print(f"{'='*60}")
-                        print(f"Exception: {type(e).__name__}: {e}")
-                        print(
-                            f"Message that caused error: '{msg[:200]}' {'(truncated 200 chars)' if len(msg) > 200 else ''}"
-                        )
-                        print(f"\nFull traceback:")
-                        traceback.print_exc()
-                        print(f"{'='*60}\n")
+                    except Exception:
+                        self._log.error("[ERROR] Message handler crashed on %.200r", msg, exc_info=True)
             except TimeoutError:
                 continue
-            except Exception as e:
-                print(f"\n{'='*60}")
-                print(f"[RECV ERROR] Connection broken!")
-                print(f"Exception: {type(e).__name__}: {e}")
-                traceback.print_exc()
-                print(f"{'='*60}\n")
+            except Exception:
+                self._log.error("[RECV ERROR] Connection broken!", exc_info=True)
                 break
 
         self.close()
-        self._on_disconnect()
+        if self._on_disconnect:
+            self._on_disconnect()
 
     def close(self):
-        self._running = False
+        with self._send_cond:
+            self._running = False
+            pending = self.send_queue.take_all()
+            self._send_cond.notify()
         if self._sock:
+            try:
+                if pending:
+                    # best effort, whatever was queued before closing
+                    with self._write_lock:
+                        self._sock.sendall(pending)
+                    if self._recorder:
+                        self._recorder.outgoing(pending)
+            except Exception:
+                pass
             try:
                 self._sock.close()
             except Exception:
                 pass
             self._sock = None
+
+
+class _ReceiveProtocol(asyncio.BufferedProtocol):
+    """Lets the transport read straight into the connection's FrameDecoder, and tracks write flow control."""
+
+    def __init__(self, conn: "AsyncConnection"):
+        self._conn = conn
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self._conn._decoder.writable()
+
+    def buffer_updated(self, nbytes: int):
+        self._conn._received(nbytes)
+
+    def eof_received(self) -> bool:
+        return False  # close the transport
+
+    def connection_lost(self, exc: Exception | None):
+        self._conn._lost(exc)
+
+    def pause_writing(self):
+        self._conn._writable.clear()
+
+    def resume_writing(self):
+        self._conn._writable.set()
+
+
+class AsyncConnection:
+    """
+    asyncio version of Connection. Reads go through a BufferedProtocol straight into a FrameDecoder,
+    so no thread is needed per session and thousands of these can share one event loop.
+    Callbacks are the same plain (non async) callables Connection takes.
+    """
+
+    def __init__(
+        self,
+        on_message,
+        on_disconnect=None,
+        on_connect=None,
+        max_frame_size: int = MAX_FRAME_SIZE,
+        send_limits: SendLimits = SendLimits(),
+        recorder=None,
+        log: ClientLogger | None = None,
+        metrics: Metrics | None = None,
+        socket_options: SocketOptions = SocketOptions(),
+    ):
+        self._on_message = on_message
+        self._on_disconnect = on_disconnect
+        self._on_connect = on_connect
+        self._max_frame_size = max_frame_size
+        self._recorder = recorder  # a recorder.SessionRecorder, gets every frame in and out
+        self._log = log or ClientLogger()
+        self.metrics = metrics or Metrics()
+        self.socket_options = socket_options
+        self._decoder = socket_options.decoder(max_frame_size, recorder.incoming if recorder else None)
+        self._transport: asyncio.Transport | None = None
+        self._closed: asyncio.Future | None = None  # resolved when the transport is gone
+        self._running = False
+
+        # outgoing frames go through a queue drained by a writer task
+        self.send_queue = SendQueue(send_limits)
+        self._send_event = asyncio.Event()
+        self._writable = asyncio.Event()  # cleared while the transport's write buffer is full
+        self._writable.set()
+        self._write_task: asyncio.Task | None = None
+
+    async def connect(self, ip: str, port: int, timeout: float = 10.0):
+        loop = asyncio.get_running_loop()
+        self._running = True
+        self._closed = loop.create_future()
+        self._transport, _ = await asyncio.wait_for(loop.create_connection(lambda: _ReceiveProtocol(self), ip, port), timeout)
+        sock = self._transport.get_extra_info("socket")
+        if sock is not None:
+            self.socket_options.apply(sock)
+        self._write_task = asyncio.create_task(self._write_loop(self._transport))
+        if self._on_connect:
+            self._on_connect()
+
+    def send(self, message: str) -> bool:
+        """Queue a message, call from the event loop thread. Returns False when it was refused (not connected or the queue is full)."""
+        if not self._transport or self._transport.is_closing():
+            return False
+        queued = self.send_queue.put(encode.raw(message), decode.classify(message)[1])
+        self._send_event.set()
+        if not queued:
+            self.metrics.frames_dropped += 1  # no lock needed, only the loop thread sends
+        return queued
+
+    def send_bytes(self, data: bytes, command: str = "") -> bool:
+        """Queue an already encoded frame (null terminated, e.g. PacketTemplate.render()). command picks its rate limit."""
+        if not self._transport or self._transport.is_closing():
+            return False
+        queued = self.send_queue.put(data, command)
+        self._send_event.set()
+        if not queued:
+            self.metrics.frames_dropped += 1  # no lock needed, only the loop thread sends
+        return queued
+
+    async def _write_loop(self, transport: asyncio.Transport):
+        queue = self.send_queue
+        try:
+            while self._running:
+                data, wait = queue.take_ready(monotonic())
+                if data:
+                    transport.write(data)
+                    self.metrics.bytes_out += len(data)
+                    self.metrics.frames_out += data.count(0)
+                    if self._recorder:
+                        self._recorder.outgoing(data)
+                    await self._writable.wait()  # waits while the transport buffer is full
+                    continue
+                self._send_event.clear()
+                try:
+                    await asyncio.wait_for(self._send_event.wait(), wait)
+                except TimeoutError:
+                    pass
+        except Exception as e:
+            self._log.error("[send error] %s", e)
+
+    async def listen(self):
+        """Receive loop. Await after connect(), returns once the connection is closed."""
+        # frames are handled as they arrive, in _received, this only waits for the end
+        await asyncio.shield(self._closed)
+        self.close()
+        if self._on_disconnect:
+            self._on_disconnect()
+
+    def _received(self, nbytes: int):
+        metrics = self.metrics
+        metrics.bytes_in += nbytes
+        res = self._decoder.commit(nbytes)
+        if not res.ok:
+            self._log.error("[DECODE ERROR] Failed to decode buffer, dropping connection: %s", res.error)
+            self._transport.abort()
+            return
+        metrics.frames_in += len(res.value)
+        for msg in res.value:
+            try:
+                self._on_message(msg)
+            except Exception:
+                self._log.error("[ERROR] Message handler crashed on %.200r", msg, exc_info=True)
+            if not self._running:
+                break  # closed by a handler, e.g. moving to the game server
+
+    def _lost(self, exc: Exception | None):
+        if exc is not None and self._running:
+            self._log.error("[RECV ERROR] Connection broken! %s", exc)
+        self._writable.set()
+        if self._closed is not None and not self._closed.done():
+            self._closed.set_result(None)
+
+    def close(self):
+        self._running = False
+        if self._write_task:
+            self._write_task.cancel()
+            self._write_task = None
+        if self._transport:
+            try:
+                pending = self.send_queue.take_all()
+                if pending and not self._transport.is_closing():
+                    self._transport.write(pending)  # flushed by the transport before it closes
+                    if self._recorder:
+                        self._recorder.outgoing(pending)
+                self._transport.close()
+            except Exception:
+                pass
+            self._transport = None
@@ -25,6 +25,23 @@ class LoggerLevel(StrEnum):
     INTERNAL_ERROR = "internal_error"
 
 
+class MessageKind(StrEnum):
+    """Frame families, as told apart by decode.classify."""
+
+    SYS = "sys"  # XML <msg t='sys'>, keyed by the body action
+    XT = "xt"  # JSON extension message, keyed by _cmd
+    POLICY = "policy"  # <cross-domain-policy> answer to the flash policy request
+    UNKNOWN = "unknown"
+
+
+class Overflow(StrEnum):
+    """What a dispatcher with a full queue does with one more event, see events.ThreadDispatcher."""
+
+    BLOCK = "block"  # wait for room, i.e. back pressure on the receive loop
+    DROP_OLDEST = "drop_oldest"  # discard the oldest queued event
+    COALESCE = "coalesce"  # the event replaces the newest queued one of its key, or the oldest is dropped
+
+
 class EmoteFace(IntEnum):
     """Emote IDs (1000 series) - character expressions/animations."""
 
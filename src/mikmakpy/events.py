@@ -1,21 +1,419 @@
 """
 mikmakpy.events
 ─────────────────
-Provides an event bus for handling in-game events and interactions.
+Provides an event bus for handling in-game events and interactions, and dispatchers that run its handlers
+off the receive loop.
 """
 
+from abc import ABC, abstractmethod
+import asyncio
+from collections import OrderedDict, deque
+import inspect
+from itertools import count
+import threading
+from typing import Callable, Deque, Dict, Hashable, List, Optional, Set, Tuple
+
+from .constants import Overflow
+from .log import ClientLogger
+
+_order = count()  # subscription order, breaks priority ties
+_MAX_COMPILED = 1024  # cached handler tuples per bus, event names can come from the server
+
+
+class _Subscription:
+    __slots__ = ("pattern", "fn", "priority", "once", "order", "call")
+
+    def __init__(self, pattern: str, fn: Callable, priority: int, once: bool):
+        self.pattern = pattern
+        self.fn = fn
+        self.priority = priority
+        self.once = once
+        self.order = next(_order)
+        self.call = fn
+
+    def matches(self, event: str) -> bool:
+        if self.pattern.endswith("*"):
+            return event.startswith(self.pattern[:-1])
+        return event == self.pattern
+
 
 class EventBus:
-    def __init__(self):
-        self._handlers = {}
+    """
+    Synchronous event bus.
 
-    def on(self, event: str):
+        @bus.on("login_res")                 # exact event
+        @bus.on("xt:*")                      # prefix pattern, the handler gets the event name first
+        @bus.on("message", priority=10)      # higher priority runs earlier, ties in subscription order
+        @bus.once("room_list")               # removed after the first call
+        bus.off("login_res", fn)             # or bus.off("login_res") for all of them
+
+    The handlers of every event are compiled into a tuple on first emit and cached until the
+    subscriptions change, so emit() is a dict lookup and a loop. Producers can check has_listeners()
+    before building an expensive payload.
+
+    Handlers run inline in emit() unless a dispatcher (ThreadDispatcher, AsyncDispatcher) is set, then
+    emit() only queues them.
+    """
+
+    def __init__(self, dispatcher: Optional["Dispatcher"] = None):
+        self.dispatcher = dispatcher
+        self._subscriptions: List[_Subscription] = []
+        self._compiled: Dict[str, Tuple[Callable, ...]] = {}  # capped at _MAX_COMPILED events
+
+    def on(self, event: str, priority: int = 0, once: bool = False):
         def decorator(fn):
-            self._handlers.setdefault(event, []).append(fn)
+            self._subscriptions.append(self._subscription(event, fn, priority, once))
+            self._compiled.clear()
             return fn
 
         return decorator
 
+    def once(self, event: str, priority: int = 0):
+        return self.on(event, priority, once=True)
+
+    def off(self, event: str, fn: Optional[Callable] = None):
+        """Unsubscribe fn from event (the same string it was subscribed with), or every handler of it."""
+        self._subscriptions = [
+            sub for sub in self._subscriptions if not (sub.pattern == event and (fn is None or sub.fn is fn))
+        ]
+        self._compiled.clear()
+
+    def has_listeners(self, event: str) -> bool:
+        handlers = self._compiled.get(event)
+        if handlers is None:
+            handlers = self._compile(event)
+        return bool(handlers)
+
     def emit(self, event: str, *args, **kwargs):
-        for fn in self._handlers.get(event, []):
+        handlers = self._compiled.get(event)
+        if handlers is None:
+            handlers = self._compile(event)
+        if self.dispatcher is not None:
+            if handlers:
+                self.dispatcher.submit(self, event, handlers, args, kwargs)
+            return
+        for fn in handlers:
+            fn(*args, **kwargs)
+
+    def _compile(self, event: str) -> Tuple[Callable, ...]:
+        subs = sorted((s for s in self._subscriptions if s.matches(event)), key=lambda s: (-s.priority, s.order))
+        handlers = tuple(s.call if s.pattern == event else _with_event(s.call, event) for s in subs)
+        if len(self._compiled) < _MAX_COMPILED:
+            self._compiled[event] = handlers
+        return handlers
+
+    def _subscription(self, event: str, fn: Callable, priority: int, once: bool) -> _Subscription:
+        sub = _Subscription(event, fn, priority, once)
+        if once:
+
+            def call(*args, **kwargs):
+                try:
+                    self._subscriptions.remove(sub)
+                except ValueError:
+                    return  # already called, e.g. queued twice by a dispatcher
+                self._compiled.clear()
+                return fn(*args, **kwargs)
+
+            sub.call = call
+        return sub
+
+
+def _with_event(fn: Callable, event: str) -> Callable:
+    def call(*args, **kwargs):
+        return fn(event, *args, **kwargs)
+
+    return call
+
+
+# ── Dispatchers ──────────────────────────────────────────────────────────────
+class _Job:
+    __slots__ = ("seq", "key", "event", "handlers", "args", "kwargs")
+
+    def __init__(self, seq: int, key: Hashable, event: str, handlers: Tuple[Callable, ...], args: tuple, kwargs: dict):
+        self.seq = seq
+        self.key = key
+        self.event = event
+        self.handlers = handlers
+        self.args = args
+        self.kwargs = kwargs
+
+
+class Dispatcher(ABC):
+    """
+    Bounded queue of emitted events between the receive loop and the workers running their handlers.
+
+    Events are ordered per key: the handlers of one key never run concurrently and always in emit order,
+    different keys run in parallel. The key is (bus, event) by default, so one slow handler only holds back
+    later emits of its own event on its own client. key(event, args) can group them differently, e.g.
+    `key=lambda event, args: None` keeps every event of a client in order.
+
+    At most max_pending events wait at once; what happens to one more is the overflow policy (see Overflow).
+    One dispatcher can be shared by many buses, e.g. passed to every client of a Fleet.
+    """
+
+    def __init__(
+        self,
+        max_pending: int = 1024,
+        overflow: Overflow | str = Overflow.BLOCK,
+        key: Optional[Callable[[str, tuple], Hashable]] = None,
+        log: Optional[ClientLogger] = None,
+    ):
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1")
+        self.max_pending = max_pending
+        self.overflow = Overflow(overflow)
+        self.key = key
+        self._log = log or ClientLogger()
+        self._seq = count()
+        self._pending: "OrderedDict[int, _Job]" = OrderedDict()  # every queued job, oldest first
+        self._queues: Dict[Hashable, Deque[_Job]] = {}  # key -> its queued jobs
+        self._ready: Deque[Hashable] = deque()  # keys with queued jobs, may hold stale entries
+        self._busy: Set[Hashable] = set()  # keys with a job running
+        self._closed = False
+
+        # metrics
+        self.high_water = 0
+        self.dispatched = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+
+    @abstractmethod
+    def submit(self, bus: EventBus, event: str, handlers: Tuple[Callable, ...], args: tuple, kwargs: dict):
+        """Queue the handlers of one emit, called by EventBus.emit()."""
+
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+
+    def stats(self) -> dict:
+        return {
+            "depth": len(self._pending),
+            "high_water": self.high_water,
+            "dispatched": self.dispatched,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+        }
+
+    # Bookkeeping, called with the subclass' lock held (or on its event loop)
+    def _put(self, bus: EventBus, event: str, handlers: Tuple[Callable, ...], args: tuple, kwargs: dict) -> bool:
+        """Queue a job unless the queue is full, True when it's taken care of (queued, coalesced or dropped)."""
+        if self._closed:
+            self.dropped += 1
+            return True
+        key = (bus, event if self.key is None else self.key(event, args))
+        queue = self._queues.get(key)
+        if len(self._pending) >= self.max_pending:
+            if self.overflow is Overflow.BLOCK:
+                return False
+            if self.overflow is Overflow.COALESCE and queue:
+                job = queue[-1]
+                job.event, job.handlers, job.args, job.kwargs = event, handlers, args, kwargs
+                self.coalesced += 1
+                return True
+            self._drop_oldest()
+            queue = self._queues.get(key)
+
+        job = _Job(next(self._seq), key, event, handlers, args, kwargs)
+        self._pending[job.seq] = job
+        if queue is None:
+            queue = self._queues[key] = deque()
+            if key not in self._busy:
+                self._ready.append(key)
+        queue.append(job)
+        if len(self._pending) > self.high_water:
+            self.high_water = len(self._pending)
+        return True
+
+    def _drop_oldest(self):
+        _, job = self._pending.popitem(last=False)
+        queue = self._queues[job.key]
+        queue.popleft()  # the oldest job overall is the oldest of its key
+        if not queue:
+            del self._queues[job.key]
+        self.dropped += 1
+
+    def _take(self) -> Optional[_Job]:
+        """The next job whose key isn't running, None when there is none."""
+        while self._ready:
+            key = self._ready.popleft()
+            queue = self._queues.get(key)
+            if queue is None or key in self._busy:
+                continue  # stale, its jobs were dropped or it's rescheduled when the running one is done
+            job = queue.popleft()
+            if not queue:
+                del self._queues[key]
+            del self._pending[job.seq]
+            self._busy.add(key)
+            return job
+        return None
+
+    def _done(self, job: _Job, failed: bool):
+        self._busy.discard(job.key)
+        self.dispatched += 1
+        self.errors += failed
+        if job.key in self._queues:
+            self._ready.append(job.key)
+
+
+class ThreadDispatcher(Dispatcher):
+    """
+    Runs handlers on a pool of worker threads, for the blocking client (connect()). With Overflow.BLOCK
+    (the default) a full queue makes emit() wait, which stops the receive loop until the handlers catch up.
+    A handler emitting into the full queue from a worker can't wait for room only the workers make, its
+    emit runs the handlers inline on that worker instead.
+
+        client = MikmakIngameClient("bot", "pw", dispatcher=ThreadDispatcher(workers=4, overflow="drop_oldest"))
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_pending: int = 1024,
+        overflow: Overflow | str = Overflow.BLOCK,
+        key: Optional[Callable[[str, tuple], Hashable]] = None,
+        log: Optional[ClientLogger] = None,
+    ):
+        super().__init__(max_pending, overflow, key, log)
+        self.workers = workers
+        self._cond = threading.Condition()
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, bus, event, handlers, args, kwargs):
+        with self._cond:
+            while not self._put(bus, event, handlers, args, kwargs):
+                if threading.current_thread() in self._threads:
+                    break  # re-entrant emit from a handler, waiting here would deadlock
+                self._cond.wait()
+            else:
+                if not self._threads and not self._closed:
+                    self._start()
+                self._cond.notify()
+                return
+        for fn in handlers:
             fn(*args, **kwargs)
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued event was handled, False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def close(self, wait: bool = True):
+        """Stop the workers, after running what's queued when wait is set. Later events are dropped."""
+        if wait:
+            self.join()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join()
+
+    def _start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"mikmak-events-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        cond = self._cond
+        while True:
+            with cond:
+                job = self._take()
+                while job is None:
+                    if self._closed:
+                        return
+                    cond.wait()
+                    job = self._take()
+                cond.notify_all()  # room for a blocked submit
+            failed = False
+            try:
+                for fn in job.handlers:
+                    fn(*job.args, **job.kwargs)
+            except Exception:
+                failed = True
+                self._log.error("[!] Handler of '%s' failed", job.event, exc_info=True)
+            with cond:
+                self._done(job, failed)
+                cond.notify_all()
+
+
+class AsyncDispatcher(Dispatcher):
+    """
+    Runs handlers as tasks on the client's event loop, for run() and Fleet. Coroutine handlers are awaited,
+    so a handler can `await` I/O without holding up the socket. The loop can't wait for room, so the overflow
+    policy has to be DROP_OLDEST (the default) or COALESCE.
+
+        fleet = Fleet(accounts, dispatcher=AsyncDispatcher(concurrency=64))
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 16,
+        max_pending: int = 1024,
+        overflow: Overflow | str = Overflow.DROP_OLDEST,
+        key: Optional[Callable[[str, tuple], Hashable]] = None,
+        log: Optional[ClientLogger] = None,
+    ):
+        super().__init__(max_pending, overflow, key, log)
+        if self.overflow is Overflow.BLOCK:
+            raise ValueError("AsyncDispatcher can't block the event loop, use Overflow.DROP_OLDEST or Overflow.COALESCE")
+        self.concurrency = concurrency
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._running = 0  # _work tasks that haven't returned, lowered by the tasks themselves
+        self._idle: Optional[asyncio.Event] = None
+
+    def submit(self, bus, event, handlers, args, kwargs):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if self._loop is not None and loop is not self._loop:
+            # emitted from another thread, hand it over
+            self._loop.call_soon_threadsafe(self.submit, bus, event, handlers, args, kwargs)
+            return
+        if loop is None:
+            raise RuntimeError("AsyncDispatcher.submit() needs a running event loop")
+        self._loop = loop
+        self._put(bus, event, handlers, args, kwargs)
+        self._idle = self._idle or asyncio.Event()
+        self._idle.clear()
+        while self._ready and self._running < self.concurrency:
+            self._running += 1
+            task = loop.create_task(self._work())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def join(self):
+        """Wait until every queued event was handled."""
+        while self._pending or self._busy:
+            await self._idle.wait()
+
+    async def close(self, wait: bool = True):
+        """Stop taking events, after running what's queued when wait is set."""
+        if wait:
+            await self.join()
+        self._closed = True
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def _work(self):
+        # a task runs jobs while there are any and exits, submit() starts new ones as needed
+        try:
+            while (job := self._take()) is not None:
+                failed = False
+                try:
+                    for fn in job.handlers:
+                        result = fn(*job.args, **job.kwargs)
+                        if inspect.isawaitable(result):
+                            await result
+                except Exception:
+                    failed = True
+                    self._log.error("[!] Handler of '%s' failed", job.event, exc_info=True)
+                self._done(job, failed)
+        finally:
+            self._running -= 1
+            if not self._pending and not self._busy and self._idle:
+                self._idle.set()
@@ -0,0 +1,71 @@
+"""
+mikmakpy.fixtures
+─────────────────
+Synthetic server messages of any size, in the server's own format. The benchmarks measure on them and
+the mock server (mikmakpy.mockserver) answers with them.
+"""
+
+import json
+from typing import Any, Dict
+
+
+def achievement_list(n: int) -> str:
+    """The "list" field of an achivment_res with n entries."""
+    return "[" + ",".join(
+        f"{{'ach':{i // 4 + 1},'ass':{i % 4 + 1},'p':{i % 3 * 10},'prg':{i * 7 % 1000}}}" for i in range(n)
+    ) + "]"
+
+
+def server_list(n: int) -> str:
+    """The "list" field of a server_list with n servers."""
+    return "[" + ",".join(
+        f"{{\"id\":{i},\"name\":'server {i}',\"ip\":'10.0.0.{i % 256}',\"port\":443,\"capicity\":0.{i % 10},\"safe\":{'true' if i % 2 else 'false'},\"dt\":202602231555}}"
+        for i in range(n)
+    ) + "]"
+
+
+def xt_msg(o: Dict[str, Any]) -> str:
+    return json.dumps({"b": {"r": -1, "o": o}, "t": "xt"}, separators=(",", ":"), ensure_ascii=False)
+
+
+def achievement_msg(n: int, update: bool = False) -> str:
+    o = {"level": 1, "_cmd": "achivment_res", "list": achievement_list(n), "userId": 16340305, "points": 160}
+    if update:
+        o["update"] = "true"
+    return xt_msg(o)
+
+
+def server_list_msg(n: int) -> str:
+    return xt_msg({"safeChat": False, "_cmd": "server_list", "rank": 1, "userName": "bench", "list": server_list(n)})
+
+
+def inventory_msg(n: int) -> str:
+    """inv_list with n entries, every 7th with a quantity."""
+    items = ",".join(f"{1000 + i}-{i % 5 + 2}" if i % 7 == 0 else str(1000 + i) for i in range(n))
+    return xt_msg({"_cmd": "inv_list", "list": items})
+
+
+def room_list_msg(n: int) -> str:
+    """rmList with n rooms, in the attribute order the server uses."""
+    rooms = "".join(
+        f"<rm id='{i}' priv='{i % 9 == 0:d}' temp='0' game='{i % 4 == 0:d}' ucnt='{i * 13 % 120}'"
+        f"{' lmb=' + repr(str(i % 3)) if i % 2 else ''} maxu='{100 + i}' maxs='0'><n><![CDATA[room_{i}]]></n></rm>"
+        for i in range(1, n + 1)
+    )
+    return f"<msg t='sys'><body action='rmList' r='0'><rmList>{rooms}</rmList></body></msg>"
+
+
+def room_users_msg(n: int, room: int = 1) -> str:
+    """joinOK of a room with n avatars in it."""
+    users = "".join(
+        f"<u i='{1000 + i}' m='{i % 50 == 0:d}' s='0' p='-1'><n><![CDATA[player_{i}]]></n>"
+        f"<vars><var n='rank' t='n'><![CDATA[{i % 30 + 1}]]></var></vars></u>"
+        for i in range(n)
+    )
+    return f"<msg t='sys'><body action='joinOK' r='{room}'><pid id='0'/><vars /><uLs r='{room}'>{users}</uLs></body></msg>"
+
+
+def login_res_msg() -> str:
+    return xt_msg(
+        {"date": "20260225", "c": 393150, "_cmd": "login_res", "time": "225903", "k": 200311, "resoulationCtg": 33, "resoulationVal": "beach"}
+    )
@@ -0,0 +1,182 @@
+"""
+mikmakpy.fleet
+──────────────
+Provides the Fleet class for running many accounts in one process, every session multiplexed on a single asyncio event loop.
+"""
+
+import asyncio
+import threading
+from dataclasses import dataclass
+from signal import SIGINT, SIGTERM
+from typing import Callable, Iterable, Iterator
+
+from .constants import Server
+from .login import MikmakLoginClient
+from .metrics import merge
+from .state import GameState
+
+
+@dataclass(frozen=True, slots=True)
+class Account:
+    """Credentials of one fleet member and the server it should end up on."""
+
+    username: str
+    password: str
+    server_to_join: Server | None = Server.KIWI
+
+
+class Fleet:
+    """
+    Runs a MikmakLoginClient (or subclass) per account, all on one event loop, so N sessions cost a constant number of threads.
+
+        fleet = Fleet([Account("bot1", "pw"), ("bot2", "pw")], client_cls=MikmakIngameClient)
+
+        @fleet.on("login_res")
+        def on_login(client, res):
+            print(client.username, res)
+
+        fleet.start()  # blocks, or `await fleet.run()` from your own loop
+
+    Extra keyword arguments are passed to every client's constructor.
+    """
+
+    def __init__(
+        self,
+        accounts: Iterable[Account | tuple[str, str]] = (),
+        client_cls: type[MikmakLoginClient] = MikmakLoginClient,
+        **client_kwargs,
+    ):
+        self._client_cls = client_cls
+        self._client_kwargs = client_kwargs
+        self._clients: dict[str, MikmakLoginClient] = {}
+        self._handlers: list[tuple[str, Callable]] = []
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+        for account in accounts:
+            self.add(account)
+
+    # Public API
+    def add(self, account: Account | tuple[str, str]) -> MikmakLoginClient:
+        """Create a client for the account. If the fleet is already running it's started right away."""
+        if not isinstance(account, Account):
+            account = Account(*account)
+        if account.username in self._clients:
+            raise ValueError(f"Account '{account.username}' is already in the fleet")
+
+        client = self._client_cls(
+            username=account.username,
+            password=account.password,
+            server_to_join=account.server_to_join,
+            **self._client_kwargs,
+        )
+        self._clients[account.username] = client
+        for event, fn in self._handlers:
+            self._subscribe(client, event, fn)
+
+        if self._loop is not None and self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._start_client, client)
+        return client
+
+    def remove(self, username: str) -> MikmakLoginClient:
+        """Disconnect the account's client and drop it from the fleet. Safe to call from any thread."""
+        client = self._clients.pop(username)
+        self._call(self._stop_client, username, client)
+        return client
+
+    def on(self, event: str):
+        """Subscribe to an event on every client (current and future). Handlers get the client as first argument."""
+
+        def decorator(fn):
+            self._handlers.append((event, fn))
+            for client in self._clients.values():
+                self._subscribe(client, event, fn)
+            return fn
+
+        return decorator
+
+    def state(self, username: str) -> GameState:
+        """The ingame_state of one account."""
+        return self._clients[username].ingame_state
+
+    def metrics(self) -> dict:
+        """Every client's metrics_snapshot() summed up, plus the number of clients."""
+        snap = merge(client.metrics_snapshot() for client in self._clients.values())
+        snap.setdefault("gauges", {})["clients"] = len(self._clients)
+        return snap
+
+    async def run(self):
+        """Run every client on the current event loop. Returns once all of them have stopped."""
+        self._loop = asyncio.get_running_loop()
+        for client in self._clients.values():
+            self._start_client(client)
+        while self._tasks:
+            await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+            self._tasks = {u: t for u, t in self._tasks.items() if not t.done()}
+        self._loop = None
+
+    def start(self):
+        """Blocking version of run(). Installs SIGINT/SIGTERM handlers when called from the main thread."""
+
+        async def main():
+            if threading.current_thread() is threading.main_thread():
+                loop = asyncio.get_running_loop()
+                for sig in (SIGINT, SIGTERM):
+                    loop.add_signal_handler(sig, self.stop)
+            await self.run()
+
+        asyncio.run(main())
+
+    def stop(self):
+        """Disconnect every client. Safe to call from any thread."""
+        if self._loop is not None:
+            self._call(self._stop_all)
+
+    @property
+    def clients(self) -> list[MikmakLoginClient]:
+        return list(self._clients.values())
+
+    def __getitem__(self, username: str) -> MikmakLoginClient:
+        return self._clients[username]
+
+    def __contains__(self, username: str) -> bool:
+        return username in self._clients
+
+    def __iter__(self) -> Iterator[MikmakLoginClient]:
+        return iter(self._clients.values())
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    # Private methods
+    @staticmethod
+    def _subscribe(client: MikmakLoginClient, event: str, fn: Callable):
+        client.on(event)(lambda *args, **kwargs: fn(client, *args, **kwargs))
+
+    def _start_client(self, client: MikmakLoginClient):
+        task = self._tasks.get(client.username)
+        if task is None or task.done():
+            self._tasks[client.username] = asyncio.create_task(client.run())
+
+    def _stop_all(self):
+        for username, task in self._tasks.items():
+            self._clients[username].disconnect()
+            task.cancel()
+
+    def _stop_client(self, username: str, client: MikmakLoginClient):
+        client.disconnect()
+        task = self._tasks.pop(username, None)
+        if task is not None:
+            task.cancel()
+
+    def _call(self, fn: Callable, *args):
+        """Run fn on the fleet's loop: right away from the loop's thread (or when not running), else handed over."""
+        loop = self._loop
+        try:
+            running_here = asyncio.get_running_loop() is loop
+        except RuntimeError:
+            running_here = False
+        if loop is None or running_here:
+            fn(*args)
+        else:
+            loop.call_soon_threadsafe(fn, *args)
@@ -3,10 +3,80 @@ mikmakpy.ingame
 ─────────────────
 
 """
-from .login import MikmakLoginClient
+from .constants import MessageKind
+from .login import MikmakLoginClient, handles
+from .protocol import parse
+from .state import PlayerTable
 
 class MikmakIngameClient(MikmakLoginClient):
     """
     MikmakIngameClient extends MikmakLoginClient to handle in-game events and interactions after successfully logging in and joining a game server. It provides additional functionality for parsing in-game messages, managing the game state, and responding to various in-game events such as room lists, inventory updates, and more. This class is designed to be used after the initial login process is complete and the client has switched to the game server.
+    In-game messages are handled by methods decorated with @handles(kind, command), see mikmakpy.login.handles.
+    The avatars in the client's room are kept in ingame_state.players (a PlayerTable), with room_players(room, players)
+    on join and player_joined(player) / player_left(player) as they come and go.
     """
-    
\ No newline at end of file
+
+    def __init__(self, *args, max_players: int = 1000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ingame_state.players = PlayerTable(max_players)  # who is in the room, see the player_* events
+
+    def _reset_session_state(self):
+        super()._reset_session_state()
+        self.ingame_state.players.clear()
+
+    @handles(MessageKind.SYS, "joinOK")
+    def _on_join_ok(self, msg: str):
+        super()._on_join_ok(msg)
+        parsed = parse.room_users(msg)
+        if not parsed.ok:
+            self.log.parsing_error("[!] Failed to parse room users: %s", parsed.error)
+            self.metrics.parse_failures["joinOK"] += 1
+            return
+
+        # joining a room leaves the previous one, nobody from there is in view anymore
+        room, players = parsed.value
+        table = self.ingame_state.players
+        table.clear()
+        table.set_room(room, players)
+        if self.has_listeners("room_players"):
+            self.emit("room_players", room, table.in_room(room))
+
+    @handles(MessageKind.SYS, "uER")
+    def _on_user_enter(self, msg: str):
+        parsed = parse.user_enter(msg)
+        if not parsed.ok:
+            self.log.parsing_error("[!] Failed to parse user enter: %s", parsed.error)
+            self.metrics.parse_failures["uER"] += 1
+            return
+        if self.ingame_state.players.add(parsed.value) and self.has_listeners("player_joined"):
+            self.emit("player_joined", parsed.value)
+
+    @handles(MessageKind.SYS, "userGone")
+    def _on_user_gone(self, msg: str):
+        parsed = parse.user_gone(msg)
+        if not parsed.ok:
+            self.log.parsing_error("[!] Failed to parse user gone: %s", parsed.error)
+            self.metrics.parse_failures["userGone"] += 1
+            return
+        player = self.ingame_state.players.remove(parsed.value[1])
+        if player is not None and self.has_listeners("player_left"):
+            self.emit("player_left", player)
+
+    @handles(MessageKind.XT, "inv_list")
+    def _on_inv_list(self, msg: str):
+        parsed = parse.inventory(msg)
+        if not parsed.ok:
+            self.log.parsing_error("[!] Failed to parse inventory: %s", parsed.error)
+            self.metrics.parse_failures["inv_list"] += 1
+            return
+
+        inventory = self.ingame_state.inventory
+        if inventory is None:
+            self.ingame_state.inventory = parsed.value
+            self.emit("inventory", parsed.value)
+            return
+
+        # a fresh full list, only tell about what changed
+        delta = inventory.sync(parsed.value, self.has_listeners("inventory_changed"))
+        if delta:
+            self.emit("inventory_changed", delta)
@@ -0,0 +1,181 @@
+"""
+mikmakpy.log
+────────────
+Logging for the clients that stays off the hot path. Each LoggerLevel is a method on ClientLogger that is
+either a no-op (level disabled, decided once) or appends the unformatted record to a ring buffer. A background
+thread drains the buffer into the standard `logging` module, so formatting and the actual writes never happen on
+the thread reading the socket.
+
+    log = ClientLogger({LoggerLevel.INCOMING}, username="bot")
+    log.incoming("[←] %s", msg)                 # formatted later, by the writer thread, only if enabled
+    log.parsing_error("[!] bad list: %s", err)  # no-op, PARSING_ERROR is off
+
+Records go to the "mikmakpy" logger (INCOMING/OUTGOING at DEBUG, CONNECTION_CHANGE at INFO, PARSING_ERROR at
+WARNING, INTERNAL_ERROR and error() at ERROR), with the LoggerLevel as record.mikmak_level and the logger's
+context (e.g. username) as record attributes. When nothing configured logging, messages are printed to stdout
+as before.
+"""
+
+import atexit
+from collections import deque
+import logging
+import sys
+import threading
+from time import time
+from typing import Any, Iterable, Optional
+
+from .constants import LoggerLevel
+
+STDLIB_LEVELS = {
+    LoggerLevel.INCOMING: logging.DEBUG,
+    LoggerLevel.OUTGOING: logging.DEBUG,
+    LoggerLevel.CONNECTION_CHANGE: logging.INFO,
+    LoggerLevel.PARSING_ERROR: logging.WARNING,
+    LoggerLevel.INTERNAL_ERROR: logging.ERROR,
+}
+
+
+def _noop(*args, **kwargs):
+    pass
+
+
+class FrameText:
+    """An encoded frame as a log argument, decoded only if the record is actually written."""
+
+    __slots__ = ("data",)
+
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def __str__(self) -> str:
+        return self.data.rstrip(b"\x00").decode("utf-8", errors="replace")
+
+
+class LogSink:
+    """
+    Bounded ring buffer of pending records plus the thread that writes them out every flush_interval seconds.
+    When the buffer is full the oldest records are overwritten (counted in dropped), logging never blocks.
+    """
+
+    def __init__(self, logger: Optional[logging.Logger] = None, capacity: int = 10_000, flush_interval: float = 0.05):
+        self.logger = logger or logging.getLogger("mikmakpy")
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._buffer: deque = deque(maxlen=capacity)
+        self._drain_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def put(self, record: tuple):
+        buffer = self._buffer
+        if len(buffer) == buffer.maxlen:
+            self.dropped += 1
+        buffer.append(record)  # deque.append is atomic, no lock needed
+        if self._thread is None:
+            self._start()
+
+    def flush(self):
+        """Write everything pending now, from the calling thread."""
+        buffer = self._buffer
+        logger = self.logger
+        with self._drain_lock:
+            while buffer:
+                try:
+                    created, levelno, key, msg, args, exc_info, fields = buffer.popleft()
+                except IndexError:
+                    break
+                record = logger.makeRecord(logger.name, levelno, "", 0, msg, args, exc_info, extra=fields)
+                record.created = created
+                record.msecs = (created % 1) * 1000
+                record.mikmak_level = key
+                logger.handle(record)
+
+    def close(self):
+        self._closed.set()
+        self.flush()
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            _default_handler(self.logger)
+            self._thread = threading.Thread(target=self._run, name="mikmak-log", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        while not self._closed.wait(self.flush_interval):
+            if self._buffer:
+                try:
+                    self.flush()
+                except Exception:
+                    pass  # a broken handler mustn't kill the writer
+
+
+def _default_handler(logger: logging.Logger):
+    """Keep the old behaviour of printing enabled levels to stdout, unless the application configured logging itself."""
+    if logger.hasHandlers():
+        return
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+
+
+_shared_sink: Optional[LogSink] = None
+_shared_lock = threading.Lock()
+
+
+def shared_sink() -> LogSink:
+    """The process wide sink every ClientLogger uses unless given another one."""
+    global _shared_sink
+    with _shared_lock:
+        if _shared_sink is None:
+            _shared_sink = LogSink()
+        return _shared_sink
+
+
+class ClientLogger:
+    """
+    One method per LoggerLevel (incoming, outgoing, connection_change, parsing_error, internal_error), taking
+    a %-style message and its arguments, plus error(), which is always on and used for failures that must not go
+    unseen (a crashing handler, a broken connection). Pass exc_info=True to attach the current exception and
+    keyword arguments to add fields to the record.
+    """
+
+    def __init__(self, levels: Iterable[LoggerLevel] = (), sink: Optional[LogSink] = None, **context: Any):
+        self.sink = sink
+        self.context = context
+        self.set_levels(levels)
+
+    def set_levels(self, levels: Iterable[LoggerLevel]):
+        self.levels = frozenset(levels)
+        for level in LoggerLevel:
+            if level in self.levels:
+                setattr(self, level.value, self._emitter(level, STDLIB_LEVELS[level]))
+            else:
+                setattr(self, level.value, _noop)
+
+    def enabled(self, level: LoggerLevel) -> bool:
+        return level in self.levels
+
+    def error(self, msg: str, *args, exc_info: bool = False, **fields):
+        self._emit(LoggerLevel.INTERNAL_ERROR, logging.ERROR, msg, args, exc_info, fields)
+
+    def _emitter(self, level: LoggerLevel, levelno: int):
+        emit = self._emit
+
+        def log(msg: str, *args, exc_info: bool = False, **fields):
+            emit(level, levelno, msg, args, exc_info, fields)
+
+        return log
+
+    def _emit(self, level: LoggerLevel, levelno: int, msg: str, args: tuple, exc_info: bool, fields: dict):
+        if self.context:
+            fields = {**self.context, **fields}
+        sink = self.sink or shared_sink()
+        sink.put((time(), levelno, level, msg, args, sys.exc_info() if exc_info else None, fields))
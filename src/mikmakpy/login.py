@@ -4,58 +4,132 @@ mikmakpy.login
 
 """
 
+import asyncio
 from signal import signal, SIGINT, SIGTERM
-from time import sleep
+import threading
+from time import monotonic, perf_counter
 
-from .events import EventBus
-from .constants import Server, LoggerLevel
-from .connection import Connection
-from .protocol import encode, parse
+from .events import Dispatcher, EventBus
+from .constants import Server, LoggerLevel, MessageKind
+from .connection import Connection, AsyncConnection, SendLimits, SocketOptions
+from .protocol import encode, decode, parse, packets, PacketTemplate
+from .models import ServerInfo
+from .state import AchievementStore, GameState
+from .reconnect import Backoff, ReconnectStats
+from .servers import ServerListCache, ServerSelector
+from .recorder import SessionRecorder
+from .log import ClientLogger, FrameText
+from .metrics import Metrics
+
+
+def handles(kind: MessageKind, *commands: str):
+    """
+    Mark a client method as the handler of the given sys actions / xt commands.
+    Subclasses decorate their own methods, each class collects them into one dispatch table.
+    """
+
+    def decorator(fn):
+        fn._handles = getattr(fn, "_handles", ()) + tuple((kind, cmd) for cmd in commands)
+        return fn
+
+    return decorator
+
+
+# what MikmakLoginClient._lifecycle() asks its driver to do
+_CHOOSE, _SESSION, _WAIT = "choose", "session", "wait"
+
+
+def _advance(lifecycle, reply):
+    """Send reply into the lifecycle generator, returns its next step, None once it's done."""
+    try:
+        return lifecycle.send(reply)
+    except StopIteration:
+        return None
+
+
+# (kind, command) -> "kind:command", the name of the raw per-command event. Capped, the server picks the commands
+_RAW_EVENTS: dict[tuple[MessageKind, str], str] = {}
+_RAW_EVENTS_MAX = 1024
+
+
+def _collect_handlers(cls) -> dict[tuple[MessageKind, str], str]:
+    table = {}
+    for klass in reversed(cls.__mro__):
+        for name, attr in vars(klass).items():
+            for key in getattr(attr, "_handles", ()):
+                table[key] = name
+    return table
 
 
 class MikmakLoginClient(EventBus):
+    # (kind, command) -> handler method name, built from @handles for every class
+    _message_handlers: dict[tuple[MessageKind, str], str] = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._message_handlers = _collect_handlers(cls)
+
     def __init__(
         self,
         username: str,
         password: str,
         logger_levels: set[LoggerLevel] = set(),
         server_to_join: Server | None = Server.KIWI,
-        reconnection_delay: int = 5,
+        reconnection_delay: float = 5,
         max_retries: int = 2,
+        max_reconnection_delay: float = 60,
+        healthy_after: float = 60,
         clean_ingame: bool = True,
         starting_ip: str = "213.8.147.198",
         port: int = 443,
+        send_limits: SendLimits = SendLimits(),
+        socket_options: SocketOptions = SocketOptions(),
+        server_cache: ServerListCache | None = None,
+        server_selector: ServerSelector | None = None,
+        recorder: SessionRecorder | None = None,
+        dispatcher: Dispatcher | None = None,
     ):
-        super().__init__()
+        super().__init__(dispatcher)  # opt-in: run event handlers off the receive loop, see ThreadDispatcher/AsyncDispatcher
         self.username = username
         self.password = password
-        self.logger_levels = logger_levels
+        self.log = ClientLogger(logger_levels, username=username)
         self.server_to_join = server_to_join
         self.reconnection_delay = reconnection_delay
-        self.max_retries = max_retries
+        self.max_retries = max_retries  # consecutive failed reconnects before giving up
+        self.healthy_after = healthy_after  # a connection that lived this long (seconds) resets the retry count
+        self.backoff = Backoff(reconnection_delay, max_reconnection_delay)
+        self.reconnect_stats = ReconnectStats()
+        self.metrics = Metrics()  # see metrics_snapshot()
         self.clean_ingame = clean_ingame # Try to make the game state as clean as possible, for example remove empty rooms from the room list, or servers with 0 capacity from the server list. This is just a quality of life thing for users of the client, it has no effect on the actual connection or login process. just remove data that is not useful while giving the option to keep it if someone wants to use it for something.
         self.starting_ip = starting_ip
         self.port = port
+        self.send_limits = send_limits  # outgoing rate limits and queue size, see SendLimits
+        self.socket_options = socket_options  # TCP_NODELAY, buffer sizes and read sizes, see SocketOptions
+        self.server_cache = server_cache  # opt-in: with a cached server list, connect straight to the game server
+        self.server_selector = server_selector  # opt-in: pick the game server by latency and load instead of the first name match
+        self.recorder = recorder  # opt-in: record every frame of every connection, see mikmakpy.recorder
 
         # Connection state
-        self._conn: Connection | None = None
+        self._conn: Connection | AsyncConnection | None = None
         self._is_first_connection = True
-        self._target_server: dict | None = None
+        self._target_server: ServerInfo | None = None
         self._running = False
         self._retry_count = 0
+        self._switching = False  # the current connection is closed on purpose to move to the game server
+        self._session_started = 0.0
+        self._lost_at: float | None = None  # when the connection was lost, until a new one is up
+        self._logged_in = False  # the current connection got a login_res
+        self._from_cache = False  # _target_server came from server_cache, not from this session's server_list
+        self._pending_servers: list | None = None  # server_list waiting for server_selector, probed between connections
+        self._selected: ServerInfo | None = None  # counted by server_selector until we leave it, see _release_selected()
+        self._login_started: float | None = None  # first connection of the current login attempt, until joinOK
+        self._logged_in_at: float | None = None
+        self._stop = threading.Event()  # wakes the reconnect wait on disconnect()
+        self._wake: asyncio.Event | None = None  # the same for run(), on _wake_loop
+        self._wake_loop: asyncio.AbstractEventLoop | None = None
 
         # State collected from proccessing messages, can be used by subclass or event handlers or internal logic as needed
-        self.ingame_state = {
-            "username": None,
-            "user_id": None,
-            "rank": None,
-            "xp": None,
-            "safe_chat": None,
-            "server_list": None,
-            "room_list": None,
-            "login_res": None,
-            "achievements": None,
-        }
+        self.ingame_state = GameState()
 
         # ── nested namespaces ──────────────────────────────────────────────
         self._send = self._SendInternal(self)
@@ -63,18 +137,85 @@ class MikmakLoginClient(EventBus):
     # Public API
     def connect(self):
         """Start the client. Blocks until stopped."""
-        signal(SIGINT, self._exit_signal_handler)
-        signal(SIGTERM, self._exit_signal_handler)
+        # signal handlers can only be installed from the main thread
+        if threading.current_thread() is threading.main_thread():
+            signal(SIGINT, self._exit_signal_handler)
+            signal(SIGTERM, self._exit_signal_handler)
         self._running = True
-        self._run()
+        self._stop.clear()
+        self._supervise()
+
+    async def run(self):
+        """
+        Run the client on the current event loop. Returns once stopped.
+        Doesn't install signal handlers, so any number of clients can be awaited together:
+            await asyncio.gather(*(c.run() for c in clients))
+        """
+        self._running = True
+        self._wake = asyncio.Event()
+        self._wake_loop = asyncio.get_running_loop()
+        lifecycle = self._lifecycle(AsyncConnection)
+        try:
+            step = next(lifecycle, None)
+            while step is not None:
+                kind, arg = step
+                if kind is _CHOOSE:
+                    reply = await self.server_selector.choose(arg, self.server_to_join)
+                elif kind is _SESSION:
+                    reply = await self._run_session_async(*arg)
+                else:
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), arg)
+                    except TimeoutError:
+                        pass
+                    reply = None
+                step = _advance(lifecycle, reply)
+        finally:
+            self._wake = self._wake_loop = None
 
     def disconnect(self):
         """Tear down the connection."""
         self._running = False
+        self._stop.set()
+        if self._wake is not None:
+            # run()'s reconnect wait, disconnect() may be called from any thread
+            self._wake_loop.call_soon_threadsafe(self._wake.set)
+        self._release_selected()
         if self._conn:
             self._conn.close()
             self._conn = None
 
+    @property
+    def logger_levels(self) -> frozenset[LoggerLevel]:
+        return self.log.levels
+
+    @logger_levels.setter
+    def logger_levels(self, levels: set[LoggerLevel]):
+        self.log.set_levels(levels)
+
+    def metrics_snapshot(self) -> dict:
+        """self.metrics plus reconnect counters and current state as gauges, see mikmakpy.metrics."""
+        snap = self.metrics.snapshot()
+        stats = self.reconnect_stats
+        snap["counters"] = {
+            "disconnects": stats.disconnects,
+            "reconnect_attempts": stats.attempts,
+            "connect_failures": stats.failures,
+            "reconnects": stats.reconnects,
+        }
+        queue = self.send_queue
+        snap["gauges"] = {
+            "connected": int(self._conn is not None and self._running),
+            "logged_in": int(self._logged_in),
+            "send_queue_depth": queue.depth if queue else 0,
+        }
+        return snap
+
+    @property
+    def send_queue(self):
+        """The outgoing queue of the current connection (depth, stats()), None when not connected."""
+        return self._conn.send_queue if self._conn else None
+
     # Private methods
     class _SendInternal:
         """Low-level send primitives. Access via client._send.*"""
@@ -82,213 +223,393 @@ class MikmakLoginClient(EventBus):
         def __init__(self, client: MikmakLoginClient):
             self._c = client
 
-        def raw(self, message: str):
-            if LoggerLevel.OUTGOING in self._c.logger_levels:
-                print(f"[→] {message}")
+        def raw(self, message: str) -> bool:
+            """Queue a message. False means it was refused: not connected, or the send queue is full (back off)."""
+            self._c.log.outgoing("[→] %s", message)
+            if self._c._conn:
+                return self._c._conn.send(message)
+            return False
+
+        def encoded(self, data: bytes, command: str = "") -> bool:
+            """Queue pre-encoded frame bytes as is, command is only used for rate limiting."""
+            self._c.log.outgoing("[→] %s", FrameText(data))
             if self._c._conn:
-                self._c._conn.send(message)
+                return self._c._conn.send_bytes(data, command)
+            return False
+
+        def template(self, template: PacketTemplate, *values) -> bool:
+            return self.encoded(template.render(*values), template.cmd)
 
-        def xt(self, cmd: str, p: dict, x: str = "ExtManager", r: int = -1):
-            self.raw(encode.xt(cmd, p, x, r))
+        def xt(self, cmd: str, p: dict, x: str = "ExtManager", r: int = -1) -> bool:
+            return self.raw(encode.xt(cmd, p, x, r))
 
-        def sys(self, action: str, body: str, r: int = 0):
-            self.raw(encode.sys(action, body, r))
+        def sys(self, action: str, body: str, r: int = 0) -> bool:
+            return self.raw(encode.sys(action, body, r))
 
     # Connection cycle
     def _exit_signal_handler(self, signum, frame):
-        if LoggerLevel.CONNECTION_CHANGE in self.logger_levels:
-            print("[!] Signal received, shutting down...")
+        self.log.connection_change("[!] Signal received, shutting down...")
         self.disconnect()
 
     def _on_connect(self):
-        if LoggerLevel.CONNECTION_CHANGE in self.logger_levels:
-            print(f"\n[!] Connecting to {self.starting_ip}:{self.port} ...")
+        self.log.connection_change("\n[!] Connecting to %s:%s ...", self.starting_ip, self.port)
         self._send.sys("verChk", "<ver v='165' />")
 
-    def _on_disconnect(self):
-        if self._running and self._retry_count < self.max_retries:
-            self._retry_count += 1
-            if LoggerLevel.CONNECTION_CHANGE in self.logger_levels:
-                print(
-                    f"[!] Disconnected. Attempting to reconnect ({self._retry_count}/{self.max_retries}) in {self.reconnection_delay} seconds..."
-                )
-            sleep(self.reconnection_delay)
-            self._run()
+    def _supervise(self):
+        """Drives _lifecycle() with blocking I/O, see run() for the async twin."""
+        lifecycle = self._lifecycle(Connection)
+        step = next(lifecycle, None)
+        while step is not None:
+            kind, arg = step
+            if kind is _CHOOSE:
+                reply = self.server_selector.choose_blocking(arg, self.server_to_join)
+            elif kind is _SESSION:
+                reply = self._run_session(*arg)
+            else:
+                reply = self._stop.wait(arg)
+            step = _advance(lifecycle, reply)
+
+    def _lifecycle(self, connection_cls):
+        """
+        The connection lifecycle, shared by connect() and run(): one connection at a time, backoff in between, no recursion.
+        Every decision (address, retries, backoff, stats) is made here, the I/O is yielded to the driver as (kind, arg):
+            _CHOOSE, servers        send back the server_selector's choice
+            _SESSION, (conn, addr)  connect and listen until it's closed, send back whether it connected
+            _WAIT, delay            wait, or less if disconnect() is called
+        """
+        while self._running:
+            if self._pending_servers is not None:
+                servers, self._pending_servers = self._pending_servers, None
+                self._release_selected()
+                self._use_selected((yield _CHOOSE, servers))
+                if not self._running:
+                    break
+            address = self._next_address()
+            conn = self._conn = connection_cls(
+                on_message=self._on_message,
+                on_connect=self._on_connect,
+                send_limits=self.send_limits,
+                socket_options=self.socket_options,
+                recorder=self.recorder,
+                log=self.log,
+                metrics=self.metrics,
+            )
+            connected = yield _SESSION, (conn, address)
+            conn.close()
 
-    def _run(self):
-        ip = self.starting_ip
-        port = self.port
+            delay = self._session_closed(connected)
+            if delay is None:
+                break
+            if delay:
+                yield _WAIT, delay
 
-        if not self._is_first_connection and self._target_server:
-            ip = self._target_server.get("ip", self.starting_ip)
-            port = int(self._target_server.get("port", self.port))
-
-        self._conn = Connection(
-            on_message=self._on_message,
-            on_disconnect=self._on_disconnect,
-            on_connect=self._on_connect,
-        )
+    def _run_session(self, conn: Connection, address: tuple[str, int]) -> bool:
+        connected = False
+        try:
+            conn.connect(*address)
+            connected = True
+            self._session_opened()
+            conn.listen()
+        except Exception as e:
+            self.log.internal_error("[!] Connection error: %s", e)
+        return connected
 
+    async def _run_session_async(self, conn: AsyncConnection, address: tuple[str, int]) -> bool:
+        connected = False
         try:
-            self._conn.connect(ip, port)
-            self._conn.listen()
+            await conn.connect(*address)
+            connected = True
+            self._session_opened()
+            await conn.listen()
         except Exception as e:
-            if LoggerLevel.INTERNAL_ERROR in self.logger_levels:
-                print(f"[!] Connection error: {e}")
-            self._on_disconnect()
+            self.log.internal_error("[!] Connection error: %s", e)
+        return connected
+
+    def _session_opened(self):
+        now = monotonic()
+        self._session_started = now
+        if self._login_started is None:
+            self._login_started = now
+        if self._lost_at is not None:
+            self.reconnect_stats.record_latency(now - self._lost_at)
+            self.metrics.phases["reconnect"].observe(now - self._lost_at)
+            self._lost_at = None
+
+    def _session_closed(self, connected: bool) -> float | None:
+        """
+        Called exactly once per connection, when it's gone. Returns how long to wait before the next one, None to stop.
+        Planned switches reconnect right away, a connection that stayed up healthy_after seconds resets the retry count.
+        """
+        if not self._running:
+            return None
+        logged_in, self._logged_in = self._logged_in, False
+        if self._switching:
+            self._switching = False
+            return 0.0
+
+        now = monotonic()
+        if connected and now - self._session_started >= self.healthy_after:
+            self._retry_count = 0
+        if not connected:
+            self.reconnect_stats.failures += 1
+        if self._lost_at is None:
+            self._lost_at = now
+            self.reconnect_stats.disconnects += 1
+
+        if not self._is_first_connection and not logged_in:
+            # going straight to the game server didn't log us in, go through the login server again next time
+            from_cache = self._from_cache
+            self._is_first_connection = True
+            self._target_server = None
+            self._release_selected()
+            self._from_cache = False
+            if self.server_cache:
+                self.server_cache.invalidate(self._cache_key)
+            if from_cache:
+                self.log.connection_change("[!] Cached game server didn't work out, falling back to the full login...")
+                return 0.0
+
+        if self._retry_count >= self.max_retries:
+            self.log.connection_change("[!] Disconnected. Giving up after %d reconnect attempts.", self._retry_count)
+            self._running = False
+            self._release_selected()
+            return None
+
+        delay = self.backoff.delay(self._retry_count)
+        self._retry_count += 1
+        self.reconnect_stats.attempts += 1
+        self.log.connection_change(
+            "[!] Disconnected. Attempting to reconnect (%d/%d) in %.1f seconds...", self._retry_count, self.max_retries, delay
+        )
+        return delay
+
+    @property
+    def _cache_key(self) -> str:
+        return f"{self.starting_ip}:{self.port}"
+
+    def _next_address(self) -> tuple[str, int]:
+        """The starting server on the first phase, the chosen game server after that."""
+        if self._is_first_connection and self.server_cache and (self.server_to_join or self.server_selector):
+            if self.server_selector:
+                # no time to probe here, pick() goes by the probes already cached
+                srv = self._selected = self.server_selector.pick(self.server_cache.get(self._cache_key) or [], self.server_to_join)
+            else:
+                srv = self.server_cache.find(self._cache_key, self.server_to_join)
+            if srv is not None:
+                # fast path, skip the login server
+                self._target_server = srv
+                self._is_first_connection = False
+                self._from_cache = True
+                self.ingame_state.server_list = self.server_cache.get(self._cache_key)
+                self.log.connection_change("[→] using cached server '%s' @ %s:%s", srv.name, srv.ip, srv.port)
+
+        if not self._is_first_connection and self._target_server:
+            return self._target_server.ip, self._target_server.port
+        return self.starting_ip, self.port
+
+    def _use_selected(self, srv: ServerInfo | None):
+        """Take the server_selector's choice as the game server, stop if there was nothing to choose."""
+        if srv is None:
+            self.log.connection_change("[!] No reachable server to join (wanted '%s'), Disconnecting...", self.server_to_join)
+            self._is_first_connection = True
+            self.disconnect()
+            return
+        self._target_server = self._selected = srv
+        self.log.connection_change("[→] selected '%s' @ %s:%s", srv.name, srv.ip, srv.port)
+
+    def _release_selected(self):
+        """Hand the selected game server back to server_selector, so its spreading stops counting this client there."""
+        srv, self._selected = self._selected, None
+        if srv is not None and self.server_selector:
+            self.server_selector.release(srv)
 
     # ── Message handler ──────────────────────────────────────────────────────
     def _on_message(self, msg: str):
-        if LoggerLevel.INCOMING in self.logger_levels:
-            print(f"[←] {msg}")
+        self.log.incoming("[←] %s", msg)
+
+        key = decode.classify(msg)
+        metrics = self.metrics
+        metrics.commands[key] += 1
+        name = self._message_handlers.get(key)
+        if name is not None:
+            start = perf_counter()
+            getattr(self, name)(msg)
+            elapsed = perf_counter() - start
+            metrics.handler_seconds[key] += elapsed
+            metrics.handler.observe(elapsed)
+
+        # raw frames as "xt:<cmd>" / "sys:<action>" events, subscribe to one command or to "xt:*"
+        raw = _RAW_EVENTS.get(key)
+        if raw is None:
+            raw = f"{key[0]}:{key[1]}"
+            if len(_RAW_EVENTS) < _RAW_EVENTS_MAX:
+                _RAW_EVENTS[key] = raw
+        if self.has_listeners(raw):
+            self.emit(raw, msg)
+        if self.has_listeners("message"):
+            self.emit("message", msg)
+
+    # Login flow, in both connection phases.
+    @handles(MessageKind.SYS, "apiOK")
+    def _on_api_ok(self, msg: str):
+        pwd = (
+            ("cluster_" + self.password)
+            if not self._is_first_connection
+            else self.password
+        )
+        self._send.sys(
+            "login",
+            f"<login z='VW'><nick><![CDATA[{self.username}]]></nick>"
+            f"<pword><![CDATA[{pwd}]]></pword></login>",
+        )
 
-        self._handle_login_messages(msg)
-        self._handle_game_messages(msg)
-        self.emit("message", msg)
+    @handles(MessageKind.XT, "server_list")
+    def _on_server_list(self, msg: str):
+        if not self._is_first_connection:
+            return
 
-    def _handle_login_messages(self, msg: str):
-        """Handle messages relevant to the login process. in both connection phases."""
-        if msg.startswith("<cross-domain-policy>"):
+        parsed = parse.server_list(msg)
+        if not parsed.ok:
+            self.log.parsing_error("[!] Failed to parse server list: %s", parsed.error)
+            self.metrics.parse_failures["server_list"] += 1
             return
 
-        if "action='apiOK'" in msg:
-            pwd = (
-                ("cluster_" + self.password)
-                if not self._is_first_connection
-                else self.password
-            )
-            self._send.sys(
-                "login",
-                f"<login z='VW'><nick><![CDATA[{self.username}]]></nick>"
-                f"<pword><![CDATA[{pwd}]]></pword></login>",
-            )
+        state = self.ingame_state
+        state.username = parsed.value["userName"]
+        state.rank = parsed.value["rank"]
+        state.safe_chat = parsed.value["safeChat"]
+        state.server_list = parsed.value["servers"]
+
+        self.metrics.phases["login_server"].observe(monotonic() - self._session_started)
+        servers = parsed.value["servers"]
+        if self.server_cache:
+            self.server_cache.put(self._cache_key, servers)
+        self.emit("server_list", servers)
+
+        if self.server_selector:
+            # probing takes a while, the supervisor does it after this connection is closed
+            self._pending_servers = servers
+            self._is_first_connection = False
+            self._switching = True
+            self._conn.close()
+            return
 
-        if self._is_first_connection and '"_cmd":"server_list"' in msg:
-            parsed = parse.server_list(msg)
-            if not parsed.ok and LoggerLevel.PARSING_ERROR in self.logger_levels:
-                print(f"[!] Failed to parse server list: {parsed.error}")
-                return
-
-            self.ingame_state["username"] = parsed.value.get("userName")
-            self.ingame_state["rank"] = parsed.value.get("rank")
-            self.ingame_state["safe_chat"] = parsed.value.get("safeChat")
-            self.ingame_state["server_list"] = parsed.value.get("servers")
-
-            servers = parsed.value["servers"]
-            self.emit("server_list", servers)
-
-            if self.server_to_join:
-                for srv in servers:
-                    if self.server_to_join in str(srv.get("name", "")):
-                        self._target_server = srv
-                        self._is_first_connection = False
-                        if LoggerLevel.CONNECTION_CHANGE in self.logger_levels:
-                            print(
-                                f"[→] switching to '{self.server_to_join}' @ {srv['ip']}:{srv['port']}"
-                            )
-                        self._conn.close()
-                        return
-
-            # If we got here, we didn't find the server we wanted (or server_to_join was None), so we'll just exit.
-            if LoggerLevel.CONNECTION_CHANGE in self.logger_levels:
-                print(
-                    f"[!] Server '{self.server_to_join}' not found in server list: {[srv['name'] for srv in servers if 'name' in srv]}, Cannot auto-join, Disconnecting..."
-                )
-            self.disconnect()
+        if self.server_to_join:
+            for srv in servers:
+                if self.server_to_join in srv.name:
+                    self._target_server = srv
+                    self._is_first_connection = False
+                    self._switching = True
+                    self.log.connection_change("[→] switching to '%s' @ %s:%s", self.server_to_join, srv.ip, srv.port)
+                    self._conn.close()
+                    return
+
+        # If we got here, we didn't find the server we wanted (or server_to_join was None), so we'll just exit.
+        self.log.connection_change(
+            "[!] Server '%s' not found in server list: %s, Cannot auto-join, Disconnecting...",
+            self.server_to_join,
+            [srv.name for srv in servers],
+        )
+        self.disconnect()
 
-        # here ends the first connection phase, the next messages are from the game server after we've logged in and switched servers, so we can handle them separately if we want
+    # here ends the first connection phase, the next messages are from the game server after we've logged in and switched servers
 
-        if "action='rmList'" in msg:
-            parsed = parse.room_list(msg, self.clean_ingame)
-            if not parsed.ok and LoggerLevel.PARSING_ERROR in self.logger_levels:
-                print(f"[!] Failed to parse room list: {parsed.error}")
-                return
-            self.ingame_state["room_list"] = parsed.value
+    @handles(MessageKind.SYS, "rmList")
+    def _on_room_list(self, msg: str):
+        parsed = parse.room_table(msg, self.clean_ingame)
+        if not parsed.ok:
+            self.log.parsing_error("[!] Failed to parse room list: %s", parsed.error)
+            self.metrics.parse_failures["rmList"] += 1
+            return
+        self.ingame_state.room_list = parsed.value
+        if self.has_listeners("room_list"):
             self.emit("room_list", parsed.value)
 
-        if '"_cmd":"login_res"' in msg:
-            parsed = parse.login_res(msg)
-            if not parsed.ok and LoggerLevel.PARSING_ERROR in self.logger_levels:
-                print(f"[!] Failed to parse login response: {parsed.error}")
-                return
-            self.ingame_state["login_res"] = parsed.value
-            self.emit("login_res", parsed.value)
-
-        # handle this on login logic too because, it's before the client can really do anything, so might as well have it here.
-        if '"_cmd":"achivment_res"' in msg:
-            parsed = parse.achievement_res(msg)
-            if not parsed.ok:
-                if LoggerLevel.PARSING_ERROR in self.logger_levels:
-                    print(f"[!] Failed to parse achievement response: {parsed.error}")
-                return
-
-            # local-only helper (used only here)
-            def merge_achievements(existing, incoming, is_update):
-                # snapshot or nothing to merge into
-                if not is_update or not existing:
-                    return incoming
-
-                merged_by_key = {}
-                for a in existing:
-                    k = a.get("key")
-                    if isinstance(k, str):
-                        merged_by_key[k] = dict(a)
-
-                for a in incoming:
-                    k = a.get("key")
-                    if not isinstance(k, str):
-                        continue
-                    if k in merged_by_key:
-                        merged_by_key[k].update(a)   # patch progress/points/etc
-                    else:
-                        merged_by_key[k] = dict(a)
-
-                # keep existing order, append new keys
-                out, seen = [], set()
-                for a in existing:
-                    k = a.get("key")
-                    if isinstance(k, str) and k in merged_by_key and k not in seen:
-                        out.append(merged_by_key[k])
-                        seen.add(k)
-                for k, a in merged_by_key.items():
-                    if k not in seen:
-                        out.append(a)
-                return out
-
-            self.ingame_state["user_id"] = parsed.value.get("user_id")
-
-            lvl = parsed.value.get("level")
-            if (
-                LoggerLevel.PARSING_ERROR in self.logger_levels
-                and isinstance(self.ingame_state.get("rank"), int)
-                and isinstance(lvl, int)
-                and lvl != self.ingame_state["rank"]
-            ):
-                print(
-                    f"[!] Warning: achievement level differs from login rank: {lvl} vs {self.ingame_state['rank']}"
-                )
-
-            if isinstance(lvl, int):
-                self.ingame_state["rank"] = lvl
-
-            pts = parsed.value.get("points_total")
-            if isinstance(pts, int):
-                self.ingame_state["xp"] = pts
-
-            incoming_ach = parsed.value.get("achievements") or []
-            is_update = bool(parsed.value.get("is_update"))
-            self.ingame_state["achievements"] = merge_achievements(
-                self.ingame_state.get("achievements"),
-                incoming_ach,
-                is_update,
-            )
+    @handles(MessageKind.SYS, "uCount")
+    def _on_user_count(self, msg: str):
+        parsed = parse.user_count(msg)
+        if not parsed.ok:
+            self.log.parsing_error("[!] Failed to parse user count: %s", parsed.error)
+            self.metrics.parse_failures["uCount"] += 1
+            return
+        table = self.ingame_state.room_list
+        if table is None:
+            return
+        room_id, usercount, _ = parsed.value
+        old = table.set_usercount(room_id, usercount)
+        # the live table keeps up without another rmList, just tell about the one room
+        if old is not None and old != usercount:
+            if self.has_listeners("room_count_changed"):
+                self.emit("room_count_changed", room_id, usercount, usercount - old)
+
+    @handles(MessageKind.XT, "login_res")
+    def _on_login_res(self, msg: str):
+        parsed = parse.login_res(msg)
+        if not parsed.ok:
+            self.log.parsing_error("[!] Failed to parse login response: %s", parsed.error)
+            self.metrics.parse_failures["login_res"] += 1
+            return
+        self._logged_in = True
+        self._from_cache = False
+        self._logged_in_at = now = monotonic()
+        self.metrics.phases["game_login"].observe(now - self._session_started)
+        self._reset_session_state()
+        self.ingame_state.login_res = parsed.value
+        self.emit("login_res", parsed.value)
+
+    def _reset_session_state(self):
+        """A new login on the game server (first one or after a reconnect), forget what only the last session knew."""
+        # the first inv_list of the session is a fresh "inventory", not a diff against the previous session's
+        self.ingame_state.inventory = None
+
+    # handle this on login logic too because, it's before the client can really do anything, so might as well have it here.
+    @handles(MessageKind.XT, "achivment_res")
+    def _on_achievement_res(self, msg: str):
+        parsed = parse.achievement_res(msg)
+        if not parsed.ok:
+            self.log.parsing_error("[!] Failed to parse achievement response: %s", parsed.error)
+            self.metrics.parse_failures["achivment_res"] += 1
+            return
+
+        state = self.ingame_state
+        state.user_id = parsed.value.get("user_id")
+
+        lvl = parsed.value.get("level")
+        if isinstance(state.rank, int) and isinstance(lvl, int) and lvl != state.rank:
+            self.log.parsing_error("[!] Warning: achievement level differs from login rank: %s vs %s", lvl, state.rank)
+
+        if isinstance(lvl, int):
+            state.rank = lvl
 
+        pts = parsed.value.get("points_total")
+        if isinstance(pts, int):
+            state.xp = pts
+
+        incoming_ach = parsed.value.get("achievements") or []
+        is_update = bool(parsed.value.get("is_update"))
+        if state.achievements is None:
+            state.achievements = AchievementStore()
+        # the changes are only worked out for someone listening
+        report = self.has_listeners("achievements_changed")
+        changed = state.achievements.feed(parsed.value, report)
+
+        if self.has_listeners("achievement_res"):
             self.emit("achievement_res", incoming_ach, is_update)
+        if changed:
+            self.emit("achievements_changed", changed)
+
+        # send the last login step packet which is to join the room
+        self._send.template(packets.join_room_auto)
 
-            # send the last login step packet which is to join the room
-            self._send.xt("avt_joinRoom", {"auto": 1})
+    @handles(MessageKind.SYS, "joinOK")
+    def _on_join_ok(self, msg: str):
+        now = monotonic()
+        if self._logged_in_at is not None:
+            self.metrics.phases["join_room"].observe(now - self._logged_in_at)
+            self._logged_in_at = None
+        if self._login_started is not None:
+            self.metrics.phases["login_total"].observe(now - self._login_started)
+            self._login_started = None
 
-    # ── Hooks for subclass ───────────────────────────────────────────────────
 
-    def _handle_game_messages(self, msg: str):
-        pass
+MikmakLoginClient._message_handlers = _collect_handlers(MikmakLoginClient)
@@ -0,0 +1,267 @@
+"""
+mikmakpy.metrics
+────────────────
+Counters and fixed-bucket histograms for a client: frames and bytes in/out, frames per command, parse failures,
+handler time, reconnects and how long each login phase took. Cheap enough to stay on: updates are plain integer
+and list increments without locks (every field is written from one thread), snapshots are plain dicts that can
+be merged across a fleet and exported in the Prometheus text format.
+
+    snap = client.metrics.snapshot()          # or fleet.metrics() for every client summed up
+    PrometheusExporter(fleet.metrics, port=9108).start()
+"""
+
+from bisect import bisect_left
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+# seconds, from a fast handler call to a slow login
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Fixed buckets, counts[i] is the number of observations <= buckets[i], the last slot is +Inf."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"buckets": list(self.buckets), "counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+
+class Metrics:
+    """
+    Everything one client measures. Connection fills the byte/frame totals, the client the per command
+    counts, handler times and login phases:
+        login_server  connected to the login server -> server_list
+        game_login    connected to the game server -> login_res
+        join_room     login_res -> joinOK
+        login_total   first connection of the attempt -> joinOK
+        reconnect     connection lost -> connected again
+    """
+
+    PHASES = ("login_server", "game_login", "join_room", "login_total", "reconnect")
+
+    __slots__ = (
+        "bytes_in",
+        "bytes_out",
+        "frames_in",
+        "frames_out",
+        "frames_dropped",
+        "commands",
+        "parse_failures",
+        "handler_seconds",
+        "handler",
+        "phases",
+    )
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.frames_in = 0
+        self.frames_out = 0
+        self.frames_dropped = 0  # refused by a full send queue
+        self.commands: Counter = Counter()  # (kind, cmd) -> frames received
+        self.parse_failures: Counter = Counter()  # cmd -> failed parses
+        self.handler_seconds: Counter = Counter()  # (kind, cmd) -> time spent in its handler
+        self.handler = Histogram(buckets)  # every handled frame
+        self.phases: Dict[str, Histogram] = {name: Histogram(buckets) for name in self.PHASES}
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "frames_in": self.frames_in,
+            "frames_out": self.frames_out,
+            "frames_dropped": self.frames_dropped,
+            "commands": {f"{kind}:{cmd}": n for (kind, cmd), n in self.commands.items()},
+            "parse_failures": dict(self.parse_failures),
+            "handler_seconds": {f"{kind}:{cmd}": t for (kind, cmd), t in self.handler_seconds.items()},
+            "histograms": {"handler": self.handler.snapshot(), **{k: h.snapshot() for k, h in self.phases.items()}},
+        }
+
+
+def merge(snapshots: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sum snapshots (e.g. of every client of a fleet). Numbers add up, dicts are merged key by key, histograms bucket by bucket."""
+    out: Dict[str, Any] = {}
+    for snap in snapshots:
+        _merge_into(out, snap)
+    return out
+
+
+def _merge_into(out: Dict[str, Any], snap: Dict[str, Any]):
+    for key, value in snap.items():
+        if isinstance(value, dict):
+            if "buckets" in value and "counts" in value:
+                if key not in out:
+                    out[key] = {"buckets": list(value["buckets"]), "counts": list(value["counts"]), "sum": value["sum"], "count": value["count"]}
+                else:
+                    h = out[key]
+                    h["counts"] = [a + b for a, b in zip(h["counts"], value["counts"])]
+                    h["sum"] += value["sum"]
+                    h["count"] += value["count"]
+            else:
+                _merge_into(out.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[key] = out.get(key, 0) + value
+        elif key not in out:
+            out[key] = value
+
+
+# ── Prometheus ───────────────────────────────────────────────────────────────
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _command_labels(key: str) -> Dict[str, str]:
+    kind, _, cmd = key.partition(":")
+    return {"kind": kind, "cmd": cmd} if cmd else {"cmd": kind}
+
+
+def to_prometheus(snapshot: Dict[str, Any], prefix: str = "mikmak", labels: Optional[Dict[str, str]] = None) -> str:
+    """A (possibly merged) snapshot in the Prometheus text exposition format."""
+    labels = labels or {}
+    lines: List[str] = []
+
+    def metric(name: str, kind: str, help: str):
+        lines.append(f"# HELP {prefix}_{name} {help}")
+        lines.append(f"# TYPE {prefix}_{name} {kind}")
+
+    totals = [
+        ("bytes_in", "bytes_received_total", "Bytes received."),
+        ("bytes_out", "bytes_sent_total", "Bytes sent."),
+        ("frames_in", "frames_received_total", "Frames received."),
+        ("frames_out", "frames_sent_total", "Frames sent."),
+        ("frames_dropped", "frames_dropped_total", "Frames refused because the send queue was full."),
+    ]
+    for key, name, help in totals:
+        if key in snapshot:
+            metric(name, "counter", help)
+            lines.append(f"{prefix}_{name}{_labels(labels)} {snapshot[key]}")
+
+    per_key = [
+        ("commands", "command_frames_total", "Frames received per command.", _command_labels),
+        ("parse_failures", "parse_failures_total", "Messages that failed to parse, per command.", _command_labels),
+        ("handler_seconds", "handler_seconds_total", "Time spent in message handlers, per command.", _command_labels),
+    ]
+    for key, name, help, to_labels in per_key:
+        if snapshot.get(key):
+            metric(name, "counter", help)
+            for k, v in sorted(snapshot[key].items()):
+                lines.append(f"{prefix}_{name}{_labels({**labels, **to_labels(k)})} {v}")
+
+    for key, value in sorted(snapshot.get("gauges", {}).items()):
+        metric(key, "gauge", key.replace("_", " ").capitalize() + ".")
+        lines.append(f"{prefix}_{key}{_labels(labels)} {value}")
+
+    for key, value in sorted(snapshot.get("counters", {}).items()):
+        metric(f"{key}_total", "counter", key.replace("_", " ").capitalize() + ".")
+        lines.append(f"{prefix}_{key}_total{_labels(labels)} {value}")
+
+    for key, h in snapshot.get("histograms", {}).items():
+        name = f"{key}_seconds"
+        metric(name, "histogram", f"Duration of {key.replace('_', ' ')}.")
+        cumulative = 0
+        for bound, count in zip(h["buckets"], h["counts"]):
+            cumulative += count
+            lines.append(f"{prefix}_{name}_bucket{_labels({**labels, 'le': repr(float(bound))})} {cumulative}")
+        lines.append(f"{prefix}_{name}_bucket{_labels({**labels, 'le': '+Inf'})} {h['count']}")
+        lines.append(f"{prefix}_{name}_sum{_labels(labels)} {h['sum']}")
+        lines.append(f"{prefix}_{name}_count{_labels(labels)} {h['count']}")
+
+    return "\n".join(lines) + "\n"
+
+
+class PrometheusExporter:
+    """
+    Publishes a snapshot source (a callable, e.g. client.metrics_snapshot or fleet.metrics) in the Prometheus
+    text format: rewritten into `path` every `interval` seconds (atomically, for node_exporter's textfile
+    collector), and/or served at http://host:port/metrics. Snapshots are only taken when needed.
+    """
+
+    def __init__(
+        self,
+        source: Callable[[], Dict[str, Any]],
+        path: Optional[str] = None,
+        port: Optional[int] = None,
+        host: str = "127.0.0.1",
+        interval: float = 15.0,
+        prefix: str = "mikmak",
+    ):
+        self.source = source
+        self.path = path
+        self.port = port
+        self.host = host
+        self.interval = interval
+        self.prefix = prefix
+        self._stop = threading.Event()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+
+    def render(self) -> str:
+        return to_prometheus(self.source(), self.prefix)
+
+    def write(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp, self.path)
+
+    def start(self) -> "PrometheusExporter":
+        if self.path:
+            threading.Thread(target=self._write_loop, name="mikmak-metrics-file", daemon=True).start()
+        if self.port is not None:
+            exporter = self
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] not in ("/", "/metrics"):
+                        self.send_error(404)
+                        return
+                    body = exporter.render().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass
+
+            self._httpd = ThreadingHTTPServer((self.host, self.port), Handler)
+            self.port = self._httpd.server_address[1]
+            threading.Thread(target=self._httpd.serve_forever, name="mikmak-metrics-http", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def _write_loop(self):
+        while True:
+            try:
+                self.write()
+            except OSError:
+                pass
+            if self._stop.wait(self.interval):
+                return
@@ -0,0 +1,372 @@
+"""
+mikmakpy.mockserver
+───────────────────
+A local stand-in for the Mikmak servers, for running clients end to end offline (load tests, reconnect paths).
+It speaks the part of the protocol the clients use: verChk/apiOK, the login server's server_list, the game server's
+second login (rmList, login_res, achivment_res, inv_list) and avt_joinRoom/joinOK, with uER/userGone between the
+sessions in a room and uCount to the rest of the game server. Run with `python -m mikmakpy.mockserver` (--clients N also runs a fleet against it) or from code:
+
+    async with MockServer(MockConfig(latency=0.01)) as mock:
+        client = MikmakIngameClient("bot", "pw", starting_ip=mock.host, port=mock.port)
+        await client.run()
+"""
+
+import asyncio
+from collections import Counter
+from dataclasses import dataclass, field
+from random import Random
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from .constants import MessageKind, Server
+from .fixtures import achievement_msg, inventory_msg, login_res_msg, room_list_msg, xt_msg
+from .protocol import decode, encode
+
+
+@dataclass
+class MockConfig:
+    """
+    latency: seconds before every reply.
+    rooms / achievements / inventory: payload sizes of rmList, achivment_res and inv_list.
+    servers: game servers listed in server_list, each gets its own port.
+    disconnect_after: drop a connection after it received this many frames (None: never).
+    disconnect_rate: chance of dropping a connection on every frame received.
+    passwords: username -> password, None accepts anyone.
+    room_capacity: sessions per room, avt_joinRoom puts a session in the first room with space.
+    room_counts: send uCount to the game server's other sessions when a room's population changes.
+    """
+
+    latency: float = 0.0
+    rooms: int = 50
+    achievements: int = 40
+    inventory: int = 100
+    servers: List[str] = field(default_factory=lambda: [Server.KIWI.value, Server.KREMBO.value])
+    disconnect_after: Optional[int] = None
+    disconnect_rate: float = 0.0
+    passwords: Optional[Dict[str, str]] = None
+    room_capacity: int = 50
+    room_counts: bool = True
+    seed: Optional[int] = None
+
+
+class MockSession:
+    """One client connection."""
+
+    def __init__(self, server: "MockServer", writer: asyncio.StreamWriter, game: Optional[str]):
+        self.server = server
+        self.writer = writer
+        self.game = game  # the game server's name, None on the login server
+        self.user_id = 0
+        self.username: Optional[str] = None
+        self.room: Optional[int] = None
+        self.frames = 0
+        self.task: Optional[asyncio.Task] = None  # the one serving this connection
+
+    async def send(self, *messages: str):
+        if self.server.config.latency:
+            await asyncio.sleep(self.server.config.latency)
+        if self.writer.is_closing():
+            return
+        self.writer.write(b"".join(encode.raw(m) for m in messages))
+        self.server.stats["frames_out"] += len(messages)
+        await self.writer.drain()
+
+    def push(self, message: str):
+        """Write without waiting, for broadcasts: one slow session shouldn't hold up the others."""
+        if not self.writer.is_closing():
+            self.writer.write(encode.raw(message))
+            self.server.stats["frames_out"] += 1
+
+    def close(self):
+        self.writer.close()
+
+
+Handler = Callable[[MockSession, str], Awaitable[None]]
+
+
+class MockServer:
+    """
+    The login server plus one game server per config.servers entry, all on host.
+    stats counts sessions, logins, frames and injected disconnects.
+    handle() adds or replaces the reply to a sys action / xt command, to script scenarios.
+    """
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or MockConfig()
+        self.host = host
+        self.port = port  # of the login server, 0 picks a free one on start()
+        self.game_ports: Dict[str, int] = {}
+        self.stats: Counter = Counter()
+        self.sessions: Set[MockSession] = set()
+        self._servers: List[asyncio.Server] = []
+        self._rooms: Dict[tuple, Set[MockSession]] = {}  # (game server, room id) -> sessions
+        self._next_user_id = 1000
+        self._random = Random(self.config.seed)
+        self._handlers: Dict[tuple, Handler] = {
+            (MessageKind.SYS, "verChk"): self._on_ver_chk,
+            (MessageKind.SYS, "login"): self._on_login,
+            (MessageKind.XT, "avt_joinRoom"): self._on_join_room,
+        }
+        # built once, every session gets the same payloads
+        self._room_list = room_list_msg(self.config.rooms)
+        self._achievements = achievement_msg(self.config.achievements)
+        self._inventory = inventory_msg(self.config.inventory)
+
+    def handle(self, kind: MessageKind, command: str):
+        """Decorator, register `async def fn(session, msg)` as the reply to a command."""
+
+        def decorator(fn: Handler):
+            self._handlers[(kind, command)] = fn
+            return fn
+
+        return decorator
+
+    async def start(self):
+        login = await asyncio.start_server(lambda r, w: self._serve(r, w, None), self.host, self.port)
+        self.port = login.sockets[0].getsockname()[1]
+        self._servers.append(login)
+        for name in self.config.servers:
+            game = await asyncio.start_server(lambda r, w, name=name: self._serve(r, w, name), self.host, 0)
+            self.game_ports[name] = game.sockets[0].getsockname()[1]
+            self._servers.append(game)
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+        sessions = list(self.sessions)
+        for session in sessions:
+            session.close()
+        # let the sessions see the closed connections and end, rather than being cancelled when the loop shuts down
+        tasks = [session.task for session in sessions if session.task is not None]
+        if tasks:
+            await asyncio.wait(tasks)
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers.clear()
+
+    def drop_all(self):
+        """Disconnect every session, e.g. to test a whole fleet reconnecting at once."""
+        for session in list(self.sessions):
+            self.stats["disconnects_injected"] += 1
+            session.close()
+
+    async def __aenter__(self) -> "MockServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ── Connection ───────────────────────────────────────────────────────────
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, game: Optional[str]):
+        session = MockSession(self, writer, game)
+        session.task = asyncio.current_task()
+        self.sessions.add(session)
+        self.stats["sessions"] += 1
+        config = self.config
+        try:
+            while True:
+                frame = await reader.readuntil(b"\x00")
+                msg = frame[:-1].decode("utf-8", errors="replace")
+                session.frames += 1
+                self.stats["frames_in"] += 1
+                if (config.disconnect_after is not None and session.frames > config.disconnect_after) or (
+                    config.disconnect_rate and self._random.random() < config.disconnect_rate
+                ):
+                    self.stats["disconnects_injected"] += 1
+                    break
+
+                handler = self._handlers.get(self._command(msg))
+                if handler is not None:
+                    await handler(session, msg)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            # also runs when the session is cancelled (the server shut down with it still open), the cancellation goes on
+            self._leave_room(session)
+            self.sessions.discard(session)
+            writer.close()
+
+    @staticmethod
+    def _command(msg: str) -> tuple:
+        kind, cmd = decode.classify(msg)
+        if kind is MessageKind.XT and not cmd:
+            # client xt packets carry the command in b.c, not _cmd
+            data = decode.xt(msg)
+            if data.ok:
+                cmd = str(data.value.get("b", {}).get("c", ""))
+        return kind, cmd
+
+    # ── Handlers ─────────────────────────────────────────────────────────────
+    async def _on_ver_chk(self, session: MockSession, msg: str):
+        await session.send(encode.sys("apiOK", ""))
+
+    async def _on_login(self, session: MockSession, msg: str):
+        root = decode.xml(msg)
+        if not root.ok:
+            return
+        username = root.value.findtext("body/login/nick") or ""
+        password = root.value.findtext("body/login/pword") or ""
+        if session.game is not None:
+            if not password.startswith("cluster_"):
+                await session.send(encode.sys("logKO", "<login e='bad cluster login' />"))
+                return
+            password = password[len("cluster_") :]
+        passwords = self.config.passwords
+        if passwords is not None and passwords.get(username) != password:
+            self.stats["logins_refused"] += 1
+            await session.send(encode.sys("logKO", "<login e='wrong password' />"))
+            return
+
+        session.username = username
+        if session.game is None:
+            self.stats["logins"] += 1
+            servers = ",".join(
+                f"{{\"id\":{i},\"name\":'{name}',\"ip\":'{self.host}',\"port\":{port},\"capicity\":0.{i % 10},\"safe\":false}}"
+                for i, (name, port) in enumerate(self.game_ports.items(), 1)
+            )
+            await session.send(
+                xt_msg({"safeChat": False, "_cmd": "server_list", "rank": 1, "userName": username, "list": f"[{servers}]"})
+            )
+            return
+
+        self.stats["game_logins"] += 1
+        self._next_user_id += 1
+        session.user_id = self._next_user_id
+        await session.send(self._room_list, login_res_msg(), self._achievements, self._inventory)
+
+    async def _on_join_room(self, session: MockSession, msg: str):
+        self._leave_room(session)
+        room_id = 1
+        while len(self._rooms.get((session.game, room_id), ())) >= self.config.room_capacity:
+            room_id += 1
+        session.room = room_id
+        others = self._rooms.setdefault((session.game, room_id), set())
+        users = "".join(self._user_xml(s) for s in (*others, session))
+        entered = encode.sys("uER", self._user_xml(session), room_id)
+        for other in others:
+            other.push(entered)
+        others.add(session)
+        self.stats["joins"] += 1
+        self._count_changed(session.game, room_id)
+        await session.send(encode.sys("joinOK", f"<pid id='0'/><vars /><uLs r='{room_id}'>{users}</uLs>", room_id))
+
+    def _leave_room(self, session: MockSession):
+        if session.room is None:
+            return
+        others = self._rooms.get((session.game, session.room), set())
+        others.discard(session)
+        gone = encode.sys("userGone", f"<user id='{session.user_id}' />", session.room)
+        room_id, session.room = session.room, None
+        for other in others:
+            other.push(gone)
+        self._count_changed(session.game, room_id)
+
+    def _count_changed(self, game: Optional[str], room_id: int):
+        """uCount to the game server's sessions outside the room, the ones inside got uER/userGone."""
+        if not self.config.room_counts:
+            return
+        room = self._rooms.get((game, room_id), set())
+        count = f"<msg t='sys'><body action='uCount' r='{room_id}' u='{len(room)}' s='0'></body></msg>"
+        for other in self.sessions:
+            if other.game == game and other.room is not None and other not in room:
+                other.push(count)
+
+    @staticmethod
+    def _user_xml(session: MockSession) -> str:
+        return (
+            f"<u i='{session.user_id}' m='0' s='0' p='-1'><n><![CDATA[{session.username}]]></n>"
+            f"<vars><var n='rank' t='n'><![CDATA[1]]></var></vars></u>"
+        )
+
+
+async def load_test(clients: int, config: Optional[MockConfig] = None, timeout: float = 60.0) -> Dict[str, float]:
+    """Run a Fleet of clients against a fresh MockServer until every one of them joined a room."""
+    from time import perf_counter
+
+    from .fleet import Account, Fleet
+    from .ingame import MikmakIngameClient
+
+    async with MockServer(config) as mock:
+        fleet = Fleet(
+            [Account(f"bot{i}", "pw") for i in range(clients)],
+            client_cls=MikmakIngameClient,
+            starting_ip=mock.host,
+            port=mock.port,
+            reconnection_delay=0.1,
+            max_retries=100,
+        )
+        joined = set()
+        done = asyncio.Event()
+
+        @fleet.on("message")
+        def on_message(client, msg):
+            if msg.startswith("<msg t='sys'><body action='joinOK'") and client.username not in joined:
+                joined.add(client.username)
+                if len(joined) == clients:
+                    done.set()
+
+        started = perf_counter()
+        task = asyncio.create_task(fleet.run())
+        try:
+            await asyncio.wait_for(done.wait(), timeout)
+        except TimeoutError:
+            pass
+        elapsed = perf_counter() - started
+        fleet.stop()
+        await task
+        return {
+            "clients": clients,
+            "joined": len(joined),
+            "seconds": elapsed,
+            "joins_per_second": len(joined) / elapsed if elapsed else 0.0,
+            **mock.stats,
+        }
+
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="python -m mikmakpy.mockserver", description="Run a local stand-in for the Mikmak servers.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9339)
+    ap.add_argument("--latency", type=float, default=0.0)
+    ap.add_argument("--rooms", type=int, default=50)
+    ap.add_argument("--achievements", type=int, default=40)
+    ap.add_argument("--inventory", type=int, default=100)
+    ap.add_argument("--disconnect-after", type=int)
+    ap.add_argument("--disconnect-rate", type=float, default=0.0)
+    ap.add_argument("--room-capacity", type=int, default=50)
+    ap.add_argument("--no-room-counts", action="store_true", help="don't send uCount updates")
+    ap.add_argument("--clients", type=int, help="run this many clients against the server, print the results and exit")
+    args = ap.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        rooms=args.rooms,
+        achievements=args.achievements,
+        inventory=args.inventory,
+        disconnect_after=args.disconnect_after,
+        disconnect_rate=args.disconnect_rate,
+        room_capacity=args.room_capacity,
+        room_counts=not args.no_room_counts,
+    )
+
+    if args.clients:
+        config.servers = [Server.KIWI.value]
+        for key, value in asyncio.run(load_test(args.clients, config)).items():
+            print(f"{key:<22} {value:,.2f}" if isinstance(value, float) else f"{key:<22} {value}")
+        return
+
+    async def serve():
+        async with MockServer(config, args.host, args.port) as mock:
+            print(f"login server on {mock.host}:{mock.port}, game servers: {mock.game_ports}")
+            await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
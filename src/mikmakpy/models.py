@@ -0,0 +1,159 @@
+"""
+mikmakpy.models
+───────────────
+Typed, slotted records for the objects the parsers return: servers, rooms, inventory items, achievements, players and the
+login response. A slotted instance takes about half the memory of the dict it replaces.
+as_dict() gives back the dict the parsers used to return, for code (or JSON) that still wants one.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+
+@dataclass(frozen=True, slots=True)
+class ServerInfo:
+    """A game server from the login server's server_list."""
+
+    id: int
+    name: str
+    ip: str
+    port: int
+    capacity: Optional[float] = None  # load, 0..1, negative when closed (the server spells it "capicity")
+    safe: Optional[bool] = None
+    dt: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> "ServerInfo":
+        """From a server_list entry (or as_dict()), raises KeyError/ValueError/TypeError without an address."""
+        name = d.get("name")
+        load = d.get("capicity")
+        return cls(
+            id=int(d.get("id", -1)),
+            name=name.strip() if isinstance(name, str) else "",
+            ip=str(d["ip"]),
+            port=int(d["port"]),
+            capacity=float(load) if isinstance(load, (int, float)) and not isinstance(load, bool) else None,
+            safe=d.get("safe") if isinstance(d.get("safe"), bool) else None,
+            dt=d.get("dt") if isinstance(d.get("dt"), int) else None,
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        """The server_list entry, under the server's keys. Unset optional fields are left out."""
+        out: Dict[str, Any] = {"id": self.id, "name": self.name, "ip": self.ip, "port": self.port}
+        if self.capacity is not None:
+            out["capicity"] = self.capacity
+        if self.safe is not None:
+            out["safe"] = self.safe
+        if self.dt is not None:
+            out["dt"] = self.dt
+        return out
+
+
+@dataclass(frozen=True, slots=True)
+class Room:
+    """A room of the rmList. The optional attributes are None when the server didn't send them."""
+
+    id: int
+    name: str
+    usercount: int
+    maxusercount: int
+    is_private: Optional[bool] = None
+    is_temporary: Optional[bool] = None
+    is_game: Optional[bool] = None
+    min_level: Optional[int] = None
+    max_spectators: Optional[int] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"id": self.id, "name": self.name, "usercount": self.usercount, "maxusercount": self.maxusercount}
+        for key in ("is_private", "is_temporary", "is_game", "min_level", "max_spectators"):
+            value = getattr(self, key)
+            if value is not None:
+                out[key] = value
+        return out
+
+
+@dataclass(frozen=True, slots=True)
+class InventoryItem:
+    item_id: int
+    quantity: int = 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"item_id": self.item_id, "quantity": self.quantity}
+
+
+@dataclass(frozen=True, slots=True)
+class Achievement:
+    """One step of an achievement, identified by (achievement_id, step_id)."""
+
+    achievement_id: int
+    step_id: int
+    progress: int = 0
+    points: int = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "achievement_id": self.achievement_id,
+            "step_id": self.step_id,
+            "progress": self.progress,
+            "points": self.points,
+            "key": f"{self.achievement_id}:{self.step_id}",
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class LoginResult:
+    """The game server's login_res. Fields the server left out are None."""
+
+    date: Optional[str] = None
+    c: Optional[int] = None
+    time: Optional[str] = None
+    k: Optional[int] = None
+    resolution_ctg: Optional[int] = None  # "resoulationCtg"
+    resolution_val: Optional[str] = None  # "resoulationVal", e.g. the room to start in
+
+    @classmethod
+    def from_dict(cls, o: Dict[str, Any]) -> "LoginResult":
+        return cls(
+            date=o.get("date"),
+            c=o.get("c"),
+            time=o.get("time"),
+            k=o.get("k"),
+            resolution_ctg=o.get("resoulationCtg"),
+            resolution_val=o.get("resoulationVal"),
+        )
+
+    def as_dict(self) -> Dict[str, Any]:
+        """The b.o object of the message, under the server's keys."""
+        out = {
+            "date": self.date,
+            "c": self.c,
+            "time": self.time,
+            "k": self.k,
+            "resoulationCtg": self.resolution_ctg,
+            "resoulationVal": self.resolution_val,
+        }
+        return {k: v for k, v in out.items() if v is not None}
+
+
+@dataclass(frozen=True, slots=True)
+class Player:
+    """An avatar in a room, from joinOK's user list or uER."""
+
+    id: int
+    name: str
+    room: int
+    moderator: bool = False  # m='1'
+    spectator: bool = False  # s='1'
+    player_id: int = -1  # p, the slot in a game room, -1 outside of games
+    vars: Dict[str, Any] = field(default_factory=dict)  # user variables, e.g. {"rank": 1}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "room": self.room,
+            "moderator": self.moderator,
+            "spectator": self.spectator,
+            "player_id": self.player_id,
+            "vars": dict(self.vars),
+        }
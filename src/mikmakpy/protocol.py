@@ -4,13 +4,22 @@ mikmakpy.protocol
 
 """
 
-import ast
-from json import dumps, loads
+from json import JSONDecoder, JSONEncoder, loads
 import re
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, List, Optional
 import xml.etree.ElementTree as ET
+from xml.sax.saxutils import unescape as xml_unescape
 
-from .constants import Result
+from .constants import Result, MessageKind
+from .models import Achievement, InventoryItem, LoginResult, Player, Room, ServerInfo
+from .state import RoomTable, Inventory
+
+# Largest frame we accept before considering the stream broken.
+MAX_FRAME_SIZE = 1 << 20
+
+
+# json.dumps builds a new encoder on every call when given options, keep one around instead
+_xt_encode = JSONEncoder(separators=(",", ":"), ensure_ascii=False).encode
 
 
 class encode:
@@ -22,11 +31,12 @@ class encode:
     @staticmethod
     def xt(cmd: str, p: dict, x: str = "ExtManager", r: int = -1) -> str:
         """Build a raw xt JSON string."""
-        return dumps(
-            {"b": {"c": cmd, "p": p, "r": r, "x": x}, "t": "xt"},
-            separators=(",", ":"),
-            ensure_ascii=False,
-        )
+        return _xt_encode({"b": {"c": cmd, "p": p, "r": r, "x": x}, "t": "xt"})
+
+    @staticmethod
+    def xt_bytes(cmd: str, p: dict, x: str = "ExtManager", r: int = -1) -> bytes:
+        """encode.raw(encode.xt(...)) in one step, ready for Connection.send_bytes."""
+        return (_xt_encode({"b": {"c": cmd, "p": p, "r": r, "x": x}, "t": "xt"}) + "\x00").encode("utf-8")
 
     @staticmethod
     def sys(action: str, body: str, r: int = 0) -> str:
@@ -34,21 +44,148 @@ class encode:
         return f"<msg t='sys'><body action='{action}' r='{r}'>{body}</body></msg>"
 
 
+# Placeholder for the variable fields of a PacketTemplate
+SLOT = object()
+_SLOT_MARK = re.compile(r'"\\u0000slot\\u0000"')
+
+
+def _json_bytes(value: Any) -> bytes:
+    if value is True:
+        return b"true"
+    if value is False:
+        return b"false"
+    if isinstance(value, int):
+        return b"%d" % value  # also IntEnum members (EmoteFace, Dance, SafeChat...)
+    return _xt_encode(value).encode("utf-8")
+
+
+class PacketTemplate:
+    """
+    An xt packet precompiled to its wire bytes (null terminator included), with SLOT marking the variable fields:
+
+        JOIN = PacketTemplate("avt_joinRoom", {"auto": 1})
+        JOIN.render()                                   # plain bytes, nothing left to encode
+        face = PacketTemplate("<cmd>", {"id": SLOT}).precompile(EmoteFace)
+        face.render(EmoteFace.WINK)                     # dict lookup
+
+    Rendering joins the precompiled pieces with the encoded values. Templates with a single slot
+    remember what they rendered (up to cache_size values), precompile() fills that cache up front.
+    """
+
+    __slots__ = ("cmd", "_parts", "_cache", "_cache_size")
+
+    def __init__(self, cmd: str, p: dict, x: str = "ExtManager", r: int = -1, cache_size: int = 1024):
+        self.cmd = cmd
+
+        def mark(v):
+            if v is SLOT:
+                return "\x00slot\x00"
+            if isinstance(v, dict):
+                return {k: mark(i) for k, i in v.items()}
+            if isinstance(v, list):
+                return [mark(i) for i in v]
+            return v
+
+        self._parts = [part.encode("utf-8") for part in _SLOT_MARK.split(encode.xt(cmd, mark(p), x, r) + "\x00")]
+        self._cache: dict | None = {} if len(self._parts) == 2 else None
+        self._cache_size = cache_size
+
+    @property
+    def slots(self) -> int:
+        return len(self._parts) - 1
+
+    def render(self, *values: Any) -> bytes:
+        """The packet bytes with values filled into the slots, in order."""
+        parts = self._parts
+        if len(values) != len(parts) - 1:
+            raise TypeError(f"{self.cmd} template takes {len(parts) - 1} values, got {len(values)}")
+        if not values:
+            return parts[0]
+
+        cache = self._cache
+        if cache is not None:
+            value = values[0]
+            key = (type(value), value)  # 1, 1.0 and True are equal keys but different JSON
+            try:
+                data = cache.get(key)
+            except TypeError:  # unhashable, no caching
+                return parts[0] + _json_bytes(value) + parts[1]
+            if data is None:
+                data = parts[0] + _json_bytes(value) + parts[1]
+                if len(cache) < self._cache_size:
+                    cache[key] = data
+            return data
+
+        out = [parts[0]]
+        for value, part in zip(values, parts[1:]):
+            out.append(_json_bytes(value))
+            out.append(part)
+        return b"".join(out)
+
+    def precompile(self, values: Iterable[Any]) -> "PacketTemplate":
+        """Render every value up front (e.g. a whole IntEnum), single slot templates only."""
+        if self._cache is None:
+            raise TypeError("precompile() needs a template with exactly one slot")
+        for value in values:
+            self._cache[(type(value), value)] = self._parts[0] + _json_bytes(value) + self._parts[1]
+        return self
+
+    def __repr__(self) -> str:
+        return f"PacketTemplate({self.cmd!r}, slots={self.slots})"
+
+
+class packets:
+    """Templates for the fixed packets the client sends itself."""
+
+    join_room_auto = PacketTemplate("avt_joinRoom", {"auto": 1})
+
+
 class decode:
     @staticmethod
     def buffer(buffer: bytearray) -> Result[tuple[list[str], bytearray]]:
         """
         Split a raw byte buffer on null bytes.
         Returns (list_of_complete_messages, remaining_buffer).
+        For a stream, prefer FrameDecoder which doesn't rescan data it has already seen.
         """
         messages = []
-        while b"\x00" in buffer:
-            msg_bytes, buffer = buffer.split(b"\x00", 1)
-            try:
-                messages.append(msg_bytes.decode("utf-8", errors="replace"))
-            except Exception as e:
-                return Result(ok=False, error=str(e))
-        return Result(ok=True, value=(messages, buffer))
+        start = 0
+        pos = buffer.find(0)
+        try:
+            while pos != -1:
+                messages.append(buffer[start:pos].decode("utf-8", errors="replace"))
+                start = pos + 1
+                pos = buffer.find(0, start)
+        except Exception as e:
+            return Result(ok=False, error=str(e))
+        return Result(ok=True, value=(messages, buffer[start:]))
+
+    @staticmethod
+    def classify(msg: str) -> tuple[MessageKind, str]:
+        """
+        Identify a frame in one pass without parsing it.
+        Returns (kind, command): the body action for sys XML, the _cmd for JSON xt, "" when there is none.
+        Only the sys header / the unescaped "_cmd" key are looked at, so text inside chat payloads can't be mistaken for a command.
+        """
+        if msg.startswith("{"):
+            i = msg.find('"_cmd":"')
+            if i == -1:
+                return MessageKind.XT, ""
+            i += 8
+            return MessageKind.XT, msg[i : msg.find('"', i)]
+
+        if msg.startswith("<msg"):
+            body = msg.find("<body")
+            end = msg.find(">", body)
+            i = msg.find("action='", body, end)
+            if body == -1 or i == -1:
+                return MessageKind.SYS, ""
+            i += 8
+            return MessageKind.SYS, msg[i : msg.find("'", i, end)]
+
+        if msg.startswith("<cross-domain-policy>"):
+            return MessageKind.POLICY, ""
+        return MessageKind.UNKNOWN, ""
 
     @staticmethod
     def xt(msg: str) -> Result[dict]:
@@ -68,14 +205,307 @@ class decode:
             return Result(ok=False, error=str(e))
 
 
+class FrameDecoder:
+    """
+    Incremental splitter for the null terminated frame stream.
+
+    Remembers where it stopped scanning, so every received byte is searched once, and
+    frames are decoded straight out of the buffer through a memoryview. The consumed
+    prefix is only dropped once it grows past compact_threshold (or the buffer is fully consumed),
+    so compaction is amortised instead of copying the remainder after every frame.
+
+    The buffer is allocated once and reused. Sockets can receive straight into it:
+
+        n = sock.recv_into(decoder.writable())
+        frames = decoder.commit(n).value
+
+    writable() hands out read_size bytes, which doubles (up to max_read_size) while reads come back
+    full, i.e. during a burst, and halves again once they come back mostly empty.
+
+    on_frame, when set, gets every complete frame's raw bytes (a memoryview into the buffer, only valid
+    during the call) before they're decoded, e.g. SessionRecorder.incoming.
+    """
+
+    def __init__(
+        self,
+        max_frame_size: int = MAX_FRAME_SIZE,
+        compact_threshold: int = 64 * 1024,
+        read_size: int = 8192,
+        max_read_size: int = 256 * 1024,
+        on_frame: Optional[Callable[[memoryview], None]] = None,
+    ):
+        self.max_frame_size = max_frame_size
+        self.on_frame = on_frame
+        self.compact_threshold = compact_threshold
+        self.min_read_size = read_size
+        self.max_read_size = max(read_size, max_read_size)
+        self.read_size = read_size
+        self._buf = bytearray(2 * read_size)
+        self._view = memoryview(self._buf)
+        self._start = 0  # start of the first incomplete frame
+        self._scan = 0  # where the search for the next terminator resumes
+        self._end = 0  # end of the received bytes, the rest of the buffer is free
+
+    def writable(self, size: int | None = None) -> memoryview:
+        """A view of the next size (default read_size) free bytes of the buffer, to receive into. Follow with commit()."""
+        size = size or self.read_size
+        if len(self._buf) - self._end < size:
+            self._make_room(size)
+        return self._view[self._end : self._end + size]
+
+    def commit(self, n: int) -> Result[list[str]]:
+        """n bytes were written into the last writable() view, returns the frames they completed."""
+        if n >= self.read_size:
+            self.read_size = min(self.read_size * 2, self.max_read_size)
+        elif n < self.read_size >> 2 and self.read_size > self.min_read_size:
+            self.read_size = max(self.read_size >> 1, self.min_read_size)
+        self._end += n
+        return self._split()
+
+    def feed(self, data: bytes) -> Result[list[str]]:
+        """Append received bytes, returns the frames they completed (without the terminator)."""
+        n = len(data)
+        if len(self._buf) - self._end < n:
+            self._make_room(n)
+        self._view[self._end : self._end + n] = data
+        self._end += n
+        return self._split()
+
+    def reset(self):
+        """Drop any buffered partial frame."""
+        self._start = 0
+        self._scan = 0
+        self._end = 0
+
+    @property
+    def pending(self) -> int:
+        """Bytes of the incomplete frame currently buffered."""
+        return self._end - self._start
+
+    def _split(self) -> Result[list[str]]:
+        buf, view, end = self._buf, self._view, self._end
+        on_frame = self.on_frame
+        messages = []
+        start = self._start
+        pos = buf.find(0, self._scan, end)
+        while pos != -1:
+            if pos - start > self.max_frame_size:
+                break
+            frame = view[start:pos]
+            if on_frame is not None:
+                on_frame(frame)
+            messages.append(str(frame, "utf-8", "replace"))
+            start = pos + 1
+            pos = buf.find(0, start, end)
+
+        if pos != -1 or end - start > self.max_frame_size:
+            self.reset()
+            return Result(ok=False, error=f"Frame exceeds max_frame_size ({self.max_frame_size} bytes)")
+
+        if start == end:
+            start = end = 0
+        elif start >= self.compact_threshold:
+            view[: end - start] = view[start:end]
+            end -= start
+            start = 0
+        self._start = start
+        self._scan = self._end = end
+        return Result(ok=True, value=messages)
+
+    def _make_room(self, size: int):
+        """Move the incomplete frame to the front, and grow the buffer if that's still not enough."""
+        start, end = self._start, self._end
+        pending = end - start
+        if len(self._buf) - pending >= size:
+            if start:
+                self._view[:pending] = self._view[start:end]
+        else:
+            # a new buffer rather than resizing, views handed out earlier keep the old one alive
+            buf = bytearray(max(2 * len(self._buf), pending + size))
+            buf[:pending] = self._view[start:end]
+            self._buf = buf
+            self._view = memoryview(buf)
+        self._scan -= start
+        self._start = 0
+        self._end = pending
+
+
+# The server's "list" fields are JS literals: like JSON, but strings may be single quoted and use JS/Python escapes,
+# object keys may be bare and lists may end in a comma. One regex pass turns them into JSON for the C decoder.
+# Anything else bare (undefined, NaN, ...) is an error, like it was for the old literal_eval parser.
+_JSISH_TOKEN = re.compile(
+    r"""
+      "(?P<dq>(?:[^"\\]|\\.)*)"                   # double quoted string
+    | '(?P<sq>(?:[^'\\]|\\.)*)'                   # single quoted string
+    | ,(?=\s*[\]}])                                # trailing comma, dropped
+    | (?<![\w$.])(?P<word>[A-Za-z_$][\w$]*)(?P<key>(?=\s*:))?  # bare key or literal
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+_JSISH_ESCAPE = re.compile(r'\\(x[0-9A-Fa-f]{2}|.)|"', re.DOTALL)
+# escapes JSON doesn't know, the rest (\q) keep their backslash like Python's literals did
+_JSISH_ESCAPES = {"'": "'", "\n": "", "v": "\\u000b", "a": "\\u0007", "0": "\\u0000"}
+_JSISH_WORDS = {"true": "true", "false": "false", "null": "null", "True": "true", "False": "false", "None": "null"}
+
+
+def _jsish_reject(constant: str):
+    raise ValueError(f"Unexpected {constant!r} in JS literal")
+
+
+# NaN/Infinity would be taken by the json module but never were by literal_eval
+_jsish_decode = JSONDecoder(parse_constant=_jsish_reject).decode
+
+
+def _jsish_escape(m: re.Match) -> str:
+    e = m.group(1)
+    if e is None:
+        return '\\"'  # bare " inside a single quoted string
+    if e in '"\\/bfnrtu':
+        return m.group(0)
+    if e[0] == "x" and len(e) == 3:
+        return "\\u00" + e[1:]
+    return _JSISH_ESCAPES.get(e, "\\\\" + e)
+
+
+def _jsish_token(m: re.Match) -> str:
+    text = m.group("sq")
+    if text is not None:
+        if '"' in text or "\\" in text:
+            text = _JSISH_ESCAPE.sub(_jsish_escape, text)
+        return '"' + text + '"'
+    text = m.group("dq")
+    if text is not None:
+        if "\\" in text:
+            return '"' + _JSISH_ESCAPE.sub(_jsish_escape, text) + '"'
+        return m.group(0)
+    word = m.group("word")
+    if word is None:
+        # a trailing comma, after a value. [,] or [1,,] stay errors
+        src, i = m.string, m.start() - 1
+        while i >= 0 and src[i].isspace():
+            i -= 1
+        if i < 0 or src[i] in "[{,":
+            _jsish_reject(",")
+        return ""
+    if m.group("key") is not None:
+        return '"' + word + '"'
+    literal = _JSISH_WORDS.get(word)
+    if literal is None:
+        _jsish_reject(word)
+    return literal
+
+
+# <rm a='1' ...><n><![CDATA[name]]></n></rm>, the name may also come as plain text
+_ROOM = re.compile(r"<rm\s([^>]*)>\s*<n>(?:<!\[CDATA\[(.*?)\]\]>|([^<]*))</n>", re.DOTALL)
+_ATTR = re.compile(r"(\w+)='([^']*)'")
+_ROOM_FAST = re.compile(
+    r"<rm id='(-?\d+)' priv='([01])' temp='([01])' game='([01])' ucnt='(-?\d+)'(?: lmb='(-?\d+)')? maxu='(-?\d+)' maxs='(-?\d+)'>"
+    r"\s*<n><!\[CDATA\[(.*?)\]\]></n>",
+    re.DOTALL,
+)
+# (priv, temp, game) -> RoomTable flags, for the fast path
+_ROOM_FLAGS = {
+    (p, t, g): RoomTable.HAS_PRIVATE
+    | RoomTable.HAS_TEMPORARY
+    | RoomTable.HAS_GAME
+    | RoomTable.HAS_MAX_SPECTATORS
+    | (RoomTable.PRIVATE if p == "1" else 0)
+    | (RoomTable.TEMPORARY if t == "1" else 0)
+    | (RoomTable.GAME if g == "1" else 0)
+    for p in "01"
+    for t in "01"
+    for g in "01"
+}
+
+
+# <u i='1' m='0' s='0' p='-1'><n><![CDATA[name]]></n><vars>...</vars></u>, in joinOK's <uLs> and in uER
+_USER = re.compile(r"<u\s([^>]*)>\s*<n>(?:<!\[CDATA\[(.*?)\]\]>|([^<]*))</n>\s*(?:<vars\s*/>|<vars>(.*?)</vars>)?", re.DOTALL)
+_USER_FAST = re.compile(
+    r"<u i='(-?\d+)' m='([01])' s='([01])' p='(-?\d+)'>\s*<n><!\[CDATA\[(.*?)\]\]></n>\s*(?:<vars\s*/>|<vars>(.*?)</vars>)?",
+    re.DOTALL,
+)
+_VAR = re.compile(r"<var n='([^']*)' t='(\w)'>(?:<!\[CDATA\[(.*?)\]\]>|([^<]*))</var>", re.DOTALL)
+_USER_GONE = re.compile(r"<user id='(-?\d+)'")
+
+
+def _body_attrs(msg: str) -> Dict[str, str]:
+    """The attributes of a sys message's <body> tag."""
+    body = msg.find("<body")
+    if body == -1:
+        return {}
+    return dict(_ATTR.findall(msg, body, msg.find(">", body)))
+
+
+def _var_value(kind: str, text: str) -> Any:
+    # SmartFox variable types: b(ool), n(umber), s(tring), x (null)
+    if kind == "n":
+        try:
+            return int(text)
+        except ValueError:
+            return float(text)
+    if kind == "b":
+        return text == "1"
+    if kind == "x":
+        return None
+    return text
+
+
+def _user_vars(xml: str) -> Dict[str, Any]:
+    variables = {}
+    if xml:
+        for n, kind, cdata, text in _VAR.findall(xml):
+            # every avatar has the same few variables, share the name strings
+            key = _VAR_NAMES.get(n)
+            if key is None:
+                key = n
+                if len(_VAR_NAMES) < 256:
+                    _VAR_NAMES[n] = n
+            variables[key] = _var_value(kind, cdata if cdata else xml_unescape(text))
+    return variables
+
+
+_VAR_NAMES: Dict[str, str] = {}  # user variable names seen so far, capped
+
+
+def _player(m: re.Match, room: int) -> Player:
+    a = dict(_ATTR.findall(m.group(1)))
+    name = m.group(2)
+    if name is None:
+        name = xml_unescape(m.group(3))
+    return Player(
+        int(a["i"]),
+        name,
+        room,
+        a.get("m") == "1",
+        a.get("s") == "1",
+        _to_int_or(a.get("p"), -1),
+        _user_vars(m.group(4)),
+    )
+
+
+def _to_int_or(x: Optional[str], default: int) -> int:
+    if x is None:
+        return default
+    try:
+        return int(x)
+    except ValueError:
+        return default
+
+
 class parse:
     @staticmethod
     def jsish_list(s: str) -> Any:
-        # JS literals -> Python literals so literal_eval can parse
-        s = re.sub(r"\btrue\b", "True", s)
-        s = re.sub(r"\bfalse\b", "False", s)
-        s = re.sub(r"\bnull\b", "None", s)
-        return ast.literal_eval(s)
+        """
+        Parse the JS-ish literal the server uses in "list" fields, e.g. [{'ach':1,'p':0},{"id":4,"safe":true}].
+        Strings are rewritten as whole tokens, a 'true' inside a name stays a string. Raises ValueError on malformed input.
+        """
+        # fast path: without " or \ every ' is a string delimiter
+        if '"' not in s and "\\" not in s:
+            try:
+                return _jsish_decode(s.replace("'", '"'))
+            except ValueError:
+                pass  # bare keys, trailing commas or not valid at all, let the full pass decide
+        return _jsish_decode(_JSISH_TOKEN.sub(_jsish_token, s))
 
     @staticmethod
     def _to_int(x: Any) -> Optional[int]:
@@ -87,7 +517,7 @@ class parse:
     @staticmethod
     def server_list(msg: str) -> Result[dict]:
         """Parse the server list from a raw xt message string. Returns dict with keys:
-        - servers: list of dicts with keys id, name, ip, port, capacity, dt
+        - servers: list of ServerInfo, entries without an ip/port are left out
         - safeChat: bool
         - rank: int
         - userName: str
@@ -123,14 +553,19 @@ class parse:
         if not isinstance(servers, list):
             return Result(ok=False, error="server_list: parsed 'list' not list")
 
+        entries = []
         for s in servers:
-            if isinstance(s, dict) and isinstance(s.get("name"), str):
-                s["name"] = s["name"].strip()
+            if not isinstance(s, dict):
+                continue
+            try:
+                entries.append(ServerInfo.from_dict(s))
+            except (KeyError, TypeError, ValueError):
+                continue  # no usable address
 
         return Result(
             ok=True,
             value={
-                "servers": servers,
+                "servers": entries,
                 "safeChat": safe_chat,
                 "rank": rank,
                 "userName": user_name,
@@ -138,12 +573,12 @@ class parse:
         )
 
     @staticmethod
-    def room_list(msg: str, clean: bool) -> Result[List[Dict[str, Any]]]:
+    def room_list(msg: str, clean: bool) -> Result[List[Room]]:
         """
         Parse:
           <msg><body action='rmList'><rmList><rm ...><n><![CDATA[name]]></n></rm>...</rmList></body></msg>
 
-        Returns list of room dicts with keys:
+        Returns a list of Room with the attributes:
           - id (int)
           - name (str)               # from <n>...</n>
           - usercount (int)          # ucnt
@@ -155,67 +590,155 @@ class parse:
           - is_game (bool)           # game == '1'
           - min_level (int|None)     # lmb (likely "level min bound")
           - max_spectators (int|None)# maxs (likely max spectators/secondary cap)
-          
+        (None when the server didn't send them)
+
         if clean is True, will filter out rooms with 0 users.
         """
+        table = parse.room_table(msg, clean)
+        if not table.ok:
+            return Result(ok=False, error=table.error)
+        return Result(ok=True, value=list(table.value))
+
+    @staticmethod
+    def room_table(msg: str, clean: bool) -> Result[RoomTable]:
+        """
+        Same input as room_list, but scanned straight into a RoomTable without building an XML tree or a record per room.
+        if clean is True, rooms with 0 users are left out (see RoomTable.clean).
+        """
+        start = msg.find("<rmList>")
+        if start == -1:
+            return Result(ok=False, error="Missing <rmList>")
+        end = msg.find("</rmList>", start)
+        if end == -1:
+            return Result(ok=False, error="Unterminated <rmList>")
+
         try:
-            root = ET.fromstring(msg)
+            # the server always writes the attributes in the same order, read all rooms with one findall when it did
+            rows = _ROOM_FAST.findall(msg, start, end)
+            if len(rows) == msg.count("<rm ", start, end):
+                if not rows:
+                    return Result(ok=True, value=RoomTable(clean))
+                ids, priv, temp, game, ucnt, lmb, maxu, maxs, names = zip(*rows)
+                return Result(
+                    ok=True,
+                    value=RoomTable.from_columns(
+                        list(map(int, ids)),
+                        [n.strip() for n in names],
+                        list(map(int, ucnt)),
+                        list(map(int, maxu)),
+                        [_ROOM_FLAGS[f] | (RoomTable.HAS_MIN_LEVEL if l else 0) for f, l in zip(zip(priv, temp, game), lmb)],
+                        [int(l) if l else -1 for l in lmb],
+                        list(map(int, maxs)),
+                        clean,
+                    ),
+                )
+        except Exception as e:
+            return Result(ok=False, error=str(e))
+
+        # anything unusual, go through the attributes one room at a time
+        table = RoomTable(clean)
+        try:
+            for rm in _ROOM.finditer(msg, start, end):
+                a = dict(_ATTR.findall(rm.group(1)))
+                ucnt = _to_int_or(a.get("ucnt"), 0)
+
+                name = rm.group(2)
+                if name is None:
+                    name = xml_unescape(rm.group(3))
 
-            body = root.find("body")
-            if body is None:
-                return Result(ok=False, error="Missing <body>")
-
-            rm_list = body.find("rmList")
-            if rm_list is None:
-                return Result(ok=False, error="Missing <rmList>")
-
-            rooms: List[Dict[str, Any]] = []
-            for rm in rm_list.findall("rm"):
-                a = rm.attrib
-
-                n = rm.findtext("n") or ""
-                name = n.strip()
-
-                def to_int(x: Optional[str]) -> Optional[int]:
-                    if x is None:
-                        return None
-                    try:
-                        return int(x)
-                    except ValueError:
-                        return None
-
-                room: Dict[str, Any] = {
-                    "id": to_int(a.get("id")),
-                    "name": name,
-                    "usercount": to_int(a.get("ucnt")) or 0,
-                    "maxusercount": to_int(a.get("maxu")) or 0,
-                }
-
-                # extras (best-effort, based on attribute names)
+                flags = 0
                 if "priv" in a:
-                    room["is_private"] = a.get("priv") == "1"
+                    flags |= RoomTable.HAS_PRIVATE | (RoomTable.PRIVATE if a["priv"] == "1" else 0)
                 if "temp" in a:
-                    room["is_temporary"] = a.get("temp") == "1"
+                    flags |= RoomTable.HAS_TEMPORARY | (RoomTable.TEMPORARY if a["temp"] == "1" else 0)
                 if "game" in a:
-                    room["is_game"] = a.get("game") == "1"
+                    flags |= RoomTable.HAS_GAME | (RoomTable.GAME if a["game"] == "1" else 0)
                 if "lmb" in a:
-                    room["min_level"] = to_int(a.get("lmb"))
+                    flags |= RoomTable.HAS_MIN_LEVEL
                 if "maxs" in a:
-                    room["max_spectators"] = to_int(a.get("maxs"))
-
-                if not clean or room["usercount"] > 0:
-                    rooms.append(room)
-
-            return Result(ok=True, value=rooms)
+                    flags |= RoomTable.HAS_MAX_SPECTATORS
+
+                table.append(
+                    _to_int_or(a.get("id"), -1),
+                    name.strip(),
+                    ucnt,
+                    _to_int_or(a.get("maxu"), 0),
+                    flags,
+                    _to_int_or(a.get("lmb"), -1),
+                    _to_int_or(a.get("maxs"), -1),
+                )
         except Exception as e:
             return Result(ok=False, error=str(e))
+        return Result(ok=True, value=table)
+
+    @staticmethod
+    def user_count(msg: str) -> Result[tuple[int, int, int]]:
+        """
+        Parse a room occupancy update:
+          <msg t='sys'><body action='uCount' r='3' u='12' s='0'></body></msg>
+        Returns (room_id, users, spectators), spectators is 0 when the server didn't send it.
+        """
+        a = _body_attrs(msg)
+        try:
+            return Result(ok=True, value=(int(a["r"]), int(a["u"]), _to_int_or(a.get("s"), 0)))
+        except (KeyError, ValueError):
+            return Result(ok=False, error="uCount: missing/invalid 'r' or 'u'")
 
     @staticmethod
-    def inv_list(msg: str) -> Result[List[Dict[str, Any]]]:
-        """Parse inventory list from xt message. Returns list of dicts with keys:
-        - item_id: int
-        - quantity: int
+    def room_users(msg: str) -> Result[tuple[int, List[Player]]]:
+        """
+        Parse the user list of a joinOK:
+          <msg t='sys'><body action='joinOK' r='3'><pid id='0'/><vars /><uLs r='3'><u i='1' m='0' s='0' p='-1'>
+          <n><![CDATA[name]]></n><vars><var n='rank' t='n'><![CDATA[1]]></var></vars></u>...</uLs></body></msg>
+        Returns (room_id, players).
         """
+        start = msg.find("<uLs")
+        if start == -1:
+            return Result(ok=False, error="joinOK: missing <uLs>")
+        end = msg.find("</uLs>", start)
+        if end == -1:
+            end = len(msg)  # <uLs r='3'/> for an empty room
+        try:
+            room = int(dict(_ATTR.findall(msg, start, msg.find(">", start))).get("r", _body_attrs(msg).get("r", -1)))
+            # in the server's usual attribute order, one findall reads every user
+            rows = _USER_FAST.findall(msg, start, end)
+            if len(rows) == msg.count("<u ", start, end):
+                players = [
+                    Player(int(i), name, room, m == "1", s == "1", int(p), _user_vars(variables))
+                    for i, m, s, p, name, variables in rows
+                ]
+            else:
+                players = [_player(m, room) for m in _USER.finditer(msg, start, end)]
+            return Result(ok=True, value=(room, players))
+        except (KeyError, ValueError) as e:
+            return Result(ok=False, error=f"joinOK: invalid user: {e}")
+
+    @staticmethod
+    def user_enter(msg: str) -> Result[Player]:
+        """Parse a uER (user entered room), same <u> element as in joinOK's user list."""
+        m = _USER.search(msg)
+        if m is None:
+            return Result(ok=False, error="uER: missing <u>")
+        try:
+            return Result(ok=True, value=_player(m, _to_int_or(_body_attrs(msg).get("r"), -1)))
+        except (KeyError, ValueError) as e:
+            return Result(ok=False, error=f"uER: invalid user: {e}")
+
+    @staticmethod
+    def user_gone(msg: str) -> Result[tuple[int, int]]:
+        """
+        Parse a userGone:
+          <msg t='sys'><body action='userGone' r='3'><user id='1' /></body></msg>
+        Returns (room_id, user_id).
+        """
+        m = _USER_GONE.search(msg)
+        if m is None:
+            return Result(ok=False, error="userGone: missing <user id>")
+        return Result(ok=True, value=(_to_int_or(_body_attrs(msg).get("r"), -1), int(m.group(1))))
+
+    @staticmethod
+    def inv_list(msg: str) -> Result[List[InventoryItem]]:
+        """Parse inventory list from xt message. Returns list of InventoryItem (item_id, quantity)."""
         data = decode.xt(msg)
         if not data.ok:
             return Result(ok=False, error=data.error)
@@ -235,27 +758,54 @@ class parse:
                 try:
                     item_id = int(item_id_str)
                     quantity = int(quantity_str)
-                    items.append({"item_id": item_id, "quantity": quantity})
+                    items.append(InventoryItem(item_id, quantity))
                 except ValueError:
                     continue  # skip malformed entries
             else:
                 try:
                     item_id = int(part)
-                    items.append({"item_id": item_id, "quantity": 1})
+                    items.append(InventoryItem(item_id))
                 except ValueError:
                     continue  # skip malformed entries
 
         return Result(ok=True, value=items)
 
     @staticmethod
-    def login_res(msg: str) -> Result[dict]:
-        """Parse login response from xt message. Returns dict with keys:
+    def inventory(msg: str) -> Result[Inventory]:
+        """Parse the inventory list from an xt message straight into an Inventory, without a dict per item. Repeated ids add up."""
+        data = decode.xt(msg)
+        if not data.ok:
+            return Result(ok=False, error=data.error)
+
+        o = data.value.get("b", {}).get("o", {})
+        if not isinstance(o, dict):
+            return Result(ok=False, error="inventory: invalid 'b.o'")
+
+        raw_list = o.get("list")
+        if not isinstance(raw_list, str) or not raw_list:
+            return Result(ok=False, error="inventory: missing/invalid 'list'")
+
+        counts: Dict[int, int] = {}
+        get = counts.get
+        for part in raw_list.split(","):
+            item_id, sep, quantity = part.partition("-")
+            try:
+                item_id = int(item_id)
+                counts[item_id] = get(item_id, 0) + (int(quantity) if sep else 1)
+            except ValueError:
+                continue  # skip malformed entries
+
+        return Result(ok=True, value=Inventory(counts))
+
+    @staticmethod
+    def login_res(msg: str) -> Result[LoginResult]:
+        """Parse login response from xt message. Returns a LoginResult:
         - date: str
         - c: int
         - time: str
         - k: int
-        - resoulationCtg: int
-        - resoulationVal: str
+        - resolution_ctg: int       # resoulationCtg
+        - resolution_val: str       # resoulationVal
         """
         data = decode.xt(msg)
         if not data.ok:
@@ -265,7 +815,7 @@ class parse:
         if not isinstance(o, dict):
             return Result(ok=False, error="login_res: invalid 'b.o'")
 
-        return Result(ok=True, value=o)
+        return Result(ok=True, value=LoginResult.from_dict(o))
 
     @staticmethod
     def achievement_res(msg: str) -> Result[Dict[str, Any]]:
@@ -278,14 +828,7 @@ class parse:
           "level": int|None,
           "points_total": int|None,
           "is_update": bool,
-          "achievements": [
-             {
-               "achievement_id": int,"step_id": int,
-               "progress": int,
-               "points": int,
-               "key": "ach:ass"
-             }, ...
-          ]
+          "achievements": [Achievement(achievement_id, step_id, progress, points), ...]
         }
         """
         data = decode.xt(msg)
@@ -317,7 +860,7 @@ class parse:
         if not isinstance(items, list):
             return Result(ok=False, error="achievement_res: parsed 'list' not list")
 
-        achievements: List[Dict[str, Any]] = []
+        achievements: List[Achievement] = []
         for it in items:
             if not isinstance(it, dict):
                 continue
@@ -331,14 +874,7 @@ class parse:
             if ach is None or ass is None:
                 continue
 
-            entry = {
-                "achievement_id": ach,
-                "step_id": ass,
-                "progress": prg if prg is not None else 0,
-                "points": p if p is not None else 0,
-                "key": f"{ach}:{ass}",
-            }
-            achievements.append(entry)
+            achievements.append(Achievement(ach, ass, prg if prg is not None else 0, p if p is not None else 0))
 
         out["achievements"] = achievements
         return Result(ok=True, value=out)
@@ -0,0 +1,53 @@
+"""
+mikmakpy.reconnect
+──────────────────
+Backoff policy and statistics for the client's reconnect loop.
+"""
+
+from dataclasses import dataclass
+from random import random
+
+
+class Backoff:
+    """
+    Capped exponential backoff with jitter: attempt n waits base * factor**n, capped at cap,
+    of which a `jitter` fraction is randomised. Jitter is what keeps a whole fleet that got
+    disconnected at the same moment from coming back in lockstep.
+    """
+
+    __slots__ = ("base", "cap", "factor", "jitter")
+
+    def __init__(self, base: float = 5.0, cap: float = 60.0, factor: float = 2.0, jitter: float = 0.5):
+        self.base = base
+        self.cap = cap
+        self.factor = factor
+        self.jitter = jitter
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before the given (0 based) reconnect attempt."""
+        d = min(self.cap, self.base * self.factor**attempt)
+        return d * (1.0 - self.jitter) + random() * d * self.jitter
+
+
+@dataclass(slots=True)
+class ReconnectStats:
+    """Counters of the reconnect loop. Latency is from losing a connection to having a new one."""
+
+    disconnects: int = 0  # unplanned connection losses
+    attempts: int = 0  # reconnect attempts scheduled
+    failures: int = 0  # connects that failed
+    reconnects: int = 0  # reconnects that succeeded
+    last_latency: float | None = None
+    max_latency: float = 0.0
+    total_latency: float = 0.0
+
+    def record_latency(self, seconds: float):
+        self.reconnects += 1
+        self.last_latency = seconds
+        self.total_latency += seconds
+        if seconds > self.max_latency:
+            self.max_latency = seconds
+
+    @property
+    def mean_latency(self) -> float | None:
+        return self.total_latency / self.reconnects if self.reconnects else None
@@ -0,0 +1,271 @@
+"""
+mikmakpy.recorder
+─────────────────
+Records a connection's raw frames to a compact binary log, and replays such logs through a client
+(at the original pace or as fast as possible) to profile parsers and handlers offline.
+
+Log layout (little endian):
+    header  MAGIC, f64 unix time the recording started
+    record  u8 direction, u64 ns since the start, u32 length, the frame's bytes as on the wire (no null terminator)
+The index, next to the log as <path>.idx, holds (u64 record number, u64 offset, u64 ns) every index_every records.
+"""
+
+from bisect import bisect_right
+from dataclasses import dataclass
+import os
+import struct
+import threading
+from time import monotonic_ns, perf_counter, sleep, time
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+MAGIC = b"MMKREC\x01\n"
+IN, OUT = 0, 1
+
+_HEADER = struct.Struct("<d")
+_RECORD = struct.Struct("<BQI")
+_INDEX = struct.Struct("<QQQ")
+
+
+@dataclass(frozen=True, slots=True)
+class Frame:
+    direction: int  # IN or OUT
+    ns: int  # since the recording started
+    data: bytes
+
+    @property
+    def text(self) -> str:
+        return self.data.decode("utf-8", errors="replace")
+
+    @property
+    def seconds(self) -> float:
+        return self.ns / 1e9
+
+
+class SessionRecorder:
+    """
+    Appends frames to a log file. Pass it to a client (or Connection) as recorder=, every
+    connection of the client then records into the same log. Thread safe, the blocking
+    Connection records outgoing frames from its writer thread.
+
+        with SessionRecorder("session.mmk") as rec:
+            MikmakLoginClient(user, pw, recorder=rec).connect()
+    """
+
+    def __init__(self, path: str, index_every: int = 256):
+        self.path = path
+        self.index_every = index_every
+        self._lock = threading.Lock()
+        self._file: BinaryIO = open(path, "wb", buffering=1 << 16)
+        self._index: BinaryIO = open(path + ".idx", "wb")
+        self._start = monotonic_ns()
+        self._count = 0
+        self._file.write(MAGIC + _HEADER.pack(time()))
+        self._offset = len(MAGIC) + _HEADER.size
+
+    def record(self, direction: int, data: bytes):
+        with self._lock:
+            if self._file.closed:
+                return
+            # stamped under the lock, records from the receive and writer threads stay in time order
+            ns = monotonic_ns() - self._start
+            if self._count % self.index_every == 0:
+                self._index.write(_INDEX.pack(self._count, self._offset, ns))
+            self._file.write(_RECORD.pack(direction, ns, len(data)))
+            self._file.write(data)
+            self._offset += _RECORD.size + len(data)
+            self._count += 1
+
+    def incoming(self, data: bytes | memoryview | str):
+        """One incoming frame, the raw bytes as received (the connections hand them over before decoding). Text is stored as utf-8."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self.record(IN, data)
+
+    def outgoing(self, data: bytes):
+        """Encoded outgoing bytes, one frame or a batch of them, null terminated."""
+        for frame in data.split(b"\x00")[:-1]:
+            self.record(OUT, frame)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                self._index.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+                self._index.close()
+
+    def __enter__(self) -> "SessionRecorder":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SessionLog:
+    """
+    Reads a log written by SessionRecorder. Iterate for every frame, or seek() to start
+    from a record number or a point in time without reading what's before it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            head = f.read(len(MAGIC) + _HEADER.size)
+        if not head.startswith(MAGIC) or len(head) < len(MAGIC) + _HEADER.size:
+            raise ValueError(f"{path} is not a session log")
+        (self.started_at,) = _HEADER.unpack_from(head, len(MAGIC))
+        self._data_start = len(head)
+        self._index = self._load_index()
+        self._len: Optional[int] = None
+
+    def __iter__(self) -> Iterator[Frame]:
+        return self._read(self._data_start)
+
+    def seek(self, record: Optional[int] = None, seconds: Optional[float] = None) -> Iterator[Frame]:
+        """Frames from the given record number, or from the first frame at or after the given time."""
+        if record is not None:
+            i = bisect_right(self._index, (record, float("inf"))) - 1
+            start = self._index[i] if i >= 0 else (0, self._data_start, 0)
+            frames = self._read(start[1])
+            for _ in range(record - start[0]):
+                if next(frames, None) is None:
+                    break
+            return frames
+
+        ns = int((seconds or 0) * 1e9)
+        # the index is sorted by ns as well, record numbers and times only grow
+        i = bisect_right([entry[2] for entry in self._index], ns) - 1
+        offset = self._index[i][1] if i >= 0 else self._data_start
+        return (frame for frame in self._read(offset) if frame.ns >= ns)
+
+    def __len__(self) -> int:
+        if self._len is None:
+            start = self._index[-1] if self._index else (0, self._data_start, 0)
+            self._len = start[0] + sum(1 for _ in self._read(start[1]))
+        return self._len
+
+    def _read(self, offset: int) -> Iterator[Frame]:
+        header_size = _RECORD.size
+        with open(self.path, "rb", buffering=1 << 16) as f:
+            f.seek(offset)
+            while True:
+                head = f.read(header_size)
+                if len(head) < header_size:
+                    return
+                direction, ns, length = _RECORD.unpack(head)
+                data = f.read(length)
+                if len(data) < length:
+                    return  # truncated tail, the recorder was killed mid write
+                yield Frame(direction, ns, data)
+
+    def _load_index(self) -> List[Tuple[int, int, int]]:
+        try:
+            with open(self.path + ".idx", "rb") as f:
+                raw = f.read()
+        except OSError:
+            return []
+        size = os.path.getsize(self.path)
+        entries = [_INDEX.unpack_from(raw, i) for i in range(0, len(raw) - _INDEX.size + 1, _INDEX.size)]
+        return [e for e in entries if e[1] < size]
+
+
+class NullConnection:
+    """Stands in for the connection during a replay: sends go nowhere, nothing is closed."""
+
+    send_queue = None
+
+    def __init__(self):
+        self.sent = 0
+
+    def send(self, message: str) -> bool:
+        self.sent += 1
+        return True
+
+    def send_bytes(self, data: bytes, command: str = "") -> bool:
+        self.sent += 1
+        return True
+
+    def close(self):
+        pass
+
+
+@dataclass(slots=True)
+class ReplayStats:
+    frames: int = 0
+    bytes: int = 0
+    seconds: float = 0.0  # wall time spent, waiting included
+    handler_seconds: float = 0.0  # time spent inside _on_message
+
+    @property
+    def frames_per_second(self) -> float:
+        return self.frames / self.handler_seconds if self.handler_seconds else 0.0
+
+    @property
+    def ns_per_frame(self) -> float:
+        return self.handler_seconds / self.frames * 1e9 if self.frames else 0.0
+
+
+def replay(frames, client, realtime: bool = False, speed: float = 1.0) -> ReplayStats:
+    """
+    Feed the incoming frames of a log (a SessionLog or any iterable of Frames, e.g. log.seek(...))
+    to client._on_message. realtime keeps the recorded gaps between frames (divided by speed),
+    otherwise they're fed as fast as the client takes them. Anything the client sends is dropped.
+    """
+    stats = ReplayStats()
+    conn, client._conn = client._conn, NullConnection()
+    on_message = client._on_message
+    first_ns = None
+    started = perf_counter()
+    try:
+        for frame in frames:
+            if frame.direction != IN:
+                continue
+            if realtime:
+                if first_ns is None:
+                    first_ns = frame.ns
+                ahead = (frame.ns - first_ns) / 1e9 / speed - (perf_counter() - started)
+                if ahead > 0:
+                    sleep(ahead)
+
+            msg = frame.data.decode("utf-8", errors="replace")
+            t = perf_counter()
+            on_message(msg)
+            stats.handler_seconds += perf_counter() - t
+            stats.frames += 1
+            stats.bytes += len(frame.data)
+    finally:
+        client._conn = conn
+    stats.seconds = perf_counter() - started
+    return stats
+
+
+def main():
+    import argparse
+
+    from .ingame import MikmakIngameClient
+
+    ap = argparse.ArgumentParser(prog="python -m mikmakpy.recorder", description="Replay a session log through a client.")
+    ap.add_argument("path")
+    ap.add_argument("--realtime", action="store_true", help="keep the recorded pace")
+    ap.add_argument("--speed", type=float, default=1.0)
+    args = ap.parse_args()
+
+    log = SessionLog(args.path)
+    client = MikmakIngameClient("replay", "")
+    stats = replay(log, client, args.realtime, args.speed)
+    print(
+        f"{stats.frames} frames, {stats.bytes} bytes in {stats.seconds:.3f}s, "
+        f"{stats.frames_per_second:,.0f} frames/s, {stats.ns_per_frame:,.0f} ns/frame in handlers"
+    )
+
+
+if __name__ == "__main__":
+    main()
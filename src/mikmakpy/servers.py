@@ -0,0 +1,261 @@
+"""
+mikmakpy.servers
+────────────────
+Caching of the server list, so clients can skip the login server and connect straight to their game server,
+and latency aware selection of the game server.
+"""
+
+import asyncio
+from collections import Counter
+from dataclasses import dataclass
+import json
+import os
+import threading
+from time import monotonic, perf_counter, time
+from typing import Any, Dict, List, Optional
+
+from .models import ServerInfo
+from .protocol import encode
+
+
+class ServerListCache:
+    """
+    Server lists keyed by the login server they came from ("ip:port"), valid for ttl seconds.
+    Kept in memory and, when a path is given, in a JSON file so restarts can use it too.
+    One instance can be shared by every client of a process (thread safe).
+    """
+
+    def __init__(self, ttl: float = 3600, path: Optional[str] = None):
+        self.ttl = ttl
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}  # key -> {"stored": unix time, "servers": [...]}
+        if path:
+            self._load()
+
+    def get(self, key: str) -> Optional[List[ServerInfo]]:
+        """The cached list, None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time() - entry["stored"] > self.ttl:
+                del self._entries[key]
+                return None
+            return entry["servers"]
+
+    def find(self, key: str, name: str) -> Optional[ServerInfo]:
+        """The cached server whose name contains name (same matching as server_to_join)."""
+        for srv in self.get(key) or []:
+            if name in srv.name:
+                return srv
+        return None
+
+    def put(self, key: str, servers: List[ServerInfo]):
+        with self._lock:
+            self._entries[key] = {"stored": time(), "servers": servers}
+            self._save()
+
+    def invalidate(self, key: str):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self._save()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(data, dict):
+            return
+        for k, v in data.items():
+            if isinstance(v, dict) and "stored" in v and isinstance(v.get("servers"), list):
+                servers = []
+                for srv in v["servers"]:
+                    try:
+                        servers.append(ServerInfo.from_dict(srv))
+                    except (AttributeError, KeyError, TypeError, ValueError):
+                        continue
+                self._entries[k] = {"stored": v["stored"], "servers": servers}
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                data = {k: {"stored": v["stored"], "servers": [srv.as_dict() for srv in v["servers"]]} for k, v in self._entries.items()}
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass  # the cache is an optimisation, never fail the client over it
+
+
+@dataclass(frozen=True, slots=True)
+class Probe:
+    """Result of probing one ip:port. rtt is the TCP connect time in seconds, None when unreachable."""
+
+    rtt: Optional[float]
+    verchk_rtt: Optional[float] = None  # verChk -> first reply, when asked for
+    probed_at: float = 0.0  # monotonic
+
+
+class ServerProber:
+    """
+    Measures servers concurrently (TCP connect time, optionally a verChk round trip) and caches
+    the results for ttl seconds. The module level shared_prober is used by default, so every
+    client of the process reuses the same measurements.
+    """
+
+    def __init__(self, ttl: float = 60, timeout: float = 2.0, verchk: bool = False):
+        self.ttl = ttl
+        self.timeout = timeout
+        self.verchk = verchk
+        self._lock = threading.Lock()
+        self._results: Dict[tuple[str, int], Probe] = {}
+        self._inflight: Dict[tuple[str, int], asyncio.Future] = {}
+
+    def cached(self, ip: str, port: int) -> Optional[Probe]:
+        with self._lock:
+            probe = self._results.get((ip, port))
+        if probe is None or monotonic() - probe.probed_at > self.ttl:
+            return None
+        return probe
+
+    async def probe_all(self, addresses: List[tuple[str, int]]) -> Dict[tuple[str, int], Probe]:
+        """Probe every address not already cached, all at once."""
+        results = await asyncio.gather(*(self.probe(ip, port) for ip, port in addresses))
+        return dict(zip(addresses, results))
+
+    async def probe(self, ip: str, port: int) -> Probe:
+        probe = self.cached(ip, port)
+        if probe is not None:
+            return probe
+
+        # several clients on one loop asking at once share one probe
+        key = (ip, port)
+        loop = asyncio.get_running_loop()
+        fut = self._inflight.get(key)
+        if fut is not None and fut.get_loop() is loop:
+            return await fut
+        fut = self._inflight[key] = loop.create_future()
+        try:
+            probe = await self._measure(ip, port)
+            with self._lock:
+                self._results[key] = probe
+            fut.set_result(probe)
+            return probe
+        finally:
+            if not fut.done():
+                fut.cancel()
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    async def _measure(self, ip: str, port: int) -> Probe:
+        start = perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), self.timeout)
+        except (OSError, TimeoutError):
+            return Probe(None, None, monotonic())
+        rtt = perf_counter() - start
+
+        verchk_rtt = None
+        try:
+            if self.verchk:
+                start = perf_counter()
+                writer.write(encode.raw(encode.sys("verChk", "<ver v='165' />")))
+                await asyncio.wait_for(reader.readuntil(b"\x00"), self.timeout)
+                verchk_rtt = perf_counter() - start
+        except (OSError, TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            writer.close()
+        return Probe(rtt, verchk_rtt, monotonic())
+
+
+shared_prober = ServerProber()
+
+
+class ServerSelector:
+    """
+    Picks the game server from a server_list by score (lower is better):
+
+        latency_ms + load_weight_ms * capacity + spread_weight_ms * clients_already_sent_there
+
+    Servers reporting a negative capacity or that didn't answer the probe are skipped.
+    Share one selector between the clients of a fleet and spread_weight_ms spreads them over the servers.
+    """
+
+    def __init__(
+        self,
+        prober: Optional[ServerProber] = None,
+        load_weight_ms: float = 200,
+        spread_weight_ms: float = 0,
+        unknown_latency_ms: float = 500,
+    ):
+        self.prober = prober or shared_prober
+        self.load_weight_ms = load_weight_ms
+        self.spread_weight_ms = spread_weight_ms
+        self.unknown_latency_ms = unknown_latency_ms  # used by pick() for servers not probed yet
+        self._assigned: Counter = Counter()
+        self._lock = threading.Lock()
+
+    async def choose(self, servers: List[ServerInfo], name: Optional[str] = None) -> Optional[ServerInfo]:
+        """Probe the candidates (cached results are reused) and pick the best one."""
+        candidates = self._candidates(servers, name)
+        await self.prober.probe_all([_address(srv) for srv in candidates])
+        return self.pick(candidates)
+
+    def choose_blocking(self, servers: List[ServerInfo], name: Optional[str] = None) -> Optional[ServerInfo]:
+        """choose() for threads without a running event loop (the blocking client)."""
+        return asyncio.run(self.choose(servers, name))
+
+    def pick(self, servers: List[ServerInfo], name: Optional[str] = None) -> Optional[ServerInfo]:
+        """Pick without any network I/O, from cached probes only."""
+        best, best_score = None, None
+        for srv in self._candidates(servers, name):
+            score = self.score(srv)
+            if score is not None and (best_score is None or score < best_score):
+                best, best_score = srv, score
+        if best is not None:
+            with self._lock:
+                self._assigned[_address(best)] += 1
+        return best
+
+    def score(self, srv: ServerInfo) -> Optional[float]:
+        probe = self.prober.cached(*_address(srv))
+        if probe is not None and probe.rtt is None:
+            return None
+        latency = self.unknown_latency_ms
+        if probe is not None:
+            latency = (probe.verchk_rtt if probe.verchk_rtt is not None else probe.rtt) * 1000
+        load = srv.capacity or 0
+        return latency + self.load_weight_ms * load + self.spread_weight_ms * self._assigned[_address(srv)]
+
+    def assigned(self, srv: ServerInfo) -> int:
+        """How many clients were sent to srv and haven't released it yet."""
+        with self._lock:
+            return self._assigned[_address(srv)]
+
+    def release(self, srv: ServerInfo):
+        """A client left srv, stop counting it for spreading."""
+        with self._lock:
+            key = _address(srv)
+            if self._assigned[key] > 0:
+                self._assigned[key] -= 1
+
+    @staticmethod
+    def _candidates(servers: List[ServerInfo], name: Optional[str]) -> List[ServerInfo]:
+        out = []
+        for srv in servers:
+            if name is not None and name not in srv.name:
+                continue
+            if srv.capacity is not None and srv.capacity < 0:
+                continue  # closed / not for us
+            out.append(srv)
+        return out
+
+
+def _address(srv: ServerInfo) -> tuple[str, int]:
+    return srv.ip, srv.port
@@ -0,0 +1,525 @@
+"""
+mikmakpy.shards
+───────────────
+Provides ShardedFleet, which spreads a large fleet over worker processes so parsing and dispatch use every core.
+Each worker runs a Fleet (one event loop, many sessions) and talks to the parent over a pipe: commands go down,
+batched events and replies come back up. The parent restarts crashed workers and moves their accounts when a
+worker keeps crashing.
+"""
+
+import asyncio
+from concurrent.futures import Future
+from itertools import count
+import math
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import queue
+import signal
+import threading
+from time import monotonic
+from typing import Any, Callable, Iterable
+
+from .fleet import Account, Fleet
+from .log import ClientLogger
+from .login import MikmakLoginClient
+from .metrics import merge
+from .reconnect import Backoff
+from .state import GameState
+
+
+class _Shard:
+    """Parent side bookkeeping of one worker process."""
+
+    def __init__(self, index: int):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.send_lock = threading.Lock()
+        self.accounts: set[str] = set()
+        # request id -> reply, failed if the worker dies. Callers add, the monitor thread answers or fails them, under requests_lock
+        self.requests: dict[int, Future] = {}
+        self.request_ids = count()
+        self.requests_lock = threading.Lock()
+        self.crashes: list[float] = []  # monotonic times of recent crashes
+        self.restarts = 0
+        self.restart_at: float | None = None
+        self.retired = False  # crashed too often, its accounts live elsewhere now
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.restart_at is None and not self.retired
+
+
+class ShardedFleet:
+    """
+    A Fleet spread over `workers` processes (default: one per core).
+
+        fleet = ShardedFleet([("bot1", "pw"), ("bot2", "pw")], client_cls=MikmakIngameClient)
+
+        @fleet.on("login_res")
+        def on_login(username, res):      # runs in the parent, on its event thread
+            print(username, res)
+
+        fleet.start()                      # returns once the workers are spawned
+        fleet.call("bot1", "disconnect")   # any client method, run in the account's worker
+        fleet.join()                       # blocks until stop(), Ctrl+C stops
+
+    Accounts go to the least loaded worker. Event handlers get the username instead of the client, and the
+    event arguments as the worker pickled them; only subscribed events cross the pipe. A crashed worker is
+    restarted with its accounts, after backoff; one that crashes max_restarts times within restart_window
+    seconds is retired and its accounts spread over the others. rebalance() evens out the shards (moving an
+    account means a fresh login for it).
+
+    client_cls and the keyword arguments for its constructor must be picklable, as the workers are spawned.
+    """
+
+    def __init__(
+        self,
+        accounts: Iterable[Account | tuple[str, str]] = (),
+        workers: int | None = None,
+        client_cls: type[MikmakLoginClient] = MikmakLoginClient,
+        max_restarts: int = 5,
+        restart_window: float = 60.0,
+        restart_backoff: Backoff = Backoff(0.5, 30.0),
+        mp_context: str = "spawn",
+        **client_kwargs,
+    ):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.restart_backoff = restart_backoff
+        self.log = ClientLogger()
+        self._client_cls = client_cls
+        self._client_kwargs = client_kwargs
+        self._ctx = multiprocessing.get_context(mp_context)
+        self._shards = [_Shard(i) for i in range(self.workers)]
+        self._accounts: dict[str, Account] = {}
+        self._placement: dict[str, _Shard] = {}
+        self._handlers: dict[str, list[Callable]] = {}  # event pattern -> handlers in the parent
+        self._lock = threading.RLock()
+        self._running = False
+        self._stopped = threading.Event()
+        self._monitor: threading.Thread | None = None  # drains the pipes, restarts crashed workers
+        self._events: queue.SimpleQueue = queue.SimpleQueue()  # event batches for _event_thread, None stops it
+        self._event_thread: threading.Thread | None = None
+
+        for account in accounts:
+            self.add(account)
+
+    # Public API
+    def add(self, account: Account | tuple[str, str]) -> int:
+        """Place an account on the least loaded worker (started right away if running). Returns the worker index."""
+        if not isinstance(account, Account):
+            account = Account(*account)
+        with self._lock:
+            if account.username in self._accounts:
+                raise ValueError(f"Account '{account.username}' is already in the fleet")
+            shard = self._least_loaded()
+            self._accounts[account.username] = account
+            self._place(account, shard)
+            return shard.index
+
+    def remove(self, username: str):
+        """Stop the account's session and drop it from the fleet."""
+        with self._lock:
+            del self._accounts[username]
+            shard = self._placement.pop(username)
+            shard.accounts.discard(username)
+            self._post(shard, ("remove", username))
+
+    def on(self, event: str):
+        """
+        Subscribe to an event of every client (current and future). Handlers get the username first, wildcard
+        handlers ("xt:*") then the event name, like EventBus. They run on the parent's event thread, in order
+        per worker. That isn't the thread reading the workers' replies, so handlers may call state() or metrics().
+        """
+
+        def decorator(fn):
+            with self._lock:
+                new = event not in self._handlers
+                self._handlers.setdefault(event, []).append(fn)
+                if new:
+                    for shard in self._shards:
+                        self._post(shard, ("subscribe", event))
+            return fn
+
+        return decorator
+
+    def send(self, username: str, message: str) -> bool:
+        """Queue a raw message on the account's connection. False when its worker is down."""
+        return self.call(username, "_send.raw", message)
+
+    def call(self, username: str, method: str, *args, **kwargs) -> bool:
+        """Call a method of the account's client in its worker (e.g. "disconnect", or dotted, "_send.xt"). Fire and forget."""
+        with self._lock:
+            shard = self._placement[username]
+        return self._post(shard, ("call", username, method, args, kwargs))
+
+    def metrics(self, timeout: float = 5.0) -> dict:
+        """Every worker's Fleet.metrics() summed up, plus the worker count and restarts."""
+        futures = [self._request(shard, "metrics") for shard in self._shards if shard.alive]
+        snap = merge(_results(futures, timeout))
+        snap.setdefault("gauges", {})["workers"] = sum(shard.alive for shard in self._shards)
+        snap.setdefault("counters", {})["worker_restarts"] = sum(shard.restarts for shard in self._shards)
+        return snap
+
+    def state(self, username: str, timeout: float = 5.0) -> GameState:
+        """A copy of the account's ingame_state, fetched from its worker."""
+        with self._lock:
+            shard = self._placement[username]
+        return self._request(shard, "state", username).result(timeout)
+
+    def start(self) -> "ShardedFleet":
+        """Spawn the workers and return. Events are delivered from a background thread until stop()."""
+        with self._lock:
+            if self._running:
+                return self
+            self._running = True
+            self._stopped.clear()
+            for shard in self._shards:
+                if not shard.retired:
+                    self._spawn(shard)
+        self._event_thread = threading.Thread(target=self._event_loop, name="mikmak-shards-events", daemon=True)
+        self._event_thread.start()
+        self._monitor = threading.Thread(target=self._monitor_loop, name="mikmak-shards", daemon=True)
+        self._monitor.start()
+        return self
+
+    def join(self, timeout: float | None = None) -> bool:
+        """Block until stop() (or Ctrl+C, which stops). False on timeout."""
+        try:
+            return self._stopped.wait(timeout)
+        except KeyboardInterrupt:
+            self.stop()
+            return True
+
+    def stop(self, timeout: float = 5.0):
+        """Stop every worker (they disconnect their clients first), killing the ones that don't exit in time."""
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            for shard in self._shards:
+                self._post(shard, ("stop",))
+        deadline = monotonic() + timeout
+        for shard in self._shards:
+            if shard.process is not None:
+                shard.process.join(max(0.0, deadline - monotonic()))
+                if shard.process.is_alive():
+                    shard.process.kill()
+                    shard.process.join()
+        if self._monitor is not None and self._monitor is not threading.current_thread():
+            self._monitor.join()
+        # the monitor is done, deliver what it queued and let the event thread go
+        self._events.put(None)
+        if self._event_thread is not None and self._event_thread is not threading.current_thread():
+            self._event_thread.join()
+        for shard in self._shards:
+            self._fail_requests(shard)
+            if shard.conn is not None:
+                shard.conn.close()
+            shard.process = shard.conn = None
+        self._stopped.set()
+
+    def rebalance(self) -> int:
+        """Move accounts from the fullest live workers to the emptiest until they differ by at most one. Returns how many moved."""
+        moved = 0
+        with self._lock:
+            live = [shard for shard in self._shards if not shard.retired]
+            if not live:
+                return 0
+            ceiling = math.ceil(len(self._accounts) / len(live))
+            for shard in live:
+                while len(shard.accounts) > ceiling:
+                    target = self._least_loaded()
+                    if len(target.accounts) + 1 >= len(shard.accounts):
+                        break
+                    username = next(iter(shard.accounts))
+                    shard.accounts.discard(username)
+                    self._post(shard, ("remove", username))
+                    self._place(self._accounts[username], target)
+                    moved += 1
+        return moved
+
+    def shard_of(self, username: str) -> int:
+        return self._placement[username].index
+
+    @property
+    def shards(self) -> list[dict[str, Any]]:
+        """Per worker: index, pid, alive, retired, restarts and its accounts."""
+        return [
+            {
+                "index": shard.index,
+                "pid": shard.process.pid if shard.process is not None else None,
+                "alive": shard.alive,
+                "retired": shard.retired,
+                "restarts": shard.restarts,
+                "accounts": sorted(shard.accounts),
+            }
+            for shard in self._shards
+        ]
+
+    def __contains__(self, username: str) -> bool:
+        return username in self._accounts
+
+    def __len__(self) -> int:
+        return len(self._accounts)
+
+    def __enter__(self) -> "ShardedFleet":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # Private methods
+    def _least_loaded(self) -> _Shard:
+        candidates = [shard for shard in self._shards if not shard.retired] or self._shards
+        return min(candidates, key=lambda shard: len(shard.accounts))
+
+    def _place(self, account: Account, shard: _Shard):
+        self._placement[account.username] = shard
+        shard.accounts.add(account.username)
+        self._post(shard, ("add", account))
+
+    def _post(self, shard: _Shard, msg: tuple) -> bool:
+        """Send to a running worker, False when it isn't (it gets the parent's state again when it's (re)spawned)."""
+        if not shard.alive or shard.conn is None:
+            return False
+        try:
+            with shard.send_lock:
+                shard.conn.send(msg)
+            return True
+        except (OSError, ValueError):
+            return False  # the monitor notices the dead worker
+
+    def _request(self, shard: _Shard, what: str, arg: Any = None) -> Future:
+        if threading.current_thread() is self._monitor:
+            raise RuntimeError("a request from the monitor thread would wait for the reply only it can read")
+        future: Future = Future()
+        with shard.requests_lock:
+            request_id = next(shard.request_ids)
+            shard.requests[request_id] = future
+        if not self._post(shard, ("request", request_id, what, arg)):
+            with shard.requests_lock:
+                mine = shard.requests.pop(request_id, None) is not None
+            if mine:  # otherwise _fail_requests got to it first
+                future.set_exception(ConnectionError(f"worker {shard.index} is not running"))
+        return future
+
+    def _fail_requests(self, shard: _Shard):
+        with shard.requests_lock:
+            requests, shard.requests = shard.requests, {}
+        for future in requests.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"worker {shard.index} stopped"))
+
+    def _spawn(self, shard: _Shard):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(shard.index, child_conn, self._client_cls, self._client_kwargs),
+            name=f"mikmak-shard-{shard.index}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        shard.process, shard.conn, shard.restart_at = process, parent_conn, None
+        # a new worker knows nothing, replay the subscriptions and its accounts
+        for event in self._handlers:
+            self._post(shard, ("subscribe", event))
+        for username in shard.accounts:
+            self._post(shard, ("add", self._accounts[username]))
+
+    def _monitor_loop(self):
+        while self._running:
+            with self._lock:
+                live = [shard for shard in self._shards if shard.alive]
+                waiting = [shard.restart_at for shard in self._shards if shard.restart_at is not None and not shard.retired]
+            by_handle = {}
+            for shard in live:
+                by_handle[shard.conn] = shard
+                by_handle[shard.process.sentinel] = shard
+            now = monotonic()
+            timeout = max(0.0, min(waiting) - now) if waiting else 0.5
+            for handle in wait(list(by_handle), min(timeout, 0.5)):
+                shard = by_handle[handle]
+                if handle is shard.conn:
+                    self._drain(shard)
+                elif shard.alive:
+                    self._drain(shard)  # whatever it sent before dying
+                    self._crashed(shard)
+            self._restart_due()
+
+    def _drain(self, shard: _Shard):
+        conn = shard.conn
+        try:
+            while conn.poll():
+                self._deliver(shard, conn.recv())
+        except (EOFError, OSError):
+            pass  # the sentinel tells whether the process is gone
+
+    def _deliver(self, shard: _Shard, msg: tuple):
+        kind = msg[0]
+        if kind == "events":
+            # handlers run on the event thread, a slow one mustn't hold up replies and crash detection
+            self._events.put(msg[1])
+        elif kind == "reply":
+            _, request_id, ok, value = msg
+            with shard.requests_lock:
+                future = shard.requests.pop(request_id, None)
+            if future is not None:
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(RuntimeError(value))
+
+    def _event_loop(self):
+        while (batch := self._events.get()) is not None:
+            for event, username, args in batch:
+                for fn in self._handlers.get(event, ()):
+                    try:
+                        fn(username, *args)
+                    except Exception:
+                        self.log.error("[!] Handler of '%s' failed for %s", event, username, exc_info=True)
+
+    def _crashed(self, shard: _Shard):
+        with self._lock:
+            if not self._running:
+                return
+            exitcode = shard.process.exitcode
+            shard.conn.close()
+            shard.process = shard.conn = None
+            self._fail_requests(shard)
+            now = monotonic()
+            shard.crashes = [t for t in shard.crashes if now - t < self.restart_window] + [now]
+            if len(shard.crashes) >= self.max_restarts and any(not s.retired and s is not shard for s in self._shards):
+                shard.retired = True
+                orphans, shard.accounts = shard.accounts, set()
+                self.log.error("[!] Worker %d crashed %d times (exit %s), moving its %d accounts", shard.index, len(shard.crashes), exitcode, len(orphans))
+                for username in orphans:
+                    self._place(self._accounts[username], self._least_loaded())
+                return
+            delay = self.restart_backoff.delay(len(shard.crashes) - 1)
+            shard.restart_at = now + delay
+            self.log.error("[!] Worker %d crashed (exit %s), restarting in %.1fs", shard.index, exitcode, delay)
+
+    def _restart_due(self):
+        with self._lock:
+            now = monotonic()
+            for shard in self._shards:
+                if self._running and shard.restart_at is not None and shard.restart_at <= now and not shard.retired:
+                    shard.restarts += 1
+                    self._spawn(shard)
+
+
+def _results(futures: list[Future], timeout: float) -> list:
+    deadline = monotonic() + timeout
+    out = []
+    for future in futures:
+        try:
+            out.append(future.result(max(0.0, deadline - monotonic())))
+        except Exception:
+            pass  # a worker that died or didn't answer in time is left out
+    return out
+
+
+# ── Worker process ───────────────────────────────────────────────────────────
+def _worker_main(index: int, conn, client_cls: type[MikmakLoginClient], client_kwargs: dict):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C is the parent's to handle
+    asyncio.run(_Worker(conn, client_cls, client_kwargs).run())
+
+
+class _Worker:
+    """The child side: a Fleet driven by the parent's commands, forwarding subscribed events in batches."""
+
+    def __init__(self, conn, client_cls: type[MikmakLoginClient], client_kwargs: dict):
+        self.conn = conn
+        self.log = ClientLogger()
+        self.fleet = Fleet(client_cls=client_cls, **client_kwargs)
+        self.outbox: list[tuple] = []
+        self.runner: asyncio.Task | None = None
+        self.stopped: asyncio.Event | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        threading.Thread(target=self._read_loop, name="mikmak-shard-commands", daemon=True).start()
+        await self.stopped.wait()
+        self.fleet.stop()
+        if self.runner is not None:
+            await asyncio.gather(self.runner, return_exceptions=True)
+        self._flush()
+
+    def _read_loop(self):
+        while True:
+            try:
+                msg = self.conn.recv()
+            except (EOFError, OSError):
+                msg = ("stop",)  # the parent is gone
+            self.loop.call_soon_threadsafe(self._handle, msg)
+            if msg[0] == "stop":
+                return
+
+    def _handle(self, msg: tuple):
+        try:
+            self._command(msg)
+        except Exception:
+            self.log.error("[!] Command '%s' failed", msg[0], exc_info=True)
+
+    def _command(self, msg: tuple):
+        kind = msg[0]
+        if kind == "add":
+            self.fleet.add(msg[1])
+            if self.runner is None or self.runner.done():
+                self.runner = self.loop.create_task(self.fleet.run())
+        elif kind == "remove":
+            if msg[1] in self.fleet:
+                self.fleet.remove(msg[1])
+        elif kind == "subscribe":
+            self.fleet.on(msg[1])(self._forwarder(msg[1]))
+        elif kind == "call":
+            _, username, method, args, kwargs = msg
+            if username in self.fleet:
+                target = self.fleet[username]
+                for name in method.split("."):
+                    target = getattr(target, name)
+                target(*args, **kwargs)
+        elif kind == "request":
+            _, request_id, what, arg = msg
+            try:
+                value = self.fleet.metrics() if what == "metrics" else self.fleet.state(arg)
+                self._send(("reply", request_id, True, value))
+            except Exception as e:
+                self._send(("reply", request_id, False, repr(e)))
+        elif kind == "stop":
+            self.stopped.set()
+
+    def _forwarder(self, event: str) -> Callable:
+        def forward(client, *args):
+            if not self.outbox:
+                self.loop.call_soon(self._flush)  # one pipe write for everything emitted this loop iteration
+            self.outbox.append((event, client.username, args))
+
+        return forward
+
+    def _flush(self):
+        batch, self.outbox = self.outbox, []
+        if not batch:
+            return
+        try:
+            self._send(("events", batch))
+        except Exception:
+            # something in the batch doesn't pickle, send the rest one by one
+            for item in batch:
+                try:
+                    self._send(("events", [item]))
+                except Exception:
+                    self.log.error("[!] Can't forward '%s' of %s", item[0], item[1], exc_info=True)
+
+    def _send(self, msg: tuple):
+        try:
+            self.conn.send(msg)
+        except (OSError, ValueError):
+            self.stopped.set()  # the parent is gone
@@ -0,0 +1,572 @@
+"""
+mikmakpy.state
+──────────────
+Compact containers for the game state collected from server messages (rooms, inventory, achievements, players), and
+the GameState a client keeps them in.
+"""
+
+from array import array
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .constants import ROOM_IDS, ROOM_NAMES
+from .models import Achievement, InventoryItem, LoginResult, Player, Room, ServerInfo
+
+
+class RoomTable:
+    """
+    The room list (rmList) stored column-wise, one array per attribute instead of a record per room.
+    Rooms are indexed by id and by name, so lookups and the usual queries don't scan the list:
+
+        table.get(3)                # by id
+        table.get("beach")          # by name, falls back to constants.ROOM_IDS
+        table.top(5)                # busiest rooms
+        table.where(game=True)      # game rooms
+        table.set_usercount(3, 12)  # a uCount update, O(1)
+
+    Iterating yields the same Room records parse.room_list returns.
+    A clean table leaves out the rooms without users, but keeps them aside so set_usercount can bring them back
+    (and takes out rooms that empty). Rooms that come or go that way may change places in the iteration order.
+    """
+
+    # flag bits, the HAS_ bits remember which optional attributes the server sent
+    PRIVATE, TEMPORARY, GAME = 1, 2, 4
+    HAS_PRIVATE, HAS_TEMPORARY, HAS_GAME, HAS_MIN_LEVEL, HAS_MAX_SPECTATORS = 8, 16, 32, 64, 128
+
+    __slots__ = (
+        "ids",
+        "names",
+        "usercounts",
+        "maxusercounts",
+        "min_levels",
+        "max_spectators",
+        "flags",
+        "clean",
+        "population",
+        "_by_id",
+        "_by_name",
+        "_flag_rows",
+        "_order",
+        "_empty",
+    )
+
+    def __init__(self, clean: bool = False):
+        self.ids = array("i")
+        self.names: List[str] = []
+        self.usercounts = array("i")
+        self.maxusercounts = array("i")
+        self.min_levels = array("i")  # -1 when missing/invalid
+        self.max_spectators = array("i")  # -1 when missing/invalid
+        self.flags = array("B")
+        self.clean = clean
+        self.population = 0  # users in all the rooms of the table
+        self._by_id: Dict[int, int] = {}
+        self._by_name: Dict[str, int] = {}
+        # flag -> rows having it, dicts as ordered sets so a row can be taken out in O(1)
+        self._flag_rows: Dict[int, Dict[int, None]] = {self.PRIVATE: {}, self.TEMPORARY: {}, self.GAME: {}}
+        self._order: Optional[List[int]] = None  # rows sorted by usercount, built on demand
+        self._empty: Dict[int, tuple] = {}  # clean tables: room id -> append() arguments of the rooms left out
+
+    @classmethod
+    def from_columns(
+        cls,
+        ids: List[int],
+        names: List[str],
+        usercounts: List[int],
+        maxusercounts: List[int],
+        flags: List[int],
+        min_levels: List[int],
+        max_spectators: List[int],
+        clean: bool = False,
+    ) -> "RoomTable":
+        """Build a table from whole columns at once, cheaper than append() per room."""
+        table = cls(clean)
+        columns = (ids, names, usercounts, maxusercounts, flags, min_levels, max_spectators)
+        if clean and not all(u > 0 for u in usercounts):
+            keep = [i for i, u in enumerate(usercounts) if u > 0]
+            table._empty = {ids[i]: tuple(c[i] for c in columns) for i, u in enumerate(usercounts) if u <= 0}
+            ids, names, usercounts, maxusercounts, flags, min_levels, max_spectators = ([c[i] for i in keep] for c in columns)
+
+        n = len(ids)
+        table.ids = array("i", ids)
+        table.names = names
+        table.usercounts = array("i", usercounts)
+        table.maxusercounts = array("i", maxusercounts)
+        table.min_levels = array("i", min_levels)
+        table.max_spectators = array("i", max_spectators)
+        table.flags = array("B", flags)
+        table.population = sum(table.usercounts)
+        table._by_id = dict(zip(table.ids, range(n)))
+        table._by_name = dict(zip(names, range(n)))
+        for bit, rows in table._flag_rows.items():
+            rows.update(dict.fromkeys(r for r, f in enumerate(table.flags) if f & bit))
+        return table
+
+    def append(
+        self,
+        room_id: int,
+        name: str,
+        usercount: int,
+        maxusercount: int,
+        flags: int = 0,
+        min_level: int = -1,
+        max_spectators: int = -1,
+    ) -> Optional[int]:
+        """Add a room, returns its row (None when a clean table set it aside as empty)."""
+        if self.clean and usercount <= 0:
+            self._empty[room_id] = (room_id, name, usercount, maxusercount, flags, min_level, max_spectators)
+            return None
+        row = len(self.ids)
+        self.ids.append(room_id)
+        self.names.append(name)
+        self.usercounts.append(usercount)
+        self.maxusercounts.append(maxusercount)
+        self.min_levels.append(min_level)
+        self.max_spectators.append(max_spectators)
+        self.flags.append(flags)
+        self.population += usercount
+        self._by_id[room_id] = row
+        self._by_name[name] = row
+        for bit, rows in self._flag_rows.items():
+            if flags & bit:
+                rows[row] = None
+        self._order = None
+        return row
+
+    def set_usercount(self, room_id: int, usercount: int) -> Optional[int]:
+        """
+        Apply a uCount update in O(1), returns the previous count (None for a room the table doesn't know).
+        A clean table takes out a room that emptied, and puts back an empty room that got users.
+        """
+        row = self._by_id.get(room_id)
+        if row is None:
+            room = self._empty.get(room_id)
+            if room is None:
+                return None
+            if usercount > 0:
+                del self._empty[room_id]
+                self.append(room[0], room[1], usercount, *room[3:])
+            return room[2]
+
+        old = self.usercounts[row]
+        if usercount == old:
+            return old
+        if self.clean and usercount <= 0:
+            room = self._remove(row)
+            self._empty[room_id] = room[:2] + (usercount,) + room[3:]
+            return old
+        self.usercounts[row] = usercount
+        self.population += usercount - old
+        self._order = None
+        return old
+
+    def _remove(self, row: int) -> tuple:
+        """Take a row out by moving the last row into its place, returns its append() arguments."""
+        columns = (self.ids, self.names, self.usercounts, self.maxusercounts, self.flags, self.min_levels, self.max_spectators)
+        room = tuple(column[row] for column in columns)
+        room_id, name, usercount, _, flags = room[:5]
+        for bit, rows in self._flag_rows.items():
+            if flags & bit:
+                del rows[row]
+        if self._by_id.get(room_id) == row:
+            del self._by_id[room_id]
+        if self._by_name.get(name) == row:
+            del self._by_name[name]
+
+        last = len(self.ids) - 1
+        if row != last:
+            for column in columns:
+                column[row] = column[last]
+            moved = self.flags[row]
+            for bit, rows in self._flag_rows.items():
+                if moved & bit:
+                    del rows[last]
+                    rows[row] = None
+            if self._by_id.get(self.ids[row]) == last:
+                self._by_id[self.ids[row]] = row
+            if self._by_name.get(self.names[row]) == last:
+                self._by_name[self.names[row]] = row
+        for column in columns:
+            column.pop()
+        self.population -= usercount
+        self._order = None
+        return room
+
+    # ── Lookups ──────────────────────────────────────────────────────────────
+    def row_of(self, room: int | str) -> Optional[int]:
+        """Row of a room given its id or name. Names unknown to the server list are tried through constants.ROOM_IDS."""
+        if isinstance(room, str):
+            row = self._by_name.get(room)
+            if row is not None:
+                return row
+            room = ROOM_IDS.get(room, -1)
+        return self._by_id.get(room)
+
+    def get(self, room: int | str) -> Optional[Room]:
+        row = self.row_of(room)
+        return None if row is None else self.row(row)
+
+    def usercount(self, room: int | str) -> Optional[int]:
+        row = self.row_of(room)
+        return None if row is None else self.usercounts[row]
+
+    def row(self, row: int) -> Room:
+        """A room as a Room, same as parse.room_list."""
+        flags = self.flags[row]
+        return Room(
+            self.ids[row],
+            self.names[row],
+            self.usercounts[row],
+            self.maxusercounts[row],
+            bool(flags & self.PRIVATE) if flags & self.HAS_PRIVATE else None,
+            bool(flags & self.TEMPORARY) if flags & self.HAS_TEMPORARY else None,
+            bool(flags & self.GAME) if flags & self.HAS_GAME else None,
+            self.min_levels[row] if flags & self.HAS_MIN_LEVEL and self.min_levels[row] >= 0 else None,
+            self.max_spectators[row] if flags & self.HAS_MAX_SPECTATORS and self.max_spectators[row] >= 0 else None,
+        )
+
+    # ── Queries ──────────────────────────────────────────────────────────────
+    def top(self, n: int) -> List[Room]:
+        """The n rooms with the most users."""
+        if self._order is None:
+            self._order = sorted(range(len(self.ids)), key=self.usercounts.__getitem__, reverse=True)
+        return [self.row(r) for r in self._order[:n]]
+
+    def where(
+        self,
+        private: Optional[bool] = None,
+        temporary: Optional[bool] = None,
+        game: Optional[bool] = None,
+    ) -> List[Room]:
+        """Rooms matching the given flags, e.g. where(game=True). Starts from the precomputed rows of a flag that must be set."""
+        wanted = [(self.PRIVATE, private), (self.TEMPORARY, temporary), (self.GAME, game)]
+        required = [bit for bit, v in wanted if v]
+        rows = self._flag_rows[required[0]] if required else range(len(self.ids))
+
+        mask = value = 0
+        for bit, v in wanted:
+            if v is not None:
+                mask |= bit
+                value |= bit if v else 0
+        flags = self.flags
+        return [self.row(r) for r in rows if flags[r] & mask == value]
+
+    def unknown_rooms(self) -> List[Room]:
+        """Rooms the server listed that constants.ROOM_NAMES doesn't know yet."""
+        return [self.row(r) for r, room_id in enumerate(self.ids) if room_id not in ROOM_NAMES]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[Room]:
+        return (self.row(r) for r in range(len(self.ids)))
+
+    def __contains__(self, room: int | str) -> bool:
+        return self.row_of(room) is not None
+
+    def __repr__(self) -> str:
+        return f"RoomTable({len(self)} rooms)"
+
+
+class Inventory:
+    """
+    Owned items as item_id -> quantity, O(1) to check or count an item.
+    Changes return deltas as (item_id, quantity_change) pairs so they can be emitted as small events.
+
+    The client only ever gets full inv_list messages, no per-item add/remove message is known yet, so the
+    inventory_changed deltas it emits all come from sync() diffing the new list against the held one.
+    add()/remove()/apply() are for code that knows of a change first (a handler of its own, e.g. after buying).
+    """
+
+    __slots__ = ("_counts",)
+
+    def __init__(self, counts: Optional[Dict[int, int]] = None):
+        self._counts: Dict[int, int] = counts if counts is not None else {}
+
+    def quantity(self, item_id: int) -> int:
+        return self._counts.get(item_id, 0)
+
+    def add(self, item_id: int, quantity: int = 1) -> List[Tuple[int, int]]:
+        """Add (or with a negative quantity, remove) items. Returns the applied delta."""
+        old = self._counts.get(item_id, 0)
+        new = max(old + quantity, 0)
+        if new == old:
+            return []
+        if new:
+            self._counts[item_id] = new
+        else:
+            del self._counts[item_id]
+        return [(item_id, new - old)]
+
+    def remove(self, item_id: int, quantity: int = 1) -> List[Tuple[int, int]]:
+        return self.add(item_id, -quantity)
+
+    def apply(self, changes: Iterable[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """Apply several (item_id, quantity_change) pairs, returns the ones that changed something."""
+        out = []
+        for item_id, quantity in changes:
+            out.extend(self.add(item_id, quantity))
+        return out
+
+    def sync(self, other: "Inventory", report: bool = True) -> List[Tuple[int, int]]:
+        """Become a copy of other (a fresh full list), returns what changed (nothing, without working it out, unless report)."""
+        mine, theirs = self._counts, other._counts
+        if not report:
+            self._counts = dict(theirs)
+            return []
+        delta = [(i, q - mine.get(i, 0)) for i, q in theirs.items() if mine.get(i, 0) != q]
+        delta.extend((i, -q) for i, q in mine.items() if i not in theirs)
+        self._counts = dict(theirs)
+        return delta
+
+    def as_list(self) -> List[InventoryItem]:
+        """Same shape as parse.inv_list."""
+        return [InventoryItem(i, q) for i, q in self._counts.items()]
+
+    def items(self):
+        """(item_id, quantity) pairs."""
+        return self._counts.items()
+
+    def __contains__(self, item_id: int) -> bool:
+        return item_id in self._counts
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._counts)
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Inventory) and self._counts == other._counts
+
+    def __repr__(self) -> str:
+        return f"Inventory({len(self)} items)"
+
+
+class AchievementStore:
+    """
+    Achievements keyed by (achievement_id, step_id), in the order the server first sent them.
+    Updates replace entries in place, O(len(update)), and report only what actually changed as
+    (entry, progress_delta, points_delta) tuples. Entries are the Achievement records parse.achievement_res returns.
+
+        store.feed(parse.achievement_res(msg).value)
+    """
+
+    __slots__ = ("_entries",)
+
+    def __init__(self):
+        self._entries: Dict[Tuple[int, int], Achievement] = {}
+
+    def feed(self, parsed: Dict[str, Any], report: bool = True) -> List[Tuple[Achievement, int, int]]:
+        """Take a parse.achievement_res value, snapshot or update. Without report the changes aren't collected."""
+        entries = parsed.get("achievements") or []
+        if parsed.get("is_update"):
+            return self.update(entries, report)
+        return self.replace(entries, report)
+
+    def update(self, entries: Iterable[Achievement], report: bool = True) -> List[Tuple[Achievement, int, int]]:
+        """Merge entries, new ones are appended, known ones keep their place."""
+        store = self._entries
+        if not report:
+            for entry in entries:
+                store[(entry.achievement_id, entry.step_id)] = entry
+            return []
+        changed = []
+        for entry in entries:
+            key = (entry.achievement_id, entry.step_id)
+            current = store.get(key)
+            if current is None:
+                store[key] = entry
+                changed.append((entry, entry.progress, entry.points))
+                continue
+
+            d_progress = entry.progress - current.progress
+            d_points = entry.points - current.points
+            if d_progress or d_points:
+                store[key] = entry
+                changed.append((entry, d_progress, d_points))
+        return changed
+
+    def replace(self, entries: Iterable[Achievement], report: bool = True) -> List[Tuple[Achievement, int, int]]:
+        """
+        Take a full snapshot, changes are reported against the previous one. Entries missing from it are dropped
+        and reported with their progress and points negated, like an inventory item that's gone.
+        """
+        old = self._entries
+        self._entries = {}
+        # with an old snapshot the diff below does the reporting, don't collect every entry as new first
+        changed = self.update(entries, report and not old)
+        if not old or not report:
+            return changed
+
+        for key, entry in self._entries.items():
+            prev = old.get(key)
+            if prev is None:
+                changed.append((entry, entry.progress, entry.points))
+            elif entry.progress != prev.progress or entry.points != prev.points:
+                changed.append((entry, entry.progress - prev.progress, entry.points - prev.points))
+        current = self._entries
+        changed.extend((prev, -prev.progress, -prev.points) for key, prev in old.items() if key not in current)
+        return changed
+
+    def get(self, achievement_id: int, step_id: int) -> Optional[Achievement]:
+        return self._entries.get((achievement_id, step_id))
+
+    def progress(self, achievement_id: int, step_id: int) -> int:
+        entry = self._entries.get((achievement_id, step_id))
+        return entry.progress if entry else 0
+
+    def as_list(self) -> List[Achievement]:
+        return list(self._entries.values())
+
+    def __contains__(self, key: Tuple[int, int]) -> bool:
+        return key in self._entries
+
+    def __iter__(self) -> Iterator[Achievement]:
+        return iter(self._entries.values())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __repr__(self) -> str:
+        return f"AchievementStore({len(self)} entries)"
+
+
+class PlayerTable:
+    """
+    The avatars the client can see, indexed by user id, by name and by room, every update O(1).
+    Holds at most max_players, further arrivals are counted in stats()["dropped"] instead of stored,
+    so a crowded room can't grow the table without bound.
+
+        players.get(1001)          # by id
+        players.get("bot")         # by name
+        players.in_room(3)         # everyone in room 3, in the order they came in
+    """
+
+    __slots__ = ("max_players", "_by_id", "_by_name", "_by_room", "_high_water", "_dropped")
+
+    def __init__(self, max_players: int = 1000):
+        self.max_players = max_players
+        self._by_id: Dict[int, Player] = {}
+        self._by_name: Dict[str, int] = {}
+        self._by_room: Dict[int, Dict[int, None]] = {}  # room -> user ids, dicts as ordered sets
+        self._high_water = 0
+        self._dropped = 0
+
+    def add(self, player: Player) -> bool:
+        """Add or update a player, False when the table is full and it was left out."""
+        old = self._by_id.get(player.id)
+        if old is not None:
+            self._unlink(old)
+        elif len(self._by_id) >= self.max_players:
+            self._dropped += 1
+            return False
+        self._by_id[player.id] = player
+        self._by_name[player.name] = player.id
+        self._by_room.setdefault(player.room, {})[player.id] = None
+        if len(self._by_id) > self._high_water:
+            self._high_water = len(self._by_id)
+        return True
+
+    def remove(self, user_id: int) -> Optional[Player]:
+        """Take a player out, returns it (None if it wasn't in the table)."""
+        player = self._by_id.pop(user_id, None)
+        if player is not None:
+            self._unlink(player)
+        return player
+
+    def set_room(self, room: int, players: Iterable[Player]) -> int:
+        """Replace everyone in room with players (a joinOK's user list), returns how many were stored."""
+        self.clear(room)
+        return sum(map(self.add, players))
+
+    def clear(self, room: Optional[int] = None):
+        """Forget everyone, or everyone in one room."""
+        if room is None:
+            self._by_id.clear()
+            self._by_name.clear()
+            self._by_room.clear()
+            return
+        for user_id in list(self._by_room.get(room, ())):
+            self.remove(user_id)
+
+    def _unlink(self, player: Player):
+        if self._by_name.get(player.name) == player.id:
+            del self._by_name[player.name]
+        ids = self._by_room.get(player.room)
+        if ids is not None:
+            ids.pop(player.id, None)
+            if not ids:
+                del self._by_room[player.room]
+
+    # ── Lookups ──────────────────────────────────────────────────────────────
+    def get(self, player: int | str) -> Optional[Player]:
+        """A player by user id or by name."""
+        if isinstance(player, str):
+            user_id = self._by_name.get(player)
+            return None if user_id is None else self._by_id[user_id]
+        return self._by_id.get(player)
+
+    def in_room(self, room: int) -> List[Player]:
+        by_id = self._by_id
+        return [by_id[user_id] for user_id in self._by_room.get(room, ())]
+
+    def count(self, room: int) -> int:
+        return len(self._by_room.get(room, ()))
+
+    def rooms(self) -> List[int]:
+        return list(self._by_room)
+
+    def stats(self) -> Dict[str, int]:
+        return {"players": len(self._by_id), "rooms": len(self._by_room), "high_water": self._high_water, "dropped": self._dropped}
+
+    def __contains__(self, player: int | str) -> bool:
+        return (self._by_name if isinstance(player, str) else self._by_id).__contains__(player)
+
+    def __iter__(self) -> Iterator[Player]:
+        return iter(self._by_id.values())
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __repr__(self) -> str:
+        return f"PlayerTable({len(self)} players in {len(self._by_room)} rooms)"
+
+
+@dataclass(slots=True)
+class GameState:
+    """
+    What a client collected about its session, filled in as the login goes on (None until then).
+    Still readable and writable like the dict it used to be, state["rank"] is state.rank.
+    """
+
+    username: Optional[str] = None
+    user_id: Optional[int] = None
+    rank: Optional[int] = None
+    xp: Optional[int] = None
+    safe_chat: Optional[bool] = None
+    server_list: Optional[List[ServerInfo]] = None
+    room_list: Optional[RoomTable] = None
+    login_res: Optional[LoginResult] = None
+    achievements: Optional[AchievementStore] = None
+    inventory: Optional[Inventory] = None
+    players: Optional[PlayerTable] = None
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any):
+        try:
+            setattr(self, key, value)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Field name -> value, the containers as they are."""
+        return {f.name: getattr(self, f.name) for f in fields(self)}
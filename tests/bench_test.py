@@ -0,0 +1,19 @@
+from mikmakpy import bench, fixtures
+from mikmakpy.protocol import FrameDecoder, parse
+
+
+def test_corpora_parse():
+    assert len(parse.room_table(fixtures.room_list_msg(50), clean=False).value) == 50
+    assert len(parse.achievement_res(fixtures.achievement_msg(100)).value["achievements"]) == 100
+    assert len(parse.inventory(fixtures.inventory_msg(70)).value) == 70
+    assert len(parse.server_list(fixtures.server_list_msg(5)).value["servers"]) == 5
+
+    messages = bench.session_messages()
+    decoder = FrameDecoder()
+    assert [m for chunk in bench.stream(messages, 64) for m in decoder.feed(chunk).value] == messages
+
+
+def test_compare_baseline():
+    result = bench.BenchResult(ns_per_op=130.0, ops_per_sec=1e9 / 130, ns_per_msg=130.0, peak_alloc_bytes=0)
+    baseline = {"results": {"a": {"ns_per_op": 100.0}, "b": {"ns_per_op": 120.0}}}
+    assert len(bench.compare_baseline({"a": result, "b": result, "new": result}, baseline, tolerance=0.15)) == 1
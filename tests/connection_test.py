@@ -0,0 +1,96 @@
+from socket import create_server, IPPROTO_TCP, TCP_NODELAY
+import threading
+from time import monotonic
+
+from mikmakpy.connection import Connection, SendLimits, SendQueue, SocketOptions
+
+
+def test_send_queue_coalesces():
+    queue = SendQueue(SendLimits(max_queue=3))
+    assert queue.put(b"a\x00")
+    assert queue.put(b"b\x00")
+    assert queue.put(b"c\x00")
+    assert not queue.put(b"d\x00"), "Queue should refuse frames once full"
+
+    data, wait = queue.take_ready(0.0)
+    assert data == b"a\x00b\x00c\x00"
+    assert wait is None
+    assert queue.stats()["frames_sent"] == 3
+    assert queue.stats()["batches_sent"] == 1
+    assert queue.stats()["dropped"] == 1
+
+
+def test_send_queue_rate_limits():
+    queue = SendQueue(SendLimits(commands={("pubMsg", "emote"): (1.0, 1.0)}))
+    for cmd in ("pubMsg", "x", "emote", "x"):
+        queue.put(cmd.encode() + b"\x00", cmd)
+
+    # the first pubMsg uses the shared bucket, so emote and everything behind it waits
+    data, wait = queue.take_ready(monotonic())
+    assert data == b"pubMsg\x00x\x00"
+    assert 0 < wait <= 1.0
+    assert queue.depth == 2
+
+
+def test_connection_send_through_writer():
+    server = create_server(("127.0.0.1", 0))
+    received = bytearray()
+
+    def serve():
+        client, _ = server.accept()
+        with client:
+            while chunk := client.recv(4096):
+                received.extend(chunk)
+
+    t = threading.Thread(target=serve, daemon=True)
+    t.start()
+
+    conn = Connection(on_message=lambda msg: None, on_disconnect=lambda: None)
+    conn.connect(*server.getsockname())
+    for i in range(100):
+        assert conn.send(f"msg{i}")
+    conn.close()
+    t.join(5)
+    server.close()
+
+    assert bytes(received) == b"".join(f"msg{i}\x00".encode() for i in range(100))
+
+
+def test_dropped_frames_counted_from_any_thread():
+    conn = Connection(on_message=lambda msg: None, send_limits=SendLimits(max_queue=10))
+    conn._sock = object()  # "connected", without a writer draining the queue
+
+    def spam():
+        for _ in range(2000):
+            conn.send_bytes(b"x\x00")
+
+    threads = [threading.Thread(target=spam) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert conn.metrics.frames_dropped == conn.send_queue.stats()["dropped"] == 8 * 2000 - 10
+
+
+def test_connection_receives_frames():
+    server = create_server(("127.0.0.1", 0))
+    frames = [f"msg{i}" * (i % 50) for i in range(300)] + ["קיווי"]
+    data = b"".join(f.encode() + b"\x00" for f in frames)
+
+    def serve():
+        client, _ = server.accept()
+        with client:
+            for i in range(0, len(data), 1000):
+                client.sendall(data[i : i + 1000])
+
+    threading.Thread(target=serve, daemon=True).start()
+    received = []
+    conn = Connection(on_message=received.append, socket_options=SocketOptions(read_size=512, max_read_size=4096))
+    conn.connect(*server.getsockname())
+    assert conn._sock.getsockopt(IPPROTO_TCP, TCP_NODELAY)
+    conn.listen()  # returns when the server closes
+    server.close()
+
+    assert received == frames
+    assert conn.metrics.frames_in == len(frames)
+    assert conn.metrics.bytes_in == len(data)
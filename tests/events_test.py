@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import threading
+import time
+
+import pytest
+
+from mikmakpy.constants import Overflow
+from mikmakpy.events import AsyncDispatcher, Dispatcher, EventBus, ThreadDispatcher
+from mikmakpy.log import ClientLogger, LogSink
+
+
+def test_emit_priority_and_off():
+    bus = EventBus()
+    calls = []
+
+    def low(x):
+        calls.append(("low", x))
+
+    bus.on("a")(low)
+    bus.on("a", priority=5)(lambda x: calls.append(("high", x)))
+    bus.on("b")(lambda x: calls.append(("b", x)))
+
+    bus.emit("a", 1)
+    assert calls == [("high", 1), ("low", 1)]
+
+    bus.off("a", low)
+    calls.clear()
+    bus.emit("a", 2)
+    assert calls == [("high", 2)]
+
+    bus.off("a")
+    assert not bus.has_listeners("a")
+    assert bus.has_listeners("b")
+    assert not bus.has_listeners("nothing")
+
+
+def test_wildcard_and_once():
+    bus = EventBus()
+    calls = []
+    bus.on("xt:*")(lambda event, msg: calls.append((event, msg)))
+    bus.once("xt:login_res")(lambda msg: calls.append(("once", msg)))
+
+    bus.emit("xt:login_res", "m1")
+    bus.emit("xt:login_res", "m2")
+    bus.emit("sys:rmList", "ignored")
+    assert calls == [("xt:login_res", "m1"), ("once", "m1"), ("xt:login_res", "m2")]
+    assert bus.has_listeners("xt:anything")
+    assert not bus.has_listeners("sys:rmList")
+
+
+def test_subscribe_during_emit():
+    bus = EventBus()
+    calls = []
+
+    @bus.on("a")
+    def first():
+        calls.append("first")
+        bus.on("a")(lambda: calls.append("late"))
+
+    bus.emit("a")
+    assert calls == ["first"]  # handlers added while emitting run from the next emit on
+    bus.emit("a")
+    assert calls == ["first", "first", "late"]
+
+
+def test_thread_dispatcher_orders_per_key():
+    dispatcher = ThreadDispatcher(workers=2)
+    bus = EventBus(dispatcher)
+    release = threading.Event()
+    calls = []
+
+    @bus.on("slow")
+    def slow(i):
+        release.wait(5)
+        calls.append(("slow", i))
+
+    bus.on("fast")(lambda i: calls.append(("fast", i)))
+
+    bus.emit("slow", 1)
+    bus.emit("slow", 2)
+    for i in range(3):
+        bus.emit("fast", i)
+    bus.emit("nothing", 0)  # no handlers, never queued
+
+    deadline = time.monotonic() + 5
+    while len(calls) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert calls == [("fast", 0), ("fast", 1), ("fast", 2)]  # not held up by the slow handler
+
+    release.set()
+    assert dispatcher.join(5)
+    assert calls[3:] == [("slow", 1), ("slow", 2)]
+    assert dispatcher.stats()["dispatched"] == 5
+    dispatcher.close()
+
+
+def test_overflow_policies():
+    for overflow, expected, stats in [
+        (Overflow.DROP_OLDEST, [("a", 2), ("b", 1), ("a", 3)], {"dropped": 1, "coalesced": 0}),
+        (Overflow.COALESCE, [("a", 1), ("b", 1), ("a", 3)], {"dropped": 0, "coalesced": 1}),
+    ]:
+        dispatcher = AsyncDispatcher(max_pending=3, overflow=overflow)
+        bus = EventBus(dispatcher)
+        calls = []
+        bus.on("a")(lambda i: calls.append(("a", i)))
+        bus.on("b")(lambda i: calls.append(("b", i)))
+
+        async def main():
+            # nothing runs until the first await, so the queue fills up
+            for event, i in [("a", 1), ("a", 2), ("b", 1), ("a", 3)]:
+                bus.emit(event, i)
+            await dispatcher.join()
+
+        asyncio.run(main())
+        assert sorted(calls) == sorted(expected)
+        assert [c for c in calls if c[0] == "a"] == [c for c in expected if c[0] == "a"]
+        assert {k: dispatcher.stats()[k] for k in stats} == stats
+
+    with pytest.raises(ValueError):
+        AsyncDispatcher(overflow="block")
+
+
+def test_async_dispatcher_awaits_coroutines():
+    logger = logging.getLogger("mikmakpy.test.events")
+    logger.propagate = False
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.handlers = [handler]
+    sink = LogSink(logger)
+    dispatcher = AsyncDispatcher(log=ClientLogger(sink=sink))
+    bus = EventBus(dispatcher)
+    calls = []
+
+    @bus.on("a")
+    async def handler(i):
+        await asyncio.sleep(0.01)
+        calls.append(i)
+
+    @bus.on("b")
+    def broken():
+        raise RuntimeError("boom")
+
+    async def main():
+        bus.emit("a", 1)
+        bus.emit("b")
+        bus.emit("a", 2)
+        await dispatcher.join()
+
+    asyncio.run(main())
+    assert calls == [1, 2]
+    assert dispatcher.stats()["errors"] == 1
+    sink.flush()
+    [record] = records  # the failure was logged, with its traceback
+    assert record.exc_info[0] is RuntimeError
+
+
+def test_async_dispatcher_restarts_a_finished_worker():
+    # the first worker has returned but its task isn't discarded yet when the second emit comes
+    dispatcher = AsyncDispatcher(concurrency=1)
+    bus = EventBus(dispatcher)
+    calls = []
+    bus.on("a")(calls.append)
+
+    async def main():
+        bus.emit("a", 1)
+        await asyncio.sleep(0)
+        bus.emit("a", 2)
+        await asyncio.wait_for(dispatcher.join(), 1)
+
+    asyncio.run(main())
+    assert calls == [1, 2]
+
+
+def test_dispatcher_arguments_and_reentrant_block():
+    with pytest.raises(TypeError):
+        Dispatcher()
+    with pytest.raises(ValueError):
+        AsyncDispatcher(max_pending=0)
+
+    # a handler filling the queue from a worker runs the overflow inline instead of waiting for itself
+    dispatcher = ThreadDispatcher(workers=1, max_pending=1)
+    bus = EventBus(dispatcher)
+    calls = []
+
+    @bus.on("outer")
+    def outer():
+        bus.emit("inner", 1)
+        bus.emit("inner", 2)
+
+    bus.on("inner")(calls.append)
+    bus.emit("outer")
+    assert dispatcher.join(5)
+    assert sorted(calls) == [1, 2]
+    dispatcher.close()
@@ -0,0 +1,74 @@
+import logging
+
+from mikmakpy.constants import LoggerLevel
+from mikmakpy.log import ClientLogger, FrameText, LogSink
+
+
+class _Collect(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def _sink():
+    logger = logging.getLogger("mikmakpy.test")
+    logger.propagate = False
+    handler = _Collect()
+    logger.handlers = [handler]
+    return LogSink(logger, capacity=3), handler
+
+
+def test_client_logger_levels():
+    sink, handler = _sink()
+    log = ClientLogger({LoggerLevel.PARSING_ERROR}, sink=sink, username="bot")
+    log.incoming("[←] %s", "ignored")
+    log.parsing_error("[!] bad: %s", "list", cmd="inv_list")
+    assert sink.pending == 1  # disabled levels never reach the buffer
+
+    sink.flush()
+    [record] = handler.records
+    assert record.getMessage() == "[!] bad: list"
+    assert record.levelno == logging.WARNING
+    assert record.mikmak_level is LoggerLevel.PARSING_ERROR
+    assert (record.username, record.cmd) == ("bot", "inv_list")
+
+    log.set_levels({LoggerLevel.INCOMING})
+    log.parsing_error("off now")
+    log.incoming("[←] %s", "on now")
+    sink.flush()
+    assert handler.records[-1].getMessage() == "[←] on now"
+
+
+def test_log_sink_is_bounded_and_lazy():
+    sink, handler = _sink()
+    log = ClientLogger(sink=sink)
+
+    class Expensive:
+        formatted = 0
+
+        def __str__(self):
+            Expensive.formatted += 1
+            return "x"
+
+    for _ in range(5):
+        log.error("%s", Expensive())
+    assert Expensive.formatted == 0
+    assert sink.pending == 3 and sink.dropped == 2
+
+    sink.flush()
+    assert [r.getMessage() for r in handler.records] == ["x"] * 3
+    assert str(FrameText(b"<msg/>\x00")) == "<msg/>"
+
+
+def test_error_keeps_exception():
+    sink, handler = _sink()
+    log = ClientLogger(sink=sink)
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        log.error("[ERROR] handler crashed", exc_info=True)
+    sink.flush()
+    assert handler.records[0].exc_info[0] is ValueError
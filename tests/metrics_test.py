@@ -0,0 +1,48 @@
+import urllib.request
+
+from mikmakpy.metrics import Histogram, Metrics, PrometheusExporter, merge, to_prometheus
+
+
+def test_histogram():
+    h = Histogram((0.1, 1.0))
+    for v in (0.05, 0.1, 0.5, 3.0):
+        h.observe(v)
+    assert h.counts == [2, 1, 1]
+    assert h.count == 4 and abs(h.sum - 3.65) < 1e-9
+
+
+def test_merge_and_prometheus():
+    a, b = Metrics(), Metrics()
+    a.bytes_in, b.bytes_in = 10, 5
+    a.commands[("xt", "login_res")] += 1
+    b.commands[("xt", "login_res")] += 2
+    b.parse_failures["rmList"] += 1
+    a.phases["login_total"].observe(0.2)
+    b.phases["login_total"].observe(2.0)
+
+    snap = merge([a.snapshot(), b.snapshot()])
+    assert snap["bytes_in"] == 15
+    assert snap["commands"] == {"xt:login_res": 3}
+    assert snap["histograms"]["login_total"]["count"] == 2
+
+    text = to_prometheus({**snap, "gauges": {"clients": 2}})
+    assert "mikmak_bytes_received_total 15" in text
+    assert 'mikmak_command_frames_total{kind="xt",cmd="login_res"} 3' in text
+    assert 'mikmak_parse_failures_total{cmd="rmList"} 1' in text
+    assert 'mikmak_login_total_seconds_bucket{le="0.5"} 1' in text
+    assert 'mikmak_login_total_seconds_bucket{le="+Inf"} 2' in text
+    assert "# TYPE mikmak_clients gauge" in text and "mikmak_clients 2" in text
+
+
+def test_prometheus_exporter(tmp_path):
+    m = Metrics()
+    m.frames_in = 7
+    path = str(tmp_path / "mikmak.prom")
+    exporter = PrometheusExporter(m.snapshot, path=path, port=0, interval=60).start()
+    try:
+        body = urllib.request.urlopen(f"http://127.0.0.1:{exporter.port}/metrics", timeout=5).read().decode()
+        assert "mikmak_frames_received_total 7" in body
+        exporter.write()
+        assert "mikmak_frames_received_total 7" in open(path, encoding="utf-8").read()
+    finally:
+        exporter.stop()
@@ -0,0 +1,159 @@
+import asyncio
+
+from mikmakpy.ingame import MikmakIngameClient
+from mikmakpy.mockserver import MockConfig, MockServer
+from mikmakpy.servers import ServerProber, ServerSelector
+
+
+def test_login_to_end_against_mock():
+    async def main():
+        async with MockServer(MockConfig(rooms=20, achievements=10, inventory=30)) as mock:
+            client = MikmakIngameClient("bot", "pw", starting_ip=mock.host, port=mock.port)
+
+            @client.on("message")
+            def on_message(msg):
+                if "action='joinOK'" in msg:
+                    client.disconnect()
+
+            await asyncio.wait_for(client.run(), 5)
+            return client, mock.stats
+
+    client, stats = asyncio.run(main())
+    assert stats["logins"] == stats["game_logins"] == stats["joins"] == 1
+    assert len(client.ingame_state["room_list"]) == 20
+    assert len(client.ingame_state["achievements"]) == 10
+    assert len(client.ingame_state["inventory"]) == 30
+
+    snap = client.metrics_snapshot()
+    assert snap["commands"]["sys:joinOK"] == 1
+    assert snap["histograms"]["login_total"]["count"] == 1
+    assert snap["frames_out"] == 5  # verChk + login, twice, and avt_joinRoom
+
+
+def test_reconnects_after_injected_disconnect():
+    async def main():
+        # every connection drops on its 3rd frame, on the game server that is avt_joinRoom
+        async with MockServer(MockConfig(disconnect_after=2)) as mock:
+            client = MikmakIngameClient("bot", "pw", starting_ip=mock.host, port=mock.port, reconnection_delay=0.01, max_retries=2)
+            await asyncio.wait_for(client.run(), 5)
+            return client, mock.stats
+
+    client, stats = asyncio.run(main())
+    assert stats["disconnects_injected"] >= 1
+    assert client.reconnect_stats.disconnects >= 1
+
+
+def test_room_counts_update_the_live_room_table():
+    async def main():
+        async with MockServer(MockConfig(rooms=20, room_capacity=1)) as mock:
+            first = MikmakIngameClient("first", "pw", starting_ip=mock.host, port=mock.port)
+            second = MikmakIngameClient("second", "pw", starting_ip=mock.host, port=mock.port)
+            changes = []
+
+            @first.on("room_count_changed")
+            def on_count(room_id, usercount, delta):
+                changes.append((room_id, usercount, delta))
+                if usercount == 0:
+                    first.disconnect()
+
+            @first.on("sys:joinOK")
+            def on_first_joined(msg):
+                asyncio.get_running_loop().create_task(second.run())
+
+            @second.on("sys:joinOK")
+            def on_second_joined(msg):
+                second.disconnect()
+
+            await asyncio.wait_for(first.run(), 5)
+            return first, changes
+
+    client, changes = asyncio.run(main())
+    # the mock's rmList says room 2 has 26 users, then the second client alone in it and gone again
+    assert changes == [(2, 1, -25), (2, 0, -1)]
+    table = client.ingame_state.room_list
+    assert 2 not in table and len(table) == 19
+
+
+def test_players_in_the_room_are_tracked():
+    async def main():
+        async with MockServer(MockConfig(rooms=5)) as mock:
+            first = MikmakIngameClient("first", "pw", starting_ip=mock.host, port=mock.port)
+            second = MikmakIngameClient("second", "pw", starting_ip=mock.host, port=mock.port)
+            events = []
+
+            @first.on("room_players")
+            def on_room_players(room, players):
+                events.append(("room", room, [p.name for p in players]))
+                asyncio.get_running_loop().create_task(second.run())
+
+            @first.on("player_joined")
+            def on_joined(player):
+                events.append(("joined", player.name, len(first.ingame_state.players.in_room(player.room))))
+
+            @first.on("player_left")
+            def on_left(player):
+                events.append(("left", player.name, len(first.ingame_state.players)))
+                first.disconnect()
+
+            @second.on("room_players")
+            def on_second_joined(room, players):
+                events.append(("second sees", [p.name for p in players]))
+                second.disconnect()
+
+            await asyncio.wait_for(first.run(), 5)
+            return first, events
+
+    client, events = asyncio.run(main())
+    assert events[0] == ("room", 1, ["first"])
+    assert sorted(events[1:3]) == [("joined", "second", 2), ("second sees", ["first", "second"])]
+    assert events[3:] == [("left", "second", 1)]
+    assert client.ingame_state.players.get("first").vars == {"rank": 1}
+
+
+def test_selected_server_is_released_on_disconnect():
+    async def main():
+        async with MockServer(MockConfig(rooms=5)) as mock:
+            selector = ServerSelector(ServerProber(ttl=60))
+            client = MikmakIngameClient("bot", "pw", starting_ip=mock.host, port=mock.port, server_selector=selector)
+            held = []
+
+            @client.on("sys:joinOK")
+            def on_joined(msg):
+                held.append(selector.assigned(client._target_server))
+                client.disconnect()
+
+            await asyncio.wait_for(client.run(), 5)
+            return selector, client, held
+
+    selector, client, held = asyncio.run(main())
+    assert held == [1]
+    assert selector.assigned(client._target_server) == 0
+
+
+def test_disconnect_wakes_the_reconnect_wait():
+    async def main():
+        async with MockServer(MockConfig(disconnect_after=2)) as mock:
+            client = MikmakIngameClient("bot", "pw", starting_ip=mock.host, port=mock.port, reconnection_delay=30)
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.3, client.disconnect)
+            started = loop.time()
+            await asyncio.wait_for(client.run(), 5)
+            return client, loop.time() - started
+
+    client, took = asyncio.run(main())
+    assert client.reconnect_stats.attempts == 1
+    assert took < 2
+
+
+def test_inventory_snapshot_again_after_reconnect():
+    async def main():
+        # dropped on avt_joinRoom, after the game server sent the inventory
+        async with MockServer(MockConfig(disconnect_after=2, inventory=10)) as mock:
+            client = MikmakIngameClient("bot", "pw", starting_ip=mock.host, port=mock.port, reconnection_delay=0.01, max_retries=1)
+            events = []
+            client.on("inventory")(lambda inv: events.append(("inventory", len(inv))))
+            client.on("inventory_changed")(lambda delta: events.append(("changed", delta)))
+            await asyncio.wait_for(client.run(), 5)
+            return events
+
+    assert asyncio.run(main()) == [("inventory", 10), ("inventory", 10)]
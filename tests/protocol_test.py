@@ -1,5 +1,7 @@
-from mikmakpy.protocol import parse
-from mikmakpy.constants import Server
+from mikmakpy.protocol import parse, decode, encode, FrameDecoder, PacketTemplate, SLOT
+from mikmakpy.constants import Server, MessageKind, EmoteFace
+from mikmakpy.models import Player, Room, ServerInfo
+from mikmakpy.state import AchievementStore, GameState, PlayerTable
 
 def test_parse_server_list():
     msg = r"""{"b":{"r":-1,"o":{"safeChat":false,"_cmd":"server_list","rank":1,"userName":"בוט11011","list":"[{\"id\":4,\"name\":'קיווי',\"ip\":'213.8.147.198',\"port\":443,\"capicity\":0.2,\"dt\":202602231555},{\"id\":7,\"name\":'קרמבו ',\"ip\":'213.8.147.201',\"port\":443,\"capicity\":0.0,\"safe\":true,\"dt\":202602231555},{\"id\":10,\"name\":'מנהלים',\"ip\":'213.8.147.214',\"port\":443,\"capicity\":-1.0,\"dt\":202602231555}]"}},"t":"xt"}"""
@@ -14,17 +16,22 @@ def test_parse_server_list():
 
     servers = payload["servers"]
     assert len(servers) == 3, f"Expected 3 servers, got {len(servers)}"
-    assert all(s["name"] in {e.value for e in Server} for s in servers), "Server names do not match expected enum values"
+    assert all(s.name in {e.value for e in Server} for s in servers), "Server names do not match expected enum values"
+    assert servers[0] == ServerInfo(id=4, name="קיווי", ip="213.8.147.198", port=443, capacity=0.2, dt=202602231555)
+    assert servers[1].safe is True and servers[2].capacity == -1.0
+    assert servers[1].as_dict()["capicity"] == 0.0
 
 def test_parse_room_list():
     msg = r"""<msg t='sys'><body action='rmList' r='0'><rmList><rm id='1' priv='0' temp='0' game='0' ucnt='1' lmb='1' maxu='10000' maxs='0'><n><![CDATA[game_lobby]]></n></rm><rm id='2' priv='0' temp='0' game='0' ucnt='0' lmb='1' maxu='100000' maxs='0'><n><![CDATA[lobby]]></n></rm><rm id='3' priv='0' temp='0' game='0' ucnt='0' maxu='50' maxs='0'><n><![CDATA[beach]]></n></rm></rmList></body></msg>"""
     res = parse.room_list(msg, clean=False)
     assert res.ok, f"Error parsing room list: {res.error}"
     assert isinstance(res.value, list)
-    assert res.value[0]["id"] == 1
-    assert res.value[0]["name"] == "game_lobby"
-    assert res.value[0]["usercount"] == 1
-    assert res.value[0]["maxusercount"] == 10000
+    assert res.value[0].id == 1
+    assert res.value[0].name == "game_lobby"
+    assert res.value[0].usercount == 1
+    assert res.value[0].maxusercount == 10000
+    assert res.value[2].min_level is None
+    assert "min_level" not in res.value[2].as_dict()
     
 def test_parse_inv_list():
     msg = r"""{"b":{"r":-1,"o":{"_cmd":"inv_list","list":"3501,1895,45020,4382,7426,7210,8178,3461-2,5524-2,14028-2,8184,2514,205"}},"t":"xt"}"""
@@ -32,7 +39,7 @@ def test_parse_inv_list():
     res = parse.inv_list(msg)
     assert res.ok, f"Error parsing inventory list: {res.error}"
 
-    assert res.value == [
+    assert [item.as_dict() for item in res.value] == [
         {"item_id": 3501, "quantity": 1},
         {"item_id": 1895, "quantity": 1},
         {"item_id": 45020, "quantity": 1},
@@ -55,12 +62,13 @@ def test_parse_login_res():
     assert res.ok, f"Error parsing login response: {res.error}"
 
     payload = res.value
-    assert payload["date"] == "20260225"
-    assert payload["c"] == 393150
-    assert payload["time"] == "225903"
-    assert payload["k"] == 200311
-    assert payload["resoulationCtg"] == 33
-    assert payload["resoulationVal"] == "beach"
+    assert payload.date == "20260225"
+    assert payload.c == 393150
+    assert payload.time == "225903"
+    assert payload.k == 200311
+    assert payload.resolution_ctg == 33
+    assert payload.resolution_val == "beach"
+    assert payload.as_dict()["resoulationVal"] == "beach"
 
 def test_parse_achievement_res():
     msgA = r"""{"b":{"r":-1,"o":{"level":1,"_cmd":"achivment_res","list":"[{'ach':1,'ass':1,'p':0,'prg':100},{'ach':1,'ass':2,'p':0,'prg':100},{'ach':1,'ass':3,'p':0,'prg':100},{'ach':1,'ass':5,'p':0,'prg':100},{'ach':1,'ass':8,'p':0,'prg':100},{'ach':1,'ass':9,'p':0,'prg':100},{'ach':1,'ass':16,'p':0,'prg':100},{'ach':1,'ass':17,'p':0,'prg':100},{'ach':2,'ass':1,'p':0,'prg':1},{'ach':6,'ass':1,'p':0,'prg':2},{'ach':10,'ass':1,'p':0,'prg':13},{'ach':15,'ass':1,'p':0,'prg':9},{'ach':16,'ass':1,'p':10,'prg':100},{'ach':26,'ass':1,'p':0,'prg':16},{'ach':30,'ass':1,'p':10,'prg':100},{'ach':32,'ass':1,'p':10,'prg':100},{'ach':33,'ass':1,'p':10,'prg':100},{'ach':38,'ass':1,'p':0,'prg':16},{'ach':97,'ass':1,'p':0,'prg':16},{'ach':106,'ass':1,'p':0,'prg':16},{'ach':213,'ass':1,'p':0,'prg':16},{'ach':235,'ass':1,'p':0,'prg':1},{'ach':236,'ass':1,'p':0,'prg':1},{'ach':237,'ass':1,'p':0,'prg':1},{'ach':299,'ass':1,'p':0,'prg':16},{'ach':313,'ass':1,'p':20,'prg':100},{'ach':314,'ass':1,'p':50,'prg':100},{'ach':361,'ass':1,'p':0,'prg':393150},{'ach':374,'ass':1,'p':0,'prg':16},{'ach':379,'ass':1,'p':0,'prg':100},{'ach':379,'ass':4,'p':0,'prg':100},{'ach':406,'ass':1,'p':10,'prg':100},{'ach':496,'ass':1,'p':0,'prg':16},{'ach':497,'ass':1,'p':0,'prg':16},{'ach':498,'ass':1,'p':0,'prg':393150},{'ach':501,'ass':1,'p':0,'prg':100},{'ach':505,'ass':1,'p':20,'prg':100},{'ach':3054,'ass':1,'p':20,'prg':100},{'ach':3312,'ass':1,'p':0,'prg':1}]","userId":16340305,"points":160}},"t":"xt"}"""
@@ -78,19 +86,284 @@ def test_parse_achievement_res():
     assert len(dataA["achievements"]) > 0
 
     # Spot-check a few entries
-    by_keyA = {a["key"]: a for a in dataA["achievements"]}
-    assert by_keyA["1:1"]["progress"] == 100
-    assert by_keyA["16:1"]["points"] == 10
-    assert by_keyA["361:1"]["progress"] == 393150
+    by_keyA = {(a.achievement_id, a.step_id): a for a in dataA["achievements"]}
+    assert by_keyA[1, 1].progress == 100
+    assert by_keyA[16, 1].points == 10
+    assert by_keyA[361, 1].progress == 393150
+    assert by_keyA[361, 1].as_dict()["key"] == "361:1"
 
     resB = parse.achievement_res(msgB)
     assert resB.ok, f"Error parsing achievement response B: {resB.error}"
 
     dataB = resB.value
     assert dataB["is_update"] is True
-    by_keyB = {a["key"]: a for a in dataB["achievements"]}
-    assert by_keyB["15:1"]["progress"] == 10
-    assert by_keyB["26:1"]["progress"] == 18
+    by_keyB = {(a.achievement_id, a.step_id): a for a in dataB["achievements"]}
+    assert by_keyB[15, 1].progress == 10
+    assert by_keyB[26, 1].progress == 18
 
     # Update list should be shorter than full snapshot
-    assert len(dataB["achievements"]) < len(dataA["achievements"])
\ No newline at end of file
+    assert len(dataB["achievements"]) < len(dataA["achievements"])
+
+def test_decode_buffer():
+    res = decode.buffer(bytearray(b"a\x00bc\x00\x00de"))
+    assert res.ok, f"Error decoding buffer: {res.error}"
+
+    messages, rest = res.value
+    assert messages == ["a", "bc", ""]
+    assert rest == bytearray(b"de")
+
+def test_frame_decoder():
+    decoder = FrameDecoder(compact_threshold=4)
+    frame = "<msg t='sys'><body action='apiOK' r='0'></body></msg>".encode("utf-8")
+    hebrew = "קיווי".encode("utf-8")
+
+    # frames split at arbitrary points, including inside a multi-byte character
+    stream = frame + b"\x00" + hebrew + b"\x00" + frame + b"\x00"
+    out = []
+    for i in range(0, len(stream), 7):
+        res = decoder.feed(stream[i : i + 7])
+        assert res.ok, f"Error decoding chunk: {res.error}"
+        out.extend(res.value)
+
+    assert out == [frame.decode(), "קיווי", frame.decode()]
+    assert decoder.pending == 0
+
+    res = decoder.feed(b"a\x00b\x00partial")
+    assert res.value == ["a", "b"]
+    assert decoder.pending == len(b"partial")
+
+def test_frame_decoder_max_frame_size():
+    decoder = FrameDecoder(max_frame_size=8)
+    assert decoder.feed(b"12345678\x00").value == ["12345678"]
+
+    res = decoder.feed(b"123456789")
+    assert not res.ok
+    assert decoder.pending == 0
+
+    res = decoder.feed(b"123456789\x00")
+    assert not res.ok
+
+    # the decoder is usable again after the oversized frame was dropped
+    assert decoder.feed(b"ok\x00").value == ["ok"]
+
+def test_frame_decoder_receive_into():
+    decoder = FrameDecoder(read_size=16, max_read_size=64, compact_threshold=8)
+    stream = b"".join(f"frame{i}".encode() + b"\x00" for i in range(50))
+    out = []
+    pos = 0
+    while pos < len(stream):
+        view = decoder.writable()
+        n = min(len(view), len(stream) - pos)
+        view[:n] = stream[pos : pos + n]  # what sock.recv_into does
+        pos += n
+        res = decoder.commit(n)
+        assert res.ok
+        out.extend(res.value)
+    assert out == [f"frame{i}" for i in range(50)]
+    assert decoder.read_size == 64  # every read came back full, so it grew
+
+    for _ in range(3):
+        decoder.commit(0)
+    assert decoder.read_size == 16  # and shrank back once they didn't
+
+    # a frame bigger than the buffer grows it, with the partial frame kept
+    big = b"x" * 1000
+    assert decoder.feed(big[:500]).value == []
+    assert decoder.feed(big[500:] + b"\x00").value == [big.decode()]
+
+
+def test_classify():
+    assert decode.classify("<msg t='sys'><body action='apiOK' r='0'></body></msg>") == (MessageKind.SYS, "apiOK")
+    assert decode.classify(r"""{"b":{"r":-1,"o":{"date":"20260225","_cmd":"login_res"}},"t":"xt"}""") == (MessageKind.XT, "login_res")
+    assert decode.classify("<cross-domain-policy><allow-access-from domain='*' /></cross-domain-policy>")[0] == MessageKind.POLICY
+    assert decode.classify("garbage") == (MessageKind.UNKNOWN, "")
+
+    # command names inside payloads don't confuse the classifier
+    chat = r"""{"b":{"r":-1,"o":{"msg":"\"_cmd\":\"server_list\" action='rmList'","_cmd":"chat"}},"t":"xt"}"""
+    assert decode.classify(chat) == (MessageKind.XT, "chat")
+    pub = "<msg t='sys'><body action='pubMsg' r='3'><txt><![CDATA[action='rmList']]></txt></body></msg>"
+    assert decode.classify(pub) == (MessageKind.SYS, "pubMsg")
+
+def test_parse_jsish_list():
+    assert parse.jsish_list("[{'ach':1,'ass':2,'p':0,'prg':100}]") == [{"ach": 1, "ass": 2, "p": 0, "prg": 100}]
+    assert parse.jsish_list("""[{"id":4,"name":'קיווי',"capicity":-1.0,"safe":true,"x":null}]""") == [
+        {"id": 4, "name": "קיווי", "capicity": -1.0, "safe": True, "x": None}
+    ]
+
+    # literals inside strings are left alone
+    assert parse.jsish_list("""['true', "null false", 'it\\'s "quoted"']""") == ["true", "null false", 'it\'s "quoted"']
+    assert parse.jsish_list("{name:'x', nested:{}}") == {"name": "x", "nested": {}}
+
+    # what the old literal_eval parser took: JS/Python escapes in either quote style, trailing commas, Python literals
+    assert parse.jsish_list(r"""["it\'s", 'a\x41\q', "tab\t"]""") == ["it's", "aA\\q", "tab\t"]
+    assert parse.jsish_list("[1,2,]") == [1, 2] and parse.jsish_list("{'a':[1,],}") == {"a": [1]}
+    assert parse.jsish_list("[True, None, false]") == [True, None, False]
+
+    for bad in ["", "[1 2]", "{'a'}", "['a'", "[undefined]", "{'a':NaN}", "[,]"]:
+        try:
+            parse.jsish_list(bad)
+        except ValueError:
+            continue
+        raise AssertionError(f"Expected ValueError for {bad!r}")
+
+def test_parse_room_table():
+    msg = r"""<msg t='sys'><body action='rmList' r='0'><rmList><rm id='1' priv='0' temp='0' game='0' ucnt='1' lmb='1' maxu='10000' maxs='0'><n><![CDATA[game_lobby]]></n></rm><rm id='2' priv='0' temp='0' game='0' ucnt='0' lmb='1' maxu='100000' maxs='0'><n><![CDATA[lobby]]></n></rm><rm id='3' priv='0' temp='0' game='1' ucnt='7' maxu='50' maxs='0'><n><![CDATA[beach]]></n></rm><rm id='900' priv='1' temp='1' game='0' ucnt='3' maxu='5' maxs='0'><n>new &amp; shiny</n></rm></rmList></body></msg>"""
+    res = parse.room_table(msg, clean=False)
+    assert res.ok, f"Error parsing room table: {res.error}"
+
+    table = res.value
+    assert len(table) == 4
+    assert table.usercount(3) == 7
+    assert table.get("beach").id == 3
+    assert table.get("new & shiny").is_private is True
+    assert table.get(3).min_level is None
+    assert [r.id for r in table.top(2)] == [3, 900]
+    assert [r.id for r in table.where(game=True)] == [3]
+    assert [r.id for r in table.where(private=False, game=False)] == [1, 2]
+    assert [r.id for r in table.unknown_rooms()] == [900]
+
+    assert list(table) == parse.room_list(msg, clean=False).value
+    assert [r.id for r in parse.room_table(msg, clean=True).value] == [1, 3, 900]
+    assert not parse.room_table("<msg t='sys'><body action='rmList' r='0'></body></msg>", clean=False).ok
+
+def test_room_table_user_counts():
+    msg = r"""<msg t='sys'><body action='rmList' r='0'><rmList><rm id='1' priv='0' temp='0' game='0' ucnt='1' lmb='1' maxu='10000' maxs='0'><n><![CDATA[game_lobby]]></n></rm><rm id='2' priv='0' temp='0' game='1' ucnt='0' maxu='100' maxs='0'><n><![CDATA[arcade]]></n></rm><rm id='3' priv='0' temp='0' game='1' ucnt='7' maxu='50' maxs='0'><n><![CDATA[beach]]></n></rm><rm id='4' priv='1' temp='0' game='0' ucnt='2' maxu='5' maxs='0'><n><![CDATA[house]]></n></rm></rmList></body></msg>"""
+    assert parse.user_count("<msg t='sys'><body action='uCount' r='3' u='12' s='1'></body></msg>").value == (3, 12, 1)
+    assert parse.user_count("<msg t='sys'><body action='uCount' r='3' u='12'></body></msg>").value == (3, 12, 0)
+    assert not parse.user_count("<msg t='sys'><body action='uCount' r='3'></body></msg>").ok
+
+    table = parse.room_table(msg, clean=False).value
+    assert table.population == 10
+    assert table.set_usercount(3, 12) == 7
+    assert table.usercount(3) == 12 and table.population == 15
+    assert [r.id for r in table.top(1)] == [3]
+    assert table.set_usercount(99, 1) is None
+
+    # a clean table drops rooms that empty and takes back the ones that fill up
+    table = parse.room_table(msg, clean=True).value
+    assert [r.id for r in table] == [1, 3, 4]
+    assert table.set_usercount(1, 0) == 1
+    assert 1 not in table and "game_lobby" not in table
+    assert [r.id for r in table] == [4, 3]
+    assert table.get("house").is_private is True
+    assert [r.id for r in table.where(game=True)] == [3]
+    assert table.set_usercount(2, 3) == 0
+    assert table.get("arcade") == Room(2, "arcade", 3, 100, False, False, True, None, 0)
+    assert [r.id for r in table.where(game=True)] == [3, 2]
+    assert table.set_usercount(1, 5) == 0 and table.usercount("game_lobby") == 5
+    assert table.population == 7 + 2 + 3 + 5
+
+def test_parse_room_users_and_player_table():
+    join = r"""<msg t='sys'><body action='joinOK' r='3'><pid id='0'/><vars /><uLs r='3'><u i='1001' m='0' s='0' p='-1'><n><![CDATA[bot]]></n><vars><var n='rank' t='n'><![CDATA[4]]></var><var n='vip' t='b'><![CDATA[1]]></var></vars></u><u p='2' i='1002' m='1' s='0'><n>a &amp; b</n><vars /></u></uLs></body></msg>"""
+    room, players = parse.room_users(join).value
+    assert room == 3
+    assert players[0] == Player(1001, "bot", 3, False, False, -1, {"rank": 4, "vip": True})
+    assert players[1].name == "a & b" and players[1].moderator and players[1].player_id == 2
+    assert parse.room_users("<msg t='sys'><body action='joinOK' r='5'><pid id='0'/><vars /><uLs r='5'></uLs></body></msg>").value == (5, [])
+
+    entered = parse.user_enter("<msg t='sys'><body action='uER' r='3'><u i='1003' m='0' s='1' p='-1'><n><![CDATA[late]]></n><vars></vars></u></body></msg>").value
+    assert (entered.id, entered.room, entered.spectator) == (1003, 3, True)
+    assert parse.user_gone("<msg t='sys'><body action='userGone' r='3'><user id='1003' /></body></msg>").value == (3, 1003)
+
+    table = PlayerTable(max_players=3)
+    assert table.set_room(room, players) == 2
+    assert table.add(entered)
+    assert table.get("late") is entered and table.get(1002) is players[1]
+    assert [p.id for p in table.in_room(3)] == [1001, 1002, 1003]
+    assert not table.add(Player(1004, "full", 3))
+    assert table.stats() == {"players": 3, "rooms": 1, "high_water": 3, "dropped": 1}
+
+    # a player seen again replaces the old entry, under its new name and room
+    assert table.add(Player(1001, "bot2", 4))
+    assert "bot" not in table and table.get("bot2").room == 4
+    assert table.count(3) == 2 and table.rooms() == [3, 4]
+
+    assert table.remove(1003) is entered and table.remove(1003) is None
+    table.clear(3)
+    assert [p.id for p in table] == [1001] and table.in_room(3) == []
+
+def test_parse_inventory():
+    msg = r"""{"b":{"r":-1,"o":{"_cmd":"inv_list","list":"3501,1895,3461-2,bad,3501,14028-2"}},"t":"xt"}"""
+
+    res = parse.inventory(msg)
+    assert res.ok, f"Error parsing inventory: {res.error}"
+
+    inv = res.value
+    assert len(inv) == 4
+    assert 1895 in inv and 9999 not in inv
+    assert inv.quantity(3501) == 2
+    assert inv.quantity(3461) == 2
+    assert inv.quantity(9999) == 0
+
+    assert inv.add(9999) == [(9999, 1)]
+    assert inv.remove(3461, 5) == [(3461, -2)]
+    assert 3461 not in inv
+    assert inv.remove(3461) == []
+
+    newer = parse.inventory(r"""{"b":{"r":-1,"o":{"_cmd":"inv_list","list":"3501-3,1895,14028-2,777"}},"t":"xt"}""").value
+    assert sorted(inv.sync(newer)) == [(777, 1), (3501, 1), (9999, -1)]
+    assert inv == newer
+    older = parse.inventory(msg).value
+    assert inv.sync(older, report=False) == [] and inv == older
+
+def test_achievement_store():
+    snapshot = r"""{"b":{"r":-1,"o":{"level":1,"_cmd":"achivment_res","list":"[{'ach':1,'ass':1,'p':0,'prg':100},{'ach':15,'ass':1,'p':0,'prg':9},{'ach':26,'ass':1,'p':0,'prg':16}]","userId":16340305,"points":160}},"t":"xt"}"""
+    update = r"""{"b":{"r":-1,"o":{"level":1,"_cmd":"achivment_res","update":"true","list":"[{'ach':15,'ass':1,'p':0,'prg':10},{'ach':26,'ass':1,'p':0,'prg':16},{'ach':99,'ass':2,'p':5,'prg':1}]","userId":16340305,"points":160}},"t":"xt"}"""
+
+    store = AchievementStore()
+    assert len(store.feed(parse.achievement_res(snapshot).value)) == 3
+
+    changed = store.feed(parse.achievement_res(update).value)
+    assert [(e.achievement_id, e.step_id, dp, dpts) for e, dp, dpts in changed] == [(15, 1, 1, 0), (99, 2, 1, 5)]
+
+    # order is kept, new entries are appended
+    assert [(e.achievement_id, e.step_id) for e in store] == [(1, 1), (15, 1), (26, 1), (99, 2)]
+    assert store.progress(15, 1) == 10
+    assert (99, 2) in store
+
+    # a new snapshot replaces everything, and only reports the differences, dropped entries negated
+    changed = store.feed(parse.achievement_res(snapshot).value)
+    assert [(e.achievement_id, dp, dpts) for e, dp, dpts in changed] == [(15, -1, 0), (99, -1, -5)]
+    assert len(store) == 3
+
+    # without report (nobody listening) the store still follows, but no changes are collected
+    assert store.feed(parse.achievement_res(update).value, report=False) == []
+    assert store.progress(99, 2) == 1 and store.progress(15, 1) == 10
+    assert store.feed(parse.achievement_res(snapshot).value, report=False) == [] and len(store) == 3
+
+def test_game_state():
+    state = GameState(rank=1)
+    state["xp"] = 160
+    assert state.xp == 160 and state["rank"] == 1 and state.get("inventory") is None
+    assert state.as_dict()["xp"] == 160
+    try:
+        state["nope"] = 1
+    except KeyError:
+        pass
+    else:
+        raise AssertionError("Expected KeyError for an unknown field")
+
+def test_packet_template():
+    join = PacketTemplate("avt_joinRoom", {"auto": 1})
+    assert join.slots == 0
+    assert join.render() == encode.raw(encode.xt("avt_joinRoom", {"auto": 1}))
+    assert encode.xt_bytes("avt_joinRoom", {"auto": 1}) == join.render()
+
+    face = PacketTemplate("emote", {"id": SLOT, "room": 3}).precompile(EmoteFace)
+    assert face.render(EmoteFace.WINK) == encode.raw(encode.xt("emote", {"id": 1011, "room": 3}))
+    assert face.render("קיווי") == encode.raw(encode.xt("emote", {"id": "קיווי", "room": 3}))
+
+    # 1, True and 1.0 are equal dict keys, each still renders as itself
+    flag = PacketTemplate("flag", {"v": SLOT})
+    for value in (1, True, 1.0, False, 0, True, 1):
+        assert flag.render(value) == encode.raw(encode.xt("flag", {"v": value}))
+
+    many = PacketTemplate("move", {"x": SLOT, "y": SLOT, "flags": [SLOT, True]})
+    assert many.render(10, -5, {"a": None}) == encode.raw(encode.xt("move", {"x": 10, "y": -5, "flags": [{"a": None}, True]}))
+
+    try:
+        many.render(1)
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("Expected TypeError for a missing slot value")
@@ -0,0 +1,23 @@
+from mikmakpy.reconnect import Backoff, ReconnectStats
+
+
+def test_backoff_is_capped_and_jittered():
+    backoff = Backoff(base=1.0, cap=10.0, factor=2.0, jitter=0.5)
+    for attempt, full in enumerate([1.0, 2.0, 4.0, 8.0, 10.0, 10.0]):
+        delays = {backoff.delay(attempt) for _ in range(50)}
+        assert all(full / 2 <= d <= full for d in delays), f"attempt {attempt}: {sorted(delays)}"
+        assert len(delays) > 1, "delays should be jittered"
+
+    assert Backoff(base=1.0, cap=10.0, jitter=0.0).delay(2) == 4.0
+
+
+def test_reconnect_stats():
+    stats = ReconnectStats()
+    assert stats.mean_latency is None
+
+    stats.record_latency(1.0)
+    stats.record_latency(3.0)
+    assert stats.reconnects == 2
+    assert stats.mean_latency == 2.0
+    assert stats.max_latency == 3.0
+    assert stats.last_latency == 3.0
@@ -0,0 +1,56 @@
+from mikmakpy.protocol import FrameDecoder
+from mikmakpy.recorder import IN, OUT, SessionLog, SessionRecorder, replay
+
+
+def test_session_log_roundtrip(tmp_path):
+    path = str(tmp_path / "session.mmk")
+    with SessionRecorder(path, index_every=4) as rec:
+        rec.outgoing(b"<msg t='sys'><body action='verChk' r='0'><ver v='165' /></body></msg>\x00")
+        for i in range(10):
+            rec.incoming(f'{{"b":{{"r":-1,"o":{{"_cmd":"n","i":{i}}}}},"t":"xt"}}')
+        rec.outgoing(b"a\x00b\x00")  # a coalesced batch is split back into frames
+
+    log = SessionLog(path)
+    frames = list(log)
+    assert len(log) == len(frames) == 13
+    assert [f.direction for f in frames] == [OUT] + [IN] * 10 + [OUT, OUT]
+    assert frames[1].text == '{"b":{"r":-1,"o":{"_cmd":"n","i":0}},"t":"xt"}'
+    assert frames[-1].data == b"b"
+    assert all(a.ns <= b.ns for a, b in zip(frames, frames[1:]))
+
+    assert list(log.seek(record=6)) == frames[6:]
+    assert list(log.seek(seconds=frames[5].seconds)) == [f for f in frames if f.ns >= frames[5].ns]
+
+
+def test_replay(tmp_path):
+    path = str(tmp_path / "session.mmk")
+    with SessionRecorder(path) as rec:
+        rec.incoming("hello")
+        rec.outgoing(b"ignored\x00")
+        rec.incoming("world")
+
+    class Client:
+        _conn = None
+
+        def __init__(self):
+            self.got = []
+
+        def _on_message(self, msg):
+            self._conn.send("reply")  # sends during a replay go nowhere
+            self.got.append(msg)
+
+    client = Client()
+    stats = replay(SessionLog(path), client)
+    assert client.got == ["hello", "world"]
+    assert stats.frames == 2 and stats.bytes == 10
+    assert client._conn is None
+
+
+def test_incoming_frames_are_recorded_raw(tmp_path):
+    path = str(tmp_path / "session.mmk")
+    with SessionRecorder(path) as rec:
+        decoder = FrameDecoder(on_frame=rec.incoming)
+        # bytes that aren't valid utf-8 are kept as they came, only the decoded text gets replacement characters
+        assert decoder.feed(b"caf\xc3\xa9\x00bad \xff\x00").value == ["café", "bad \ufffd"]
+
+    assert [f.data for f in SessionLog(path)] == ["café".encode(), b"bad \xff"]
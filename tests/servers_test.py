@@ -0,0 +1,72 @@
+from mikmakpy.constants import Server
+import asyncio
+
+from mikmakpy.models import ServerInfo
+from mikmakpy.servers import Probe, ServerListCache, ServerProber, ServerSelector
+
+SERVERS = [
+    ServerInfo(id=4, name="קיווי", ip="213.8.147.198", port=443, capacity=0.2),
+    ServerInfo(id=7, name="קרמבו", ip="213.8.147.201", port=443, capacity=0.0),
+]
+
+
+def test_server_list_cache(tmp_path):
+    path = str(tmp_path / "servers.json")
+    cache = ServerListCache(ttl=60, path=path)
+    assert cache.get("213.8.147.198:443") is None
+
+    cache.put("213.8.147.198:443", SERVERS)
+    assert cache.find("213.8.147.198:443", Server.KREMBO).id == 7
+    assert cache.find("213.8.147.198:443", "nope") is None
+
+    # persisted, a new instance (e.g. after a restart) sees it
+    assert ServerListCache(ttl=60, path=path).get("213.8.147.198:443") == SERVERS
+
+    cache.invalidate("213.8.147.198:443")
+    assert ServerListCache(ttl=60, path=path).get("213.8.147.198:443") is None
+
+
+def test_server_list_cache_ttl():
+    cache = ServerListCache(ttl=-1)
+    cache.put("x", SERVERS)
+    assert cache.get("x") is None, "Expired entries should not be returned"
+
+
+def test_server_selector_scores_latency_and_load():
+    prober = ServerProber(ttl=60)
+    selector = ServerSelector(prober, load_weight_ms=200, spread_weight_ms=100)
+    servers = SERVERS + [
+        ServerInfo(id=9, name="closed", ip="10.0.0.9", port=443, capacity=-1),
+        ServerInfo(id=10, name="down", ip="10.0.0.10", port=443, capacity=0.0),
+    ]
+    prober._results = {
+        ("213.8.147.198", 443): Probe(0.010, probed_at=1e18),  # 10ms + 0.2 * 200 = 50
+        ("213.8.147.201", 443): Probe(0.030, probed_at=1e18),  # 30ms + 0 = 30
+        ("10.0.0.9", 443): Probe(0.001, probed_at=1e18),
+        ("10.0.0.10", 443): Probe(None, probed_at=1e18),
+    }
+    assert selector.pick(servers).id == 7
+    # the next client is spread to the other server, 30 + 100 > 50
+    assert selector.pick(servers).id == 4
+    assert selector.pick(servers, Server.KREMBO).id == 7
+    assert selector.pick(servers, "closed") is None
+
+
+def test_server_prober():
+    async def main():
+        server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        server.close()
+        await server.wait_closed()
+        live = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+        live_port = live.sockets[0].getsockname()[1]
+
+        prober = ServerProber(ttl=60, timeout=1)
+        results = await prober.probe_all([("127.0.0.1", live_port), ("127.0.0.1", port)])
+        live.close()
+        return prober, results, live_port, port
+
+    prober, results, live_port, dead_port = asyncio.run(main())
+    assert results[("127.0.0.1", live_port)].rtt is not None
+    assert results[("127.0.0.1", dead_port)].rtt is None
+    assert prober.cached("127.0.0.1", live_port) is results[("127.0.0.1", live_port)]
@@ -0,0 +1,100 @@
+import asyncio
+import threading
+import time
+
+from mikmakpy.ingame import MikmakIngameClient
+from mikmakpy.mockserver import MockConfig, MockServer
+from mikmakpy.shards import ShardedFleet
+
+
+def _mock_in_thread():
+    loop = asyncio.new_event_loop()
+    mock = MockServer(MockConfig(rooms=5, achievements=3, inventory=5))
+    loop.run_until_complete(mock.start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return mock, loop
+
+
+def _wait_for(predicate, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_sharded_fleet_end_to_end():
+    mock, loop = _mock_in_thread()
+    joins = []
+    fleet = ShardedFleet(
+        [(f"bot{i}", "pw") for i in range(4)],
+        workers=2,
+        client_cls=MikmakIngameClient,
+        starting_ip=mock.host,
+        port=mock.port,
+        reconnection_delay=0.05,
+    )
+
+    @fleet.on("sys:joinOK")
+    def on_join(username, msg):
+        joins.append(username)
+
+    try:
+        fleet.start()
+        assert [len(s["accounts"]) for s in fleet.shards] == [2, 2]
+        _wait_for(lambda: len(joins) == 4)
+        assert sorted(joins) == ["bot0", "bot1", "bot2", "bot3"]
+
+        snap = fleet.metrics()
+        assert snap["commands"]["sys:joinOK"] == 4
+        assert snap["gauges"]["clients"] == 4 and snap["gauges"]["workers"] == 2
+        assert len(fleet.state("bot0")["room_list"]) == 5
+
+        # a crashed worker comes back with its accounts, which log in again
+        victim = fleet.shards[0]
+        fleet._shards[0].process.kill()
+        _wait_for(lambda: fleet.shards[0]["restarts"] == 1 and fleet.shards[0]["alive"])
+        _wait_for(lambda: len(joins) == 6)
+        assert sorted(joins[4:]) == victim["accounts"]
+
+        fleet.remove("bot0")
+        fleet.remove("bot2")
+        assert [len(s["accounts"]) for s in fleet.shards] == [0, 2]
+        assert fleet.rebalance() == 1
+        assert [len(s["accounts"]) for s in fleet.shards] == [1, 1]
+        _wait_for(lambda: len(joins) == 7)  # the moved account logged in on its new worker
+    finally:
+        fleet.stop()
+        loop.call_soon_threadsafe(loop.stop)
+
+
+def test_request_failed_by_the_monitor_while_posting():
+    fleet = ShardedFleet(workers=1)
+    shard = fleet._shards[0]
+
+    def post(shard, msg):
+        fleet._fail_requests(shard)  # the worker died, the monitor thread fails what's pending
+        return False
+
+    fleet._post = post
+    future = fleet._request(shard, "metrics")
+    assert isinstance(future.exception(0), ConnectionError)
+    assert shard.requests == {}
+
+
+def test_handlers_can_make_requests():
+    mock, loop = _mock_in_thread()
+    rooms = []
+    fleet = ShardedFleet([("bot0", "pw")], workers=1, client_cls=MikmakIngameClient, starting_ip=mock.host, port=mock.port)
+
+    @fleet.on("sys:joinOK")
+    def on_join(username, msg):
+        # the reply comes in on the monitor thread while this handler waits for it
+        rooms.append(len(fleet.state(username, timeout=2)["room_list"]))
+
+    try:
+        fleet.start()
+        _wait_for(lambda: rooms)
+        assert rooms == [5]
+    finally:
+        fleet.stop()
+        loop.call_soon_threadsafe(loop.stop)